@@ -0,0 +1,251 @@
+import argparse, time
+
+import numpy as np
+
+from src.sumtree import SumTree
+from src.neuralnets.npinference import NumpyDQN, NumpyDDPGActor
+
+def main():
+    args = parse_cl_args()
+    if args.type == 'per':
+        benchmark_per(args.n, args.batch)
+    elif args.type == 'inference':
+        benchmark_inference(args.n, args.batch, args.n_hidden)
+    elif args.type == 'train':
+        benchmark_train(args.n, args.batch, args.n_hidden)
+    elif args.type == 'backend':
+        benchmark_backend(args.n, args.backends.split(','))
+    elif args.type == 'episode':
+        benchmark_episode(args.n, args.backends.split(','))
+    elif args.type == 'dtse':
+        benchmark_dtse(args.n)
+    elif args.type == 'tsc':
+        benchmark_tsc(args.n, args.backends.split(','))
+    else:
+        assert 0, 'Error, supplied benchmark type argument '+str(args.type)+' does not exist'
+
+def parse_cl_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-type", type=str, default='per', dest='type', help='component to benchmark, default: per, options: per, inference, train, backend, episode, dtse, tsc')
+    parser.add_argument("-n", type=int, default=1000, dest='n', help='number of timed calls per measurement, default: 1000')
+    parser.add_argument("-batch", type=int, default=32, dest='batch', help='batch size used by benchmarks, default: 32')
+    parser.add_argument("-n_hidden", type=int, default=3, dest='n_hidden', help='neural network hidden layer scaling factor, default: 3')
+    parser.add_argument("-backends", type=str, default='traci,libsumo,synthetic', dest='backends', help='comma separated simulator backends for the backend benchmark, default: traci,libsumo,synthetic')
+    args = parser.parse_args()
+    return args
+
+def time_call(f, n):
+    ###mean wall time of n calls to f in microseconds
+    f()
+    start_t = time.perf_counter()
+    for _ in range(n):
+        f()
+    return (time.perf_counter() - start_t)*1e6/n
+
+def benchmark_per(n, batch):
+    ###cost of prioritized replay sampling and priority updates
+    print('prioritized replay, batch '+str(batch)+', mean time per call (us)')
+    print('replay size, sample, update')
+    for size in [10000, 100000, 1000000]:
+        tree = SumTree(size)
+        tree.update(np.arange(size), np.random.uniform(0.0, 1.0, size=size))
+        sample_t = time_call(lambda: tree.sample(batch), n)
+        idx = np.random.randint(0, size, size=batch)
+        p = np.random.uniform(0.0, 1.0, size=batch)
+        update_t = time_call(lambda: tree.update(idx, p), n)
+        print(str(size)+', '+'{:.1f}'.format(sample_t)+', '+'{:.1f}'.format(update_t))
+
+def benchmark_inference(n, batch, n_hidden):
+    ###forward pass latency of the tf networks and their numpy
+    #inference engines, sized for the double network intersections
+    #(12 incoming lanes, 4 green phases)
+    import tensorflow as tf
+    from src.neuralnets.dqn import DQN
+    from src.neuralnets.ddpgactor import DDPGActor
+
+    input_d, n_phases = 29, 4
+    hidden_d = [input_d*n_hidden, input_d*n_hidden]
+    tf.compat.v1.reset_default_graph()
+    sess = tf.compat.v1.Session()
+    nets = {'dqn':(DQN(input_d, hidden_d, 'elu', n_phases, 'linear', 0.0001, 0.00000001),
+                   NumpyDQN(input_d, hidden_d, 'elu', n_phases, 'linear')),
+            'ddpg':(DDPGActor(input_d, hidden_d, 'elu', 1, 'tanh', 0.0001, 0.00000001, 0.005, name='actor', batch_size=batch, sess=sess),
+                    NumpyDDPGActor(input_d, hidden_d, 'elu', 1, 'tanh'))}
+    sess.run(tf.compat.v1.global_variables_initializer())
+
+    print('neural network inference, mean time per forward (us)')
+    print('network, batch, tf, numpy, speedup, max abs diff')
+    for nettype in nets:
+        tf_net, np_net = nets[nettype]
+        np_net.set_weights(tf_net.get_weights('online'), 'online')
+        for b in [1, batch]:
+            x = np.random.uniform(0.0, 1.0, size=(b, input_d)).astype(np.float32)
+            diff = np.amax(np.abs(tf_net.forward(x, 'online') - np_net.forward(x, 'online')))
+            tf_t = time_call(lambda: tf_net.forward(x, 'online'), n)
+            np_t = time_call(lambda: np_net.forward(x, 'online'), n)
+            print(nettype+', '+str(b)+', '+'{:.1f}'.format(tf_t)+', '+'{:.1f}'.format(np_t)+', '+'{:.1f}'.format(tf_t/np_t)+', '+'{:.2e}'.format(diff))
+
+def benchmark_train(n, batch, n_hidden):
+    ###dqn learner updates per second for each
+    #train step, double network input sizes
+    from src.neuralnets.dqn import DQN
+
+    input_d, n_phases = 29, 4
+    hidden_d = [input_d*n_hidden, input_d*n_hidden]
+    x = np.random.uniform(0.0, 1.0, size=(batch, input_d)).astype(np.float32)
+    y = np.random.uniform(-1.0, 1.0, size=(batch, n_phases)).astype(np.float32)
+    w = np.random.uniform(0.0, 1.0, size=batch).astype(np.float32)
+
+    print('dqn learner, batch '+str(batch))
+    print('train step, updates/sec')
+    for train_step in ['batch', 'sample']:
+        dqn = DQN(input_d, hidden_d, 'elu', n_phases, 'linear', 0.0001, 0.00000001, learner=True, train_step=train_step)
+        t = time_call(lambda: dqn.backward(x, y, w), n)
+        print(train_step+', '+'{:.1f}'.format(1e6/t))
+
+def benchmark_backend(n, backends):
+    ###simulation steps per second with uniform cycle
+    #controllers for each simulator backend
+    from src.argparse import parse_cl_args
+    from src.distprocs import get_sim
+    from src.networkdata import NetworkData
+    from src.sumosim import SumoSim
+
+    print('simulator backend, '+str(n)+' steps, uniform cycle tsc')
+    print('network, backend, steps/sec')
+    for sim in ['single', 'double']:
+        for backend in backends:
+            args = parse_cl_args(['-sim', sim, '-tsc', 'uniform', '-nogui', '-backend', backend, '-simlen', str(n)])
+            args.cfg_fp, args.net_fp = get_sim(sim)
+            netdata = NetworkData(args.net_fp).get_net_data()
+            sumosim = SumoSim(args.cfg_fp, n, args.tsc, args.nogui, netdata, args, 0)
+            sumosim.gen_sim()
+            netdata = sumosim.update_netdata()
+            tl_junc = netdata['inter'].keys()
+            no_rl = {tl:None for tl in tl_junc}
+            sumosim.create_tsc(no_rl, no_rl, no_rl, no_rl, args.eps)
+            start_t = time.perf_counter()
+            sumosim.run()
+            run_t = time.perf_counter() - start_t
+            sumosim.close()
+            print(sim+', '+backend+', '+'{:.1f}'.format(n/run_t))
+
+def benchmark_episode(n, backends):
+    ###episode startup time (sim start or reload and controller
+    #creation) restarting the simulator and with -persist
+    import os
+    from src.argparse import parse_cl_args
+    from src.distprocs import get_sim
+    from src.networkdata import NetworkData
+    from src.sumosim import SumoSim
+
+    print('episode startup, '+str(n)+' episodes of 10 steps, uniform cycle tsc')
+    print('network, backend, persist, mean startup and teardown per episode (ms)')
+    for sim in ['double', 'lust']:
+        cfg_fp, net_fp = get_sim(sim)
+        if not os.path.isfile(net_fp):
+            print(sim+' network not found, skipping')
+            continue
+        netdata = NetworkData(net_fp).get_net_data()
+        for backend in backends:
+            for persist in [[], ['-persist']]:
+                args = parse_cl_args(['-sim', sim, '-tsc', 'uniform', '-nogui', '-backend', backend, '-simlen', '10']+persist)
+                args.cfg_fp, args.net_fp = cfg_fp, net_fp
+                sumosim = SumoSim(args.cfg_fp, 10, args.tsc, args.nogui, dict(netdata, inter=dict(netdata['inter'])), args, 0)
+                startup_t = []
+                for i in range(n+1):
+                    start_t = time.perf_counter()
+                    sumosim.gen_sim()
+                    if i == 0:
+                        #done once by the dummy sim in distprocs
+                        sumosim.update_netdata()
+                    no_rl = {tl:None for tl in sumosim.netdata['inter']}
+                    sumosim.create_tsc(no_rl, no_rl, no_rl, no_rl, args.eps)
+                    startup_t.append(time.perf_counter() - start_t)
+                    sumosim.run()
+                    #reloading is part of the next episode's startup
+                    start_t = time.perf_counter()
+                    sumosim.end_episode(i == n)
+                    startup_t[-1] += time.perf_counter() - start_t
+                #first episode always starts the simulator
+                print(sim+', '+backend+', '+str(len(persist) > 0)+', '+'{:.1f}'.format(1e3*np.mean(startup_t[1:])))
+
+def benchmark_tsc(n, backends):
+    ###simulation steps per second and controller time per step
+    #of the uniform cycle and max pressure controllers
+    import os
+    from src.argparse import parse_cl_args
+    from src.distprocs import get_sim
+    from src.networkdata import NetworkData
+    from src.sumosim import SumoSim
+
+    print('controller cost, '+str(n)+' steps')
+    print('network, backend, tsc, steps/sec, controller time per step (us)')
+    for sim in ['double', 'lust']:
+        cfg_fp, net_fp = get_sim(sim)
+        if not os.path.isfile(net_fp):
+            print(sim+' network not found, skipping')
+            continue
+        for backend in backends:
+            for tsc in ['uniform', 'maxpressure']:
+                args = parse_cl_args(['-sim', sim, '-tsc', tsc, '-nogui', '-backend', backend, '-simlen', str(n)])
+                args.cfg_fp, args.net_fp = cfg_fp, net_fp
+                netdata = NetworkData(args.net_fp).get_net_data()
+                sumosim = SumoSim(args.cfg_fp, n, args.tsc, args.nogui, netdata, args, 0)
+                sumosim.gen_sim()
+                netdata = sumosim.update_netdata()
+                no_rl = {tl:None for tl in netdata['inter']}
+                sumosim.create_tsc(no_rl, no_rl, no_rl, no_rl, args.eps)
+                #time the controllers' run calls
+                tsc_t = [0.0]
+                for tl in sumosim.tsc:
+                    def timed(data, run=sumosim.tsc[tl].run):
+                        start_t = time.perf_counter()
+                        run(data)
+                        tsc_t[0] += time.perf_counter() - start_t
+                    sumosim.tsc[tl].run = timed
+                start_t = time.perf_counter()
+                sumosim.run()
+                run_t = time.perf_counter() - start_t
+                sumosim.close()
+                print(sim+', '+backend+', '+tsc+', '+'{:.1f}'.format(n/run_t)+', '+'{:.1f}'.format(1e6*tsc_t[0]/n))
+
+def benchmark_dtse(n):
+    ###dtse encoding cost per intersection, vehicles on every incoming
+    #lane up to jam density, lust's busiest junctions have around 16
+    #incoming lanes, compared to a per vehicle python loop
+    from src.vehiclesnapshot import VehicleSnapshot
+    from src.laneoccupancy import LaneOccupancy
+    from src.dtse import DTSE
+    import src.traciconstants as tc
+
+    print('dtse encoding, 150m of each lane in 5m cells, mean time per intersection (us)')
+    print('incoming lanes, vehicles per lane, vectorized, loop')
+    for n_lanes in [4, 8, 16]:
+        for per_lane in [5, 10, 20]:
+            lanes = [ 'lane'+str(i) for i in range(n_lanes) ]
+            results = {'j':{ 'v'+str(i)+'_'+str(j):{tc.VAR_LANE_ID:lanes[i],
+                                                    tc.VAR_LANEPOSITION:250.0 - np.random.uniform(0.0, 150.0),
+                                                    tc.VAR_SPEED:np.random.uniform(0.0, 13.9)}
+                             for i in range(n_lanes) for j in range(per_lane) }}
+            snapshot = VehicleSnapshot(lanes, [250.0]*n_lanes)
+            snapshot.update(results)
+            occupancy = LaneOccupancy(lanes)
+            occupancy.update(snapshot)
+            dtse = DTSE([250.0]*n_lanes, [13.9]*n_lanes, 5.0)
+            vector_t = time_call(lambda: dtse.encode(occupancy), n)
+
+            def loop():
+                grid = np.zeros((2, n_lanes, dtse.n_cells))
+                for i, l in enumerate(lanes):
+                    for pos, speed in zip(occupancy.get_positions(l), snapshot.speed[occupancy.start[i]:occupancy.end[i]]):
+                        c = int((250.0 - pos)/5.0)
+                        if c < dtse.n_cells:
+                            grid[0, i, c] += 1.0
+                            grid[1, i, c] += speed/13.9
+                return grid
+            loop_t = time_call(loop, n)
+            print(str(n_lanes)+', '+str(per_lane)+', '+'{:.1f}'.format(vector_t)+', '+'{:.1f}'.format(loop_t))
+
+if __name__ == '__main__':
+    main()
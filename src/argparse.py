@@ -1,6 +1,6 @@
 import argparse, os
 
-def parse_cl_args():
+def parse_cl_args(argv=None):
     parser = argparse.ArgumentParser()
 
     #multi proc params
@@ -9,7 +9,8 @@ def parse_cl_args():
 
     ##sumo params
     parser.add_argument("-sim", type=str, default=None, dest='sim', help='simulation scenario, default: lust, options:lust, single, double')
-    parser.add_argument("-port", type=int, default=9000, dest='port', help='port to connect self.conn.server, default: 9000')
+    parser.add_argument("-port", type=int, default=0, dest='port', help='first port of the sims (sim i uses port+i), 0 allocates free ports so concurrent runs do not collide, default: 0')
+    parser.add_argument("-backend", type=str, default='traci', dest='backend', help='simulator backend, traci runs sumo in its own process over a socket, libsumo runs sumo in the sim proc (requires -nogui), synthetic runs a numpy queueing model of the network without sumo, default: traci, options: traci, libsumo, synthetic')
     parser.add_argument("-netfp", type=str, default='networks/double.net.xml', dest='net_fp', help='path to desired simulation network file, default: networks/double.net.xml')
     parser.add_argument("-sumocfg", type=str, default='networks/double.sumocfg', dest='cfg_fp', help='path to desired simulation configuration file, default: networks/double.sumocfg' )
     parser.add_argument("-mode", type=str, default='train', dest='mode', help='reinforcement mode, train (agents receive updates) or test (no updates), default:train, options: train, test'  )
@@ -17,6 +18,9 @@ def parse_cl_args():
     parser.add_argument("-simlen", type=int, default=10800, dest='sim_len', help='length of simulation in seconds/steps')
     parser.add_argument("-nogui", default=False, action='store_true', dest='nogui', help='disable gui, default: False')
     parser.add_argument("-scale", type=float, default=1.4, dest='scale', help='vehicle generation scale parameter, higher values generates more vehicles, default: 1.0')
+    parser.add_argument("-profile", type=str, default='sine', dest='profile', help='dynamic demand profile, vehicles per second over the sim, sine is half a sine period, csv reads time,count rows from -profile_fp, default: sine, options: sine, csv')
+    parser.add_argument("-profile_fp", type=str, default=None, dest='profile_fp', help='path to demand profile csv, default: None')
+    parser.add_argument("-schedule_fp", type=str, default=None, dest='schedule_fp', help='path to cache demand schedules of seeded sims in, default: None (no cache)')
     parser.add_argument("-demand", type=str, default='dynamic', dest='demand', help='vehicle demand generation patter, single limits vehicle network population to one, dynamic creates changing vehicle population, default:dynamic, options:single, dynamic')
 
     parser.add_argument("-offset", type=float, default=0.25, dest='offset', help='max sim offset fraction of total sim length, default: 0.3')
@@ -31,6 +35,7 @@ def parse_cl_args():
     parser.add_argument("-cmax", type=int, default=180, dest='c_max', help='maximum cycle time (s), default: 180')
     parser.add_argument("-satflow", type=float, default=0.38, dest='sat_flow', help='lane vehicle saturation rate (veh/s), default: 0.38')
     parser.add_argument("-f", type=int, default=900, dest='update_freq', help='interval over which websters timing are computed (s), default: 900')
+    parser.add_argument("-count", type=str, default='sets', dest='count', help='websters lane vehicle counting, sets compares the vehicle ids on each lane between steps, loops reads induction loops placed at the stop lines, default: sets, options: sets, loops')
 
     #maxpressure params
 
@@ -43,6 +48,24 @@ def parse_cl_args():
     parser.add_argument("-eps", type=float, default=0.01, dest='eps', help='reinforcement learning explortation rate, default: 0.01')
     parser.add_argument("-nsteps", type=int, default=1, dest='nsteps', help='n step returns/max experience trajectory, default: 1')
     parser.add_argument("-nreplay", type=int, default=10000, dest='nreplay', help='maximum size of experience replay, default: 10000')
+    parser.add_argument("-replay", type=str, default=None, dest='replay', help='experience replay backend, manager shares python lists through a manager proc, shared uses fixed size shared memory ring buffers (python 3.8+), default: shared with -per, otherwise manager, options: manager, shared')
+    parser.add_argument("-per", default=False, action='store_true', dest='per', help='use prioritized experience replay, requires shared replay (python 3.8+), default: False')
+    parser.add_argument("-per_alpha", type=float, default=0.6, dest='per_alpha', help='prioritized replay priority exponent, default: 0.6')
+    parser.add_argument("-per_beta", type=float, default=0.4, dest='per_beta', help='prioritized replay initial importance sampling exponent, annealed to 1, default: 0.4')
+    parser.add_argument("-per_eps", type=float, default=0.01, dest='per_eps', help='prioritized replay constant added to td errors, default: 0.01')
+    parser.add_argument("-weights", type=str, default=None, dest='weights', help='how learners send weights to actors, shared uses versioned shared memory channels (python 3.8+), manager pickles them through a manager dict, default: shared if available, otherwise manager, options: shared, manager')
+    parser.add_argument("-sync_decisions", type=int, default=1, dest='sync_decisions', help='number of decisions between actors checking for new learner weights, default: 1')
+    parser.add_argument("-sync_t", type=float, default=0.0, dest='sync_t', help='minimum time in seconds between actors checking for new learner weights, default: 0.0')
+    parser.add_argument("-utd", type=float, default=1.0, dest='utd', help='learner batch updates per new experience trajectory (update to data ratio), default: 1.0')
+    parser.add_argument("-seed", type=int, default=None, dest='seed', help='random seed for vehicle generation and sumo, each sim and episode derives its own, default: None (unseeded)')
+    parser.add_argument("-warmup", default=False, action='store_true', dest='warmup', help='cache warmed up sim states at actor start offsets and load them instead of re-simulating, requires -seed, default: False')
+    parser.add_argument("-warmup_fp", type=str, default='warmup/', dest='warmup_fp', help='path to warm up state cache, default: warmup/')
+    parser.add_argument("-route_files", default=False, action='store_true', dest='route_files', help='compile the dynamic demand to a sumo route file loaded at start instead of adding vehicles through traci every step, seeded test files are cached and shared by all controllers, training files are removed after each episode, default: False')
+    parser.add_argument("-route_fp", type=str, default='routes/', dest='route_fp', help='path to compiled route file cache, default: routes/')
+    parser.add_argument("-persist", default=False, action='store_true', dest='persist', help='keep the simulator running between training episodes and reload the scenario in it instead of restarting it, default: False')
+    parser.add_argument("-traci_stats", default=False, action='store_true', dest='traci_stats', help='count the traci commands, round trips and bytes each sim sends and log them per sim second at the end of every episode, default: False')
+    parser.add_argument("-jump", default=False, action='store_true', dest='jump', help='event driven simulation, step the sim straight to the next time a controller needs to observe or act, travel times are read from sumo tripinfo output, default: False')
+    parser.add_argument("-batch_infer", default=False, action='store_true', dest='batch_infer', help='batch the action forward passes of rl controllers deciding in the same step, default: False')
     parser.add_argument("-batch", type=int, default=32, dest='batch', help='batch size to sample from replay to train neural net, default: 32')
     parser.add_argument("-gamma", type=float, default=0.99, dest='gamma', help='reward discount factor, default: 0.99')
     parser.add_argument("-updates", type=int, default=10000, dest='updates', help='total number of batch updates for training, default: 10000')
@@ -52,6 +75,11 @@ def parse_cl_args():
     parser.add_argument("-lr", type=float, default=0.0001, dest='lr', help='ddpg actor/dqn neural network learning rate, default: 0.0001')
     parser.add_argument("-lrc", type=float, default=0.001, dest='lrc', help='ddpg critic neural network learning rate, default: 0.001')
     parser.add_argument("-lre", type=float, default=0.00000001, dest='lre', help='neural network optimizer epsilon, default: 0.00000001')
+    parser.add_argument("-state", type=str, default='density', dest='state', help='rl controller state, density is the normalized density and queue of incoming lanes, dtse is a lanes x cells grid of vehicle counts and speeds, default: density, options: density, dtse')
+    parser.add_argument("-cell", type=float, default=5.0, dest='cell', help='dtse cell length (m), default: 5.0')
+    parser.add_argument("-share", type=str, default='none', dest='share', help='rl parameter sharing, intersections in a group share one network and a pooled replay, none (network per intersection), dims (group intersections with the same state/action dims), pad (one group, lane and phase states zero padded to the largest intersection, actions past the intersection phases are masked), default: none, options: none, dims, pad')
+    parser.add_argument("-train_step", type=str, default='batch', dest='train_step', help='dqn learner update, one gradient step per minibatch (batch) or per sampled experience (sample, original behaviour), default: batch, options: batch, sample')
+    parser.add_argument("-infer", type=str, default='tf', dest='infer', help='actor/test neural network inference engine, numpy avoids importing tensorflow on actors, default: tf, options: tf, numpy')
     parser.add_argument("-hidden_act", type=str, default='elu', dest='hidden_act', help='neural network hidden layer activation, default: elu')
     parser.add_argument("-n_hidden", type=int, default=3, dest='n_hidden', help='neural network hidden layer scaling factor, default: 3')
     
@@ -67,5 +95,5 @@ def parse_cl_args():
     parser.add_argument("-tau", type=float, default=0.005, dest='tau', help='ddpg online/target weight shifting tau, default: 0.005')
     parser.add_argument("-gmax", type=int, default=30, dest='g_max', help='maximum green phase time (s), default: 30')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     return args
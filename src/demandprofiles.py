@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+from src.helper_funcs import check_and_make_dir
+
+def sine_profile(sim_len, profile_fp=None):
+    ###vehicles per second following half a sine period, with
+    #exponential headways of mean sin(t)+1.55 seconds of which the
+    #first arrival of every second is dropped, the expected count
+    #of poisson(l) arrivals less one is l - 1 + exp(-l)
+    t = np.linspace(1*np.pi, 2*np.pi, sim_len)
+    l = 1.0/(np.sin(t)+1.55)
+    return l - 1.0 + np.exp(-l)
+
+def csv_profile(sim_len, profile_fp):
+    ###piecewise constant demand from a csv of 'time,count' rows,
+    #count vehicles arrive in the interval starting at time, the
+    #intervals are stretched to the sim length
+    data = np.loadtxt(profile_fp, delimiter=',', ndmin=2, comments='#')
+    if data.shape[1] < 2:
+        #raise not found exceptions
+        assert 0, 'Demand profile csv '+str(profile_fp)+' needs time,count rows.'
+    start, count = data[:,0], data[:,1]
+    #last interval as long as the one before it
+    end = np.append(start[1:], start[-1] + (start[-1]-start[-2] if len(start) > 1 else 1.0))
+    seconds = np.arange(sim_len)*(end[-1]-start[0])/sim_len + start[0]
+    interval = np.searchsorted(start, seconds, side='right') - 1
+    #counts per interval spread over the interval's sim seconds
+    sim_seconds = np.bincount(interval, minlength=len(start))
+    return count[interval]/np.maximum(sim_seconds[interval], 1)
+
+demand_profiles = {'sine':sine_profile, 'csv':csv_profile}
+
+class DemandSchedule:
+    """Vehicles to generate each second as flat arrays, the origin
+    indices of all vehicles with per second offsets into them."""
+    def __init__(self, counts, origins):
+        self.counts = counts
+        self.origins = origins
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.counts)
+
+    def get(self, t):
+        return self.origins[self.offsets[t]:self.offsets[t+1]]
+
+    def save(self, fp):
+        np.savez(fp, counts=self.counts, origins=self.origins)
+
+    @staticmethod
+    def load(fp):
+        data = np.load(fp)
+        return DemandSchedule(data['counts'], data['origins'])
+
+def gen_demand_schedule(rate, n_origins, scale, mode, rng):
+    ###non-homogeneous poisson arrivals, one draw per second
+    counts = rng.poisson(rate)
+    #randomly shift traffic pattern as a form of data augmentation
+    shift = 0 if mode == 'test' else int(rng.integers(0, len(rate)))
+    counts = np.concatenate((counts[shift:], counts[:shift]))
+    #zero out the last minute for better comparisons because of random shift
+    counts[-60:] = 0
+    counts = (scale*counts).astype(np.int64)
+    origins = rng.integers(0, n_origins, size=int(np.sum(counts)))
+    return DemandSchedule(counts, origins)
+
+def get_demand_schedule(profile, profile_fp, sim_len, n_origins, scale, mode, seed, schedule_fp=None):
+    ###schedules of seeded sims are cached in schedule_fp if given,
+    #they have their own random generator so loading or generating
+    #them leaves the global random state the same
+    if profile not in demand_profiles:
+        #raise not found exceptions
+        assert 0, 'Supplied demand profile '+str(profile)+' does not exist.'
+    fp = None
+    if schedule_fp and seed is not None:
+        name = '_'.join([profile, os.path.basename(profile_fp) if profile_fp else 'none',
+                         str(sim_len), str(n_origins), str(scale), mode, str(seed)])
+        fp = os.path.join(schedule_fp, name+'.npz')
+        if os.path.isfile(fp):
+            return DemandSchedule.load(fp)
+    rate = demand_profiles[profile](int(sim_len), profile_fp)
+    schedule = gen_demand_schedule(rate, n_origins, scale, mode, np.random.default_rng(seed))
+    if fp:
+        check_and_make_dir(schedule_fp)
+        schedule.save(fp)
+    return schedule
@@ -1,12 +1,12 @@
 import sys, os, subprocess, time
 from multiprocessing import *
 
-from tensorflow.python.framework.ops import disable_eager_execution
-
 from src.simproc import SimProc
 from src.learnerproc import LearnerProc
 from src.networkdata import NetworkData
 from src.sumosim import SumoSim
+from src.nn_factory import get_share_groups, get_weight_shapes
+from src.helper_funcs import has_shared_memory
 
 import numpy as np
 
@@ -40,10 +40,20 @@ class DistProcs:
                 #no learners necessary for testing
                 if args.l > 0:
                     args.l = 0
+            #prioritized replay indexes priorities by replay slot
+            if args.replay is None:
+                args.replay = 'shared' if args.per else 'manager'
+            if args.per:
+                assert args.replay == 'shared', '-per requires -replay shared, prioritized replay indexes priorities by replay slot'
+                assert has_shared_memory(), '-per requires python 3.8+ (multiprocessing.shared_memory) for its shared replay'
+            if args.replay == 'shared':
+                assert has_shared_memory(), '-replay shared requires python 3.8+ (multiprocessing.shared_memory), use -replay manager'
         elif tsc in traditional_tsc:
             #traditional tsc doesn't require learners
             if args.l > 0:
                 args.l = 0
+            #or experience replays
+            args.replay = 'manager'
         else:
             print('Input argument tsc '+str(tsc)+' not found, please provide valid tsc.')
             return
@@ -72,29 +82,61 @@ class DistProcs:
         sim.close()
         #print('...finished with dummy sim')
 
+        self.netdata = netdata
         tsc_ids = netdata['inter'].keys()
 
+        #group rl tsc which share a network, stats and replay,
+        #leaders are the tsc in charge of their group
+        if tsc in rl_tsc:
+            netdata['share'] = get_share_groups(args.share, args.tsc, netdata, args.state, args.cell)
+            leaders = [ i for i in tsc_ids if netdata['share'][i]['leader'] == i ]
+        else:
+            netdata['share'] = { i:{'leader':i, 'n':1} for i in tsc_ids }
+            leaders = list(tsc_ids)
+
         #create mp dict for sharing 
         #reinforcement learning stats
-        rl_stats = self.create_mp_stats_dict(tsc_ids)
-        exp_replays = self.create_mp_exp_replay(tsc_ids)
+        rl_stats = self.create_mp_stats_dict(tsc_ids, netdata)
+        if args.replay == 'shared':
+            exp_replays = self.create_shared_exp_replay(tsc_ids, netdata)
+        else:
+            exp_replays = self.create_mp_exp_replay(tsc_ids, netdata)
+        self.exp_replays = exp_replays
+        #shared memory channels for learners to publish weights to actors
+        if tsc in rl_tsc:
+            weight_channels = self.create_weight_channels(tsc_ids, netdata)
+        else:
+            weight_channels = {tsc:None for tsc in tsc_ids}
+        self.weight_channels = weight_channels
 
         eps_rates = self.get_exploration_rates(args.eps, args.n, args.mode, args.sim)
         print(eps_rates)
         offsets = self.get_start_offsets(args.mode, args.sim_len, args.offset, args.n)
         print(offsets)
 
+        #learners idle until actors store experiences
+        #for one of their agents and set their event
+        learner_events = {tsc:None for tsc in tsc_ids}
+        if args.l > 0:
+            learner_agents = self.assign_learner_agents( leaders, args.l)
+            new_exp_events = [ Event() for _ in range(args.l) ]
+            done_events = [ Event() for _ in range(args.l) ]
+            for i in range(args.l):
+                for tsc in learner_agents[i]:
+                    learner_events[tsc] = new_exp_events[i]
+            for tsc in tsc_ids:
+                learner_events[tsc] = learner_events[netdata['share'][tsc]['leader']]
+
         #create sumo sim procs to generate experiences
-        sim_procs = [ SimProc(i, args, barrier, netdata, rl_stats, exp_replays, eps_rates[i], offsets[i]) for i in range(args.n)]
+        sim_procs = [ SimProc(i, args, barrier, netdata, rl_stats, exp_replays, weight_channels, learner_events, eps_rates[i], offsets[i]) for i in range(args.n)]
 
         #create learner procs which are assigned tsc/rl agents
         #to compute neural net updates for
         if args.l > 0:
-            learner_agents = self.assign_learner_agents( tsc_ids, args.l)
             print('===========LEARNER AGENTS')
             for l in learner_agents:
                 print('============== '+str(l))
-            learner_procs = [ LearnerProc(i, args, barrier, netdata, learner_agents[i], rl_stats, exp_replays) for i in range(args.l)]
+            learner_procs = [ LearnerProc(i, args, barrier, netdata, learner_agents[i], rl_stats, exp_replays, weight_channels, new_exp_events[i], done_events) for i in range(args.l)]
         else:
             learner_procs = []
 
@@ -113,32 +155,95 @@ class DistProcs:
         for p in self.procs:
             p.join()
 
+        #release shared memory replays, group members
+        #share their leader's replay and weight channel
+        leaders = [ tsc for tsc in self.netdata['share'] if self.netdata['share'][tsc]['leader'] == tsc ]
+        for tsc in leaders:
+            if self.args.replay == 'shared':
+                self.exp_replays[tsc].close()
+                self.exp_replays[tsc].unlink()
+            if self.weight_channels[tsc]:
+                self.weight_channels[tsc].close()
+                self.weight_channels[tsc].unlink()
+
         print('...finishing all processes')
 
-    def create_mp_stats_dict(self, tsc_ids):
+    def create_mp_stats_dict(self, tsc_ids, netdata):
         ###use this mp shared dict for data between procs
         manager = Manager()
         rl_stats = manager.dict({})
         for i in tsc_ids:
+            leader = netdata['share'][i]['leader']
+            if leader != i:
+                #parameter sharing tsc use their leader's stats
+                continue
             rl_stats[i] = manager.dict({})
+            #trajectories stored and not yet trained on, actors
+            #and the learner only change it holding the lock
             rl_stats[i]['n_exp'] = 0
+            rl_stats[i]['lock'] = manager.Lock()
             rl_stats[i]['updates'] = 0
             rl_stats[i]['max_r'] = 1.0
-            rl_stats[i]['online'] = None
-            rl_stats[i]['target'] = None
             rl_stats['n_sims'] = 0
             rl_stats['total_sims'] = 104
             rl_stats['delay'] = manager.list()
             rl_stats['queue'] = manager.list()
             rl_stats['throughput'] = manager.list()
+        for i in tsc_ids:
+            rl_stats[i] = rl_stats[netdata['share'][i]['leader']]
 
         return rl_stats
 
-    def create_mp_exp_replay(self, tsc_ids):
+    def create_mp_exp_replay(self, tsc_ids, netdata):
         ###create shared memory for experience replay 
         #(governs agents appending and learners accessing and deleting)
         manager = Manager()
-        return manager.dict({ tsc: manager.list() for tsc in tsc_ids })
+        exp_replays = manager.dict({})
+        for tsc in tsc_ids:
+            leader = netdata['share'][tsc]['leader']
+            if leader == tsc:
+                exp_replays[tsc] = manager.list()
+        for tsc in tsc_ids:
+            exp_replays[tsc] = exp_replays[netdata['share'][tsc]['leader']]
+        return exp_replays
+
+    def create_shared_exp_replay(self, tsc_ids, netdata):
+        ###create fixed size shared memory ring buffer replays,
+        #sized by the state dimensions of each tsc, tsc sharing
+        #parameters pool their experiences in their leader's replay
+        #shared memory is python 3.8+, only imported when used
+        from src.sharedreplay import SharedExpReplay
+        exp_replays = {}
+        for tsc in tsc_ids:
+            share = netdata['share'][tsc]
+            if share['leader'] == tsc:
+                exp_replays[tsc] = SharedExpReplay(self.args.nreplay*share['n'], self.args.nsteps, share['input_d'], 1, self.args.tsc == 'dqn')
+        for tsc in tsc_ids:
+            exp_replays[tsc] = exp_replays[netdata['share'][tsc]['leader']]
+        return exp_replays
+
+    def create_weight_channels(self, tsc_ids, netdata):
+        ###shared memory channels if available, otherwise
+        #weights go through a manager dict
+        from src.weightchannel import WeightChannel, ManagerWeightChannel
+        if self.args.weights is None:
+            self.args.weights = 'shared' if has_shared_memory() else 'manager'
+        if self.args.weights == 'shared':
+            assert has_shared_memory(), '-weights shared requires python 3.8+ (multiprocessing.shared_memory), use -weights manager'
+        else:
+            manager = Manager()
+        weight_channels = {}
+        for tsc in tsc_ids:
+            share = netdata['share'][tsc]
+            if share['leader'] == tsc:
+                if self.args.weights == 'shared':
+                    shapes = get_weight_shapes(self.args.tsc, share['input_d'], share['output_d'], self.args.n_hidden)
+                    weight_channels[tsc] = WeightChannel(shapes, self.args.sync_decisions, self.args.sync_t)
+                else:
+                    weight_channels[tsc] = ManagerWeightChannel(manager, self.args.sync_decisions, self.args.sync_t)
+        for tsc in tsc_ids:
+            weight_channels[tsc] = weight_channels[netdata['share'][tsc]['leader']]
+        return weight_channels
 
     def assign_learner_agents(self, agents, n_learners):
         learner_agents = [ [] for _ in range(n_learners)]
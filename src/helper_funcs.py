@@ -27,3 +27,11 @@ def write_to_log(s):
     fp += 'log.txt'
     t = get_time_now()
     write_line_to_file(fp, 'a+', t+':: '+s)
+
+def has_shared_memory():
+    ###multiprocessing.shared_memory is python 3.8+
+    try:
+        from multiprocessing import shared_memory
+        return True
+    except ImportError:
+        return False
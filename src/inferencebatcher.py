@@ -0,0 +1,45 @@
+class InferenceBatcher:
+    """Batch the rl agent forward passes of all traffic signal
+    controllers deciding in the same simulation step.
+
+    Controllers submit their decision states, one batched forward pass
+    is run per network (or session for ddpg) and controllers pick up
+    their action when they act.
+    """
+    def __init__(self):
+        self.requests = {}
+        self.outputs = {}
+
+    def new_step(self):
+        self.requests = {}
+        self.outputs = {}
+
+    def submit(self, tsc_id, agent, state):
+        if agent.prepare_action():
+            self.requests[tsc_id] = (agent, state)
+        else:
+            #agent acts without a forward pass (i.e., exploring)
+            self.outputs[tsc_id] = None
+
+    def run(self):
+        ###group requests by agent type, each type batches its own forward
+        agent_types = {}
+        for tsc_id in self.requests:
+            agent, state = self.requests[tsc_id]
+            if agent.mode == 'train':
+                agent.retrieve_weights('online')
+            agent_types.setdefault(type(agent), []).append(tsc_id)
+
+        for agent_type in agent_types:
+            tsc_ids = agent_types[agent_type]
+            outputs = agent_type.batch_forward([ self.requests[t][0] for t in tsc_ids ],
+                                               [ self.requests[t][1] for t in tsc_ids ])
+            for tsc_id, output in zip(tsc_ids, outputs):
+                self.outputs[tsc_id] = output
+        self.requests = {}
+
+    def get_action(self, tsc_id, agent, state):
+        if tsc_id in self.outputs:
+            return agent.select_action(self.outputs.pop(tsc_id))
+        #not submitted this step, act unbatched
+        return agent.get_action(state)
@@ -0,0 +1,86 @@
+class InstrumentedDomain:
+    """One domain (vehicle, junction, ...) of an instrumented
+    connection, its commands are counted by the connection."""
+    def __init__(self, conn, name, domain):
+        self._conn = conn
+        self._name = name
+        self._domain = domain
+
+    def __getattr__(self, attr):
+        value = getattr(self._domain, attr)
+        if not callable(value):
+            return value
+        return self._conn.wrap(self._name+'.'+attr, value)
+
+class InstrumentedConnection:
+    """Counts the commands a sim sends to the simulator.
+
+    Wraps a connection (traci, libsumo or synthetic) and counts the
+    calls of each command (domain.method). For traci socket
+    connections every message to sumo is also counted as a round trip
+    with its bytes sent and received, attributed to the command that
+    sent it. Commands answered from subscription results already
+    received make no round trips.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.domains = {}
+        self.command = None
+        self.reset()
+        if hasattr(conn, '_sendExact'):
+            send = conn._sendExact
+            def counted_send():
+                #message length prefix is 4 bytes
+                sent = len(conn._string) + 4
+                result = send()
+                self.count(1, sent, len(result._content))
+                return result
+            conn._sendExact = counted_send
+
+    def reset(self):
+        #command: [calls, round trips, bytes sent, bytes received]
+        self.stats = {}
+
+    def wrap(self, name, f):
+        def counted(*args, **kwargs):
+            self.stats.setdefault(name, [0, 0, 0, 0])[0] += 1
+            outer = self.command
+            self.command = name
+            try:
+                return f(*args, **kwargs)
+            finally:
+                self.command = outer
+        return counted
+
+    def count(self, round_trips, sent, received):
+        #messages sent outside counted commands, e.g. by the backend
+        stats = self.stats.setdefault(self.command or 'other', [0, 0, 0, 0])
+        stats[1] += round_trips
+        stats[2] += sent
+        stats[3] += received
+
+    def __getattr__(self, name):
+        if name in self.domains:
+            return self.domains[name]
+        value = getattr(self.conn, name)
+        if callable(value):
+            return self.wrap(name, value)
+        self.domains[name] = InstrumentedDomain(self, name, value)
+        return self.domains[name]
+
+    def round_trips(self):
+        return sum([ self.stats[c][1] for c in self.stats ])
+
+    def summary(self, sim_seconds):
+        ###per command calls, round trips and bytes per sim second,
+        #most round trips first
+        sim_seconds = max(sim_seconds, 1)
+        lines = ['ROUND TRIPS PER SIM SECOND '+str(round(self.round_trips()/sim_seconds, 2))
+                 +' CALLS PER SIM SECOND '+str(round(sum([ self.stats[c][0] for c in self.stats ])/sim_seconds, 2))]
+        for c in sorted(self.stats, key=lambda c: (self.stats[c][1], self.stats[c][0]), reverse=True):
+            calls, round_trips, sent, received = self.stats[c]
+            lines.append('    '+c+' calls/s '+str(round(calls/sim_seconds, 2))
+                         +' round trips/s '+str(round(round_trips/sim_seconds, 2))
+                         +' bytes sent/s '+str(round(sent/sim_seconds, 1))
+                         +' bytes received/s '+str(round(received/sim_seconds, 1)))
+        return '\n'.join(lines)
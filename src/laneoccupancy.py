@@ -0,0 +1,53 @@
+import numpy as np
+
+class LaneOccupancy:
+    """Vehicles on an intersection's lanes for the current step.
+
+    Vehicle counts, halted vehicle counts and where each lane's
+    vehicles are in the sim's VehicleSnapshot arrays are kept in
+    arrays preallocated in the order of the given lanes and filled
+    once per step. Controllers and metrics compute states, queues
+    and pressures as vector ops on them. Only the vehicles within the
+    snapshot's radius of each lane's stop line are the intersection's,
+    like those of its junction's own subscription. Lanes the snapshot
+    does not track (internal lanes) stay empty.
+    """
+    def __init__(self, lanes):
+        self.lanes = list(lanes)
+        self.idx = { l:i for i, l in enumerate(self.lanes) }
+        n = len(self.lanes)
+        self.counts = np.zeros(n, dtype=np.int64)
+        self.halted = np.zeros(n, dtype=np.int64)
+        self.start = np.zeros(n, dtype=np.int64)
+        self.end = np.zeros(n, dtype=np.int64)
+        self.snapshot = None
+        #lanes known to the snapshot and their snapshot indices
+        self.known = None
+        self.snapshot_idx = None
+
+    def update(self, snapshot):
+        if self.known is None:
+            self.known = np.array([ i for i, l in enumerate(self.lanes) if l in snapshot.lane_idx ], dtype=np.int64)
+            self.snapshot_idx = snapshot.lane_indices([ self.lanes[i] for i in self.known ])
+        self.snapshot = snapshot
+        self.counts[self.known] = snapshot.stop_count[self.snapshot_idx]
+        self.halted[self.known] = snapshot.stop_queue[self.snapshot_idx]
+        self.start[self.known] = snapshot.stop_start[self.snapshot_idx]
+        self.end[self.known] = snapshot.lane_end[self.snapshot_idx]
+
+    def indices(self, lanes):
+        return np.array([ self.idx[l] for l in lanes ], dtype=np.int64)
+
+    def empty(self):
+        return not self.counts.any()
+
+    def get_count(self, lane):
+        return int(self.counts[self.idx[lane]])
+
+    def get_ids(self, lane):
+        i = self.idx[lane]
+        return self.snapshot.ids[self.start[i]:self.end[i]]
+
+    def get_positions(self, lane):
+        i = self.idx[lane]
+        return self.snapshot.pos[self.start[i]:self.end[i]]
@@ -1,18 +1,16 @@
 import time, os
 from multiprocessing import *
-import tensorflow as tf
 
 import numpy as np
 
-from tensorflow.python.framework.ops import disable_eager_execution
-
 from src.nn_factory import gen_neural_networks
 from src.rl_factory import rl_factory
 from src.helper_funcs import write_line_to_file, check_and_make_dir, get_time_now, write_to_log
-from src.picklefuncs import save_data, load_data
+from src.replaysnapshot import ReplaySnapshot
+from src.picklefuncs import load_data
 
 class LearnerProc(Process):
-    def __init__(self, idx, args, barrier, netdata, agent_ids, rl_stats, exp_replay):
+    def __init__(self, idx, args, barrier, netdata, agent_ids, rl_stats, exp_replay, weight_channels, new_exp_event, done_events):
         Process.__init__(self)
         self.idx = idx
         self.args = args
@@ -21,6 +19,11 @@ class LearnerProc(Process):
         self.agent_ids = agent_ids
         self.rl_stats = rl_stats
         self.exp_replay = exp_replay
+        self.weight_channels = weight_channels
+        #set by actors storing experiences for this learner's agents
+        self.new_exp_event = new_exp_event
+        #set by each learner when all its agents finished learning
+        self.done_events = done_events
         self.save_t = 0
         self.replay_fp =  self.args.save_replay+'/'+self.args.tsc+'/'
         #for saving agent progress
@@ -59,6 +62,10 @@ class LearnerProc(Process):
         self.barrier.wait()
         write_to_log(' LEARNER #'+str(self.idx)+' GENERATING AGENTS...')
 
+        #columnar replay snapshots on disk, shared replays
+        #only append trajectories stored since the last save
+        self.snapshots = { _id:ReplaySnapshot(self.replay_fp+_id, discrete=self.args.tsc == 'dqn') for _id in self.agent_ids }
+        self.saved_counts = { _id:None for _id in self.agent_ids }
         if self.args.load_replay:
             self.load_replays()
 
@@ -73,12 +80,23 @@ class LearnerProc(Process):
 
         self.save_t = time.time()
         othert = time.time()
+        #agents whose exp replay has been filled
+        filled = set()
+        #batch updates earned by stored trajectories, not yet run
+        self.update_credit = { tsc:0.0 for tsc in self.agent_ids }
         #keep looping until all agents have
         #achieved sufficient batch updates
         while not self.finished_learning(self.agent_ids):
+            #clear before checking agents, experiences stored
+            #while training set it again and nothing is missed
+            self.new_exp_event.clear()
+            trained = False
             for tsc in self.agent_ids:
                 #wait until exp replay buffer full
-                if len(self.exp_replay[tsc]) >= self.args.nreplay:
+                if tsc not in filled:
+                    if len(self.exp_replay[tsc]) < agents[tsc].n_exp_replay:
+                        continue
+                    filled.add(tsc)
                     #reset the number of experiences once when the 
                     #exp replay is filled for the first time
                     if self.rl_stats[tsc]['updates'] == 0:
@@ -86,11 +104,15 @@ class LearnerProc(Process):
                             self.save_replays()
                         print(tsc+' exp replay full, beginning batch updates********')
                         #write_to_log(' LEARNER #'+str(self.idx)+' START LEARNING '+str(tsc))
-                        self.rl_stats[tsc]['n_exp'] = len(self.exp_replay[tsc])
-                    if self.rl_stats[tsc]['updates'] < self.args.updates and self.rl_stats[tsc]['n_exp'] > 0: 
-                        for i in range(min(self.rl_stats[tsc]['n_exp'], 4)):
-                           agents[tsc].train_batch(self.args.target_freq)
-                        agents[tsc].clip_exp_replay()
+                        with self.rl_stats[tsc]['lock']:
+                            self.rl_stats[tsc]['n_exp'] = len(self.exp_replay[tsc])
+                if self.train_agent(tsc, agents[tsc]) > 0:
+                    trained = True
+
+            if not trained:
+                #nothing trainable, idle until new experiences
+                #or it is time to save/log
+                self.new_exp_event.wait(timeout=1.0)
 
             t = time.time()
             if t - othert > 90:
@@ -105,18 +127,20 @@ class LearnerProc(Process):
             if self.args.save:
                 if self.time_to_save():
                     self.save_weights(neural_networks)
+                    self.save_replays()
 
                     #write agent training progress
                     #only on one learner
                     if self.idx == 0:
                         self.write_progress()
         write_to_log(' LEARNER #'+str(self.idx)+' FINISHED TRAINING LOOP ===========')
+        self.done_events[self.idx].set()
 
         if self.idx == 0:
             #if other agents arent finished learning
             #keep updating progress
-            while not self.finished_learning(self.tsc_ids):
-                if self.time_to_save():
+            for done in self.done_events:
+                while not done.wait(timeout=self.args.save_t):
                     self.write_progress()
 
 
@@ -128,6 +152,28 @@ class LearnerProc(Process):
         updates = [str(self.rl_stats[i]['updates']) for i in self.agent_ids]
         write_to_log(' LEARNER #'+str(self.idx)+' FINISHED UPDATES'+str(updates))
 
+    def train_agent(self, tsc, agent):
+        ###batch updates the agent has credit for, each new
+        #experience trajectory stored earns utd updates,
+        #an update of a parameter sharing agent costs n_share
+        stats = self.rl_stats[tsc]
+        if stats['updates'] >= self.args.updates:
+            return 0
+        #n_exp is the integer count of trajectories actors stored,
+        #it is read and taken under their lock, the fractional
+        #updates it earns are kept by the learner
+        with stats['lock']:
+            n_exp = stats['n_exp']
+            stats['n_exp'] = 0
+        self.update_credit[tsc] += n_exp * self.args.utd / agent.n_share
+        #at most 4 updates before moving on to the next agent
+        n = min(int(self.update_credit[tsc]), 4)
+        self.update_credit[tsc] -= n
+        for i in range(n):
+            agent.train_batch(self.args.target_freq)
+        agent.clip_exp_replay()
+        return n
+
     def time_to_save(self):
         t = time.time()                        
         if t - self.save_t > self.args.save_t:
@@ -149,14 +195,17 @@ class LearnerProc(Process):
     def gen_agents(self, neural_networks):
         agents = {}
         for agent in self.agent_ids:
-            n_actions = 1 if self.args.tsc == 'ddpg' else len(self.netdata['inter'][agent]['green_phases'])
+            share = self.netdata['share'][agent]
+            n_actions = 1 if self.args.tsc == 'ddpg' else share['output_d']
             agents[agent] = rl_factory(self.args.tsc, 
                                        self.args, 
                                        neural_networks[agent], 
                                        self.exp_replay[agent], 
                                        self.rl_stats[agent], 
+                                       self.weight_channels[agent],
                                        n_actions,
-                                       self.args.eps)
+                                       self.args.eps,
+                                       share['n'])
         return agents
         
     def distribute_weights(self, neural_networks):
@@ -176,7 +225,7 @@ class LearnerProc(Process):
                 #raise not found exceptions
                 assert 0, 'Supplied RL traffic signal controller '+str(self.args.tsc)+' does not exist.'
             #send weights to sim processes
-            self.rl_stats[nn]['online'] = weights
+            self.weight_channels[nn].publish(weights)
         return neural_networks
 
     def save_weights(self, neural_networks):
@@ -209,23 +258,48 @@ class LearnerProc(Process):
     def save_replays(self):
         check_and_make_dir(self.replay_fp)
         for _id in self.agent_ids:                                     
-            save_data(self.replay_fp+_id+'.p', [ _ for _ in self.exp_replay[_id]])
+            replay = self.exp_replay[_id]
+            snapshot = self.snapshots[_id]
+            if hasattr(replay, 'slots_since'):
+                #first save of this run replaces any old snapshot
+                if self.saved_counts[_id] is None:
+                    snapshot.clear()
+                    self.saved_counts[_id] = 0
+                slots, self.saved_counts[_id] = replay.slots_since(self.saved_counts[_id])
+                snapshot.append_batch(replay.get_batch(slots))
+            else:
+                #manager replays are clipped from the front,
+                #rewrite their snapshot
+                snapshot.clear()
+                snapshot.append(replay[:])
             print('FINISHED SAVING REPLAY FOR '+str(_id))
 
     def load_replays(self):
         for _id in self.agent_ids:
-            replay_fp = self.replay_fp+_id+'.p' 
-            if os.path.isfile(replay_fp):
-                data = load_data(replay_fp)
-                rewards = []
-                for traj in data:
-                    for exp in traj:
-                        rewards.append(abs(exp['r']))
-                    self.exp_replay[_id].append(traj) 
-                #find largest reward to reward normalization
-                print('mean '+str(np.mean(rewards))+' std '+str(np.std(rewards))+' median '+str(np.median(rewards)))
-                self.rl_stats[_id]['r_max'] = max(rewards)
-                print(str(self.idx)+' LARGEST REWARD '+str(self.rl_stats[_id]['r_max']))
+            snapshot = self.snapshots[_id]
+            #replays pickled by older versions are converted
+            #to a snapshot the first time they are loaded
+            pickle_fp = self.replay_fp+_id+'.p'
+            if not snapshot.exists() and os.path.isfile(pickle_fp):
+                snapshot.append(list(load_data(pickle_fp)))
+                print('CONVERTED PICKLED REPLAY '+str(pickle_fp)+' TO '+str(snapshot.path))
+            if snapshot.exists():
+                replay = self.exp_replay[_id]
+                #only the newest trajectories fit in the replay
+                capacity = self.args.nreplay*self.netdata['share'][_id]['n']
+                idx = np.arange(max(len(snapshot) - capacity, 0), len(snapshot))
+                if hasattr(replay, 'append_batch'):
+                    replay.append_batch(snapshot.get_batch(idx))
+                    #loaded trajectories are already in the snapshot
+                    self.saved_counts[_id] = replay.n_appended()
+                else:
+                    replay.extend([ snapshot[i] for i in idx ])
+                #reward statistics are kept with the snapshot,
+                #largest reward for reward normalization
+                mean, std, abs_max = snapshot.reward_stats()
+                print('mean '+str(mean)+' std '+str(std)+' largest '+str(abs_max))
+                self.rl_stats[_id]['max_r'] = max(self.rl_stats[_id]['max_r'], abs_max)
+                print(str(self.idx)+' LARGEST REWARD '+str(self.rl_stats[_id]['max_r']))
                 print('SUCCESSFULLY LOADED REPLAY FOR '+str(_id))
             else:
-                print('WARNING, tried to load experience replay at '+str(replay_fp)+' but it does not exist, continuing without loading...')
+                print('WARNING, tried to load experience replay at '+str(snapshot.path)+' but it does not exist, continuing without loading...')
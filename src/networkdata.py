@@ -1,12 +1,15 @@
 import sys, subprocess, os
 import inspect
 
+#sumolib of the sumo install, or the pip package
+#on machines without sumo (-backend synthetic)
 if 'SUMO_HOME' in os.environ:
     tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
     sys.path.append(tools)
+try:
     import sumolib
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
+except ImportError:
+    sys.exit("please declare environment variable 'SUMO_HOME' or install sumolib")
 '''
 # we need to import python modules from the $SUMO_HOME/tools directory
 try:
@@ -72,6 +72,26 @@ class DDPGActor(NeuralNet):
     def forward(self, x, nettype):
         return self.sess.run(self.models[nettype].mu, feed_dict={self.models[nettype].input: x})
 
+    @staticmethod
+    def fused_forward(actors, states, nettype):
+        ###forward a state for each actor in a single session run,
+        #actors that are the same network get their states stacked
+        sess = actors[0].sess
+        networks = {}
+        for i, actor in enumerate(actors):
+            networks.setdefault(id(actor), []).append(i)
+        fetches, feed_dict = [], {}
+        for idx in networks.values():
+            model = actors[idx[0]].models[nettype]
+            fetches.append(model.mu)
+            feed_dict[model.input] = np.stack([ states[i] for i in idx ])
+        mus = sess.run(fetches, feed_dict=feed_dict)
+        outputs = [None]*len(actors)
+        for idx, mu in zip(networks.values(), mus):
+            for j, i in enumerate(idx):
+                outputs[i] = mu[j]
+        return outputs
+
     def backward(self, states, grads):
         self.sess.run(self.models['online'].optimize,
                       feed_dict={self.models['online'].input: states,
@@ -57,7 +57,12 @@ class DDPGCriticNet:
                                kernel_initializer=he_uniform(),
                                kernel_regularizer=tf.keras.regularizers.l2(0.01))
                                                                                                                   
-            self.loss = tf.compat.v1.losses.mean_squared_error(self.q_target, self.q)
+            #importance sampling weights for prioritized replay, all ones otherwise
+            self.weights = tf.compat.v1.placeholder_with_default(tf.ones_like(self.q_target),
+                                                                 shape=[None,1],
+                                                                 name='weights')
+
+            self.loss = tf.compat.v1.losses.mean_squared_error(self.q_target, self.q, weights=self.weights)
 
             self.params = tf.compat.v1.trainable_variables(scope=name)
 
@@ -99,11 +104,13 @@ class DDPGCritic(NeuralNet):
                              feed_dict={self.models[nettype].input: x,
                                         self.models[nettype].actions: a})
 
-    def backward(self, states, actions, critic_target):
-        return self.sess.run(self.models['online'].optimize,
-                      feed_dict={self.models['online'].input: states,
-                                 self.models['online'].actions: actions,
-                                 self.models['online'].q_target: critic_target})
+    def backward(self, states, actions, critic_target, weights=None):
+        feed_dict = {self.models['online'].input: states,
+                     self.models['online'].actions: actions,
+                     self.models['online'].q_target: critic_target}
+        if weights is not None:
+            feed_dict[self.models['online'].weights] = weights
+        return self.sess.run(self.models['online'].optimize, feed_dict=feed_dict)
 
     def transfer_weights(self):
         """ Transfer model weights to target model with a factor of Tau
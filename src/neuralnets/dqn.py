@@ -10,8 +10,11 @@ from src.neuralnet import NeuralNet
 from src.helper_funcs import check_and_make_dir
 
 class DQN(NeuralNet):
-    def __init__(self, input_d, hidden_d, hidden_act, output_d, output_act, lr, lre, learner=False):
+    def __init__(self, input_d, hidden_d, hidden_act, output_d, output_act, lr, lre, learner=False, train_step='batch'):
         super().__init__(input_d, hidden_d, hidden_act, output_d, output_act, learner=learner)
+        #batch applies one gradient update per minibatch,
+        #sample one update per experience (original behaviour)
+        self.train_step = train_step
         for model in self.models:
             #self.models[model].compile(Adam(learning_rate=lr, epsilon=lre), loss='mse')
             self.models[model].compile(Adam(lr=lr, epsilon=lre), loss='mse')
@@ -30,8 +33,14 @@ class DQN(NeuralNet):
     def forward(self, _input, nettype):
         return self.models[nettype].predict(_input)
   
-    def backward(self, _input, _target):
-        self.models['online'].fit(_input, _target, batch_size = 1, epochs = 1,  verbose=0 )
+    def backward(self, _input, _target, sample_weight=None):
+        if self.train_step == 'batch':
+            self.models['online'].train_on_batch(_input, _target, sample_weight=sample_weight)
+        elif self.train_step == 'sample':
+            self.models['online'].fit(_input, _target, batch_size = 1, epochs = 1,  verbose=0, sample_weight=sample_weight )
+        else:
+            #raise not found exceptions
+            assert 0, 'Supplied dqn train step '+str(self.train_step)+' does not exist.'
 
     def transfer_weights(self):
         """ Transfer online weights to target model.
@@ -0,0 +1,173 @@
+import os
+
+import numpy as np
+
+from src.neuralnet import NeuralNet
+from src.picklefuncs import load_data
+
+def elu(x, tmp):
+    #elu(x) = x if x > 0 else exp(x) - 1, in place
+    np.minimum(x, 0.0, out=tmp)
+    np.expm1(tmp, out=tmp)
+    np.maximum(x, 0.0, out=x)
+    x += tmp
+
+def relu(x, tmp):
+    np.maximum(x, 0.0, out=x)
+
+def tanh(x, tmp):
+    np.tanh(x, out=x)
+
+def sigmoid(x, tmp):
+    #sigmoid(x) = (tanh(x/2) + 1)/2
+    x *= 0.5
+    np.tanh(x, out=x)
+    x += 1.0
+    x *= 0.5
+
+def linear(x, tmp):
+    pass
+
+activations = {'elu':elu, 'relu':relu, 'tanh':tanh, 'sigmoid':sigmoid, 'linear':linear}
+
+class NumpyMLP:
+    """Inference only dense network evaluated with NumPy.
+
+    Layer outputs are written into buffers preallocated for the largest
+    batch seen so far, so forward passes do not allocate intermediates.
+    Batch normalization is folded into the preceding dense layer.
+    """
+    def __init__(self, layer_d, acts, batch_norm, bn_eps=1e-3):
+        self.layer_d = layer_d
+        for act in acts:
+            if act not in activations:
+                #raise not found exceptions
+                assert 0, 'Supplied activation '+str(act)+' is not supported by numpy inference.'
+        self.acts = [activations[act] for act in acts]
+        self.batch_norm = batch_norm
+        self.bn_eps = bn_eps
+        self.weights = []
+        self.kernels = [np.zeros((layer_d[i], layer_d[i+1]), dtype=np.float32) for i in range(len(layer_d)-1)]
+        self.biases = [np.zeros(layer_d[i+1], dtype=np.float32) for i in range(len(layer_d)-1)]
+        self.alloc_buffers(1)
+
+    def alloc_buffers(self, n):
+        self.max_batch = n
+        self.x = np.empty((n, self.layer_d[0]), dtype=np.float32)
+        self.outputs = [np.empty((n, d), dtype=np.float32) for d in self.layer_d[1:]]
+        self.tmp = [np.empty((n, d), dtype=np.float32) for d in self.layer_d[1:]]
+
+    def set_weights(self, weights):
+        ###dense layers as [kernel, bias], hidden layers with
+        #batch normalization as [kernel, bias, gamma, beta]
+        self.weights = [np.array(w, dtype=np.float32) for w in weights]
+        i = 0
+        for layer in range(len(self.kernels)):
+            kernel, bias = self.weights[i], self.weights[i+1]
+            i += 2
+            if self.batch_norm and layer < len(self.kernels)-1:
+                gamma, beta = self.weights[i], self.weights[i+1]
+                i += 2
+                #the tf actor runs batch norm in inference mode with
+                #its initial moving mean 0 and variance 1
+                scale = gamma / np.sqrt(1.0 + self.bn_eps)
+                kernel = kernel * scale
+                bias = (bias * scale) + beta
+            self.kernels[layer][:] = kernel
+            self.biases[layer][:] = bias
+
+    def get_weights(self):
+        return [np.array(w) for w in self.weights]
+
+    def forward(self, x):
+        n = x.shape[0]
+        if n > self.max_batch:
+            self.alloc_buffers(n)
+        h = self.x[:n]
+        h[:] = x
+        for kernel, bias, act, out, tmp in zip(self.kernels, self.biases, self.acts, self.outputs, self.tmp):
+            out = out[:n]
+            np.dot(h, kernel, out=out)
+            out += bias
+            act(out, tmp[:n])
+            h = out
+        #callers may hold on to outputs, do not hand out the buffer
+        return h.copy()
+
+class NumpyNet(NeuralNet):
+    """NeuralNet interface over NumpyMLP models, for processes
+    that only run forward passes (actors, testing) and do not
+    need tensorflow.
+    """
+    def __init__(self, input_d, hidden_d, hidden_act, output_d, output_act, batch_norm):
+        self.batch_norm = batch_norm
+        super().__init__(input_d, hidden_d, hidden_act, output_d, output_act, learner=False)
+
+    def create_model(self, input_d, hidden_d, hidden_act, output_d, output_act):
+        layer_d = [input_d]+list(hidden_d)+[output_d]
+        acts = [hidden_act]*len(hidden_d)+[output_act]
+        return NumpyMLP(layer_d, acts, self.batch_norm)
+
+    def forward(self, x, nettype):
+        return self.models[nettype].forward(x)
+
+    @staticmethod
+    def fused_forward(nets, states, nettype):
+        ###forward a state for each net, nets that
+        #are the same network get their states stacked
+        networks = {}
+        for i, net in enumerate(nets):
+            networks.setdefault(id(net), []).append(i)
+        outputs = [None]*len(nets)
+        for idx in networks.values():
+            out = nets[idx[0]].forward(np.stack([ states[i] for i in idx ]), nettype)
+            for j, i in enumerate(idx):
+                outputs[i] = out[j]
+        return outputs
+
+    def get_weights(self, nettype):
+        return self.models[nettype].get_weights()
+
+    def set_weights(self, weights, nettype):
+        self.models[nettype].set_weights(weights)
+
+class NumpyDQN(NumpyNet):
+    def __init__(self, input_d, hidden_d, hidden_act, output_d, output_act):
+        super().__init__(input_d, hidden_d, hidden_act, output_d, output_act, False)
+
+    def load_weights(self, path):
+        path += '.h5'
+        if os.path.exists(path):
+            self.set_weights(load_h5_weights(path), 'online')
+        else:
+            #raise not found exceptions
+            assert 0, 'Failed to load weights, supplied weight file path '+str(path)+' does not exist.'
+
+class NumpyDDPGActor(NumpyNet):
+    def __init__(self, input_d, hidden_d, hidden_act, output_d, output_act):
+        #the tf actor always uses elu hidden layers with batch norm
+        super().__init__(input_d, hidden_d, 'elu', output_d, output_act, True)
+
+    def load_weights(self, path):
+        path += '.p'
+        if os.path.exists(path):
+            self.set_weights(load_data(path), 'online')
+        else:
+            #raise not found exceptions
+            assert 0, 'Failed to load weights, supplied weight file path '+str(path)+' does not exist.'
+
+def load_h5_weights(path):
+    ###read the weight list of a keras save_weights h5 file
+    import h5py
+    weights = []
+    with h5py.File(path, 'r') as f:
+        if 'model_weights' in f:
+            f = f['model_weights']
+        for layer in f.attrs['layer_names']:
+            g = f[decode(layer)]
+            for w in g.attrs['weight_names']:
+                weights.append(np.array(g[decode(w)]))
+    return weights
+
+def decode(s):
+    return s.decode('utf8') if isinstance(s, bytes) else s
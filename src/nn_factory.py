@@ -1,20 +1,42 @@
 import os
 
-import tensorflow as tf
+from src.neuralnets.npinference import NumpyDQN, NumpyDDPGActor
+from src.dtse import dtse_cells
 
-from src.neuralnets.dqn import DQN
-from src.neuralnets.ddpgactor import DDPGActor
-from src.neuralnets.ddpgcritic import DDPGCritic
+#tensorflow is only imported by procs that use it,
+#actors running numpy inference never import it
+
+def use_numpy(args, learner):
+    return args.infer == 'numpy' and not learner
 
 def nn_factory( nntype, input_d, output_d, args, learner, load, tsc, n_hidden, sess=None):
     nn = None
     hidden_layers = [input_d*n_hidden, input_d*n_hidden]
 
+    if use_numpy(args, learner):
+        if nntype == 'dqn':
+            nn = NumpyDQN(input_d, hidden_layers,
+                          args.hidden_act, output_d,
+                          'linear')
+        elif nntype == 'ddpg':
+            nn = {'actor':NumpyDDPGActor(input_d, hidden_layers,
+                                         args.hidden_act, output_d,
+                                         'tanh')}
+        else:
+            #raise not found exceptions
+            assert 0, 'Supplied traffic signal control argument type '+str(tsc)+' does not exist.'
+        return nn
+
+    from src.neuralnets.dqn import DQN
+    from src.neuralnets.ddpgactor import DDPGActor
+    from src.neuralnets.ddpgcritic import DDPGCritic
+
     if nntype == 'dqn':
          nn = DQN(input_d, hidden_layers,     
                   args.hidden_act, output_d,  
                   'linear', args.lr,          
-                  args.lre, learner=learner)  
+                  args.lre, learner=learner,
+                  train_step=args.train_step)
     elif nntype == 'ddpg':
         nn = {}
         nn['actor'] = DDPGActor(input_d, hidden_layers,     
@@ -39,9 +61,11 @@ def nn_factory( nntype, input_d, output_d, args, learner, load, tsc, n_hidden, s
 
     return nn
 
-def get_in_out_d(tsctype, n_incoming_lanes, n_phases):
+def get_in_out_d(tsctype, n_incoming_lanes, n_phases, state='density', cell=5.0):
+    #density and queue or dtse count and speed cells per lane
+    lane_d = 2*dtse_cells(cell) if state == 'dtse' else 2
     #+1 for the all red phase (i.e., terminal state, no vehicles at intersection)
-    input_d = (n_incoming_lanes*2) + n_phases + 1
+    input_d = (n_incoming_lanes*lane_d) + n_phases + 1
     if tsctype == 'dqn':
         return input_d, n_phases
     elif tsctype == 'ddpg':
@@ -50,12 +74,64 @@ def get_in_out_d(tsctype, n_incoming_lanes, n_phases):
         #raise not found exceptions
         assert 0, 'Supplied traffic signal control argument type '+str(tsc)+' does not exist.'
 
+def get_share_groups(share, tsctype, netdata, state='density', cell=5.0):
+    ###assign each tsc the group whose network and replay it uses,
+    #none: one per tsc, dims: one per distinct input/output dims,
+    #pad: one for all tsc, padded to the largest dims
+    dims = { tsc:get_in_out_d(tsctype,
+                              len(netdata['inter'][tsc]['incoming_lanes']),
+                              len(netdata['inter'][tsc]['green_phases']),
+                              state, cell)
+             for tsc in sorted(netdata['inter'].keys()) }
+    if share == 'none':
+        keys = { tsc:tsc for tsc in dims }
+    elif share == 'dims':
+        keys = { tsc:dims[tsc] for tsc in dims }
+    elif share == 'pad':
+        keys = { tsc:'all' for tsc in dims }
+    else:
+        #raise not found exceptions
+        assert 0, 'Supplied parameter sharing argument '+str(share)+' does not exist.'
+
+    groups = {}
+    for tsc in dims:
+        groups.setdefault(keys[tsc], []).append(tsc)
+    #the first member of each group owns its network, replay and stats,
+    #states are the lane block then the phase one hot (green phases
+    #and all red), each padded to the group's largest
+    share_data = {}
+    for members in groups.values():
+        n_phases = { tsc:len(netdata['inter'][tsc]['green_phases']) for tsc in members }
+        lane_d = max([ dims[tsc][0] - n_phases[tsc] - 1 for tsc in members ])
+        phase_d = max(n_phases.values()) + 1
+        output_d = max([ dims[tsc][1] for tsc in members ])
+        for tsc in members:
+            share_data[tsc] = {'leader':members[0], 'n':len(members),
+                               'input_d':lane_d + phase_d, 'output_d':output_d,
+                               'lane_d':lane_d, 'phase_d':phase_d}
+    return share_data
+
+def get_weight_shapes(tsctype, input_d, output_d, n_hidden):
+    ###shapes of the weight list get_weights returns for the
+    #network actors run (dqn, or the ddpg actor)
+    h = input_d*n_hidden
+    if tsctype == 'dqn':
+        #dense kernel and bias per layer
+        return [(input_d, h), (h,), (h, h), (h,), (h, output_d), (output_d,)]
+    elif tsctype == 'ddpg':
+        #dense kernel, bias, batch norm gamma, beta per hidden layer
+        return [(input_d, h), (h,), (h,), (h,), (h, h), (h,), (h,), (h,), (h, output_d), (output_d,)]
+    else:
+        #raise not found exceptions
+        assert 0, 'Supplied traffic signal control argument type '+str(tsctype)+' does not exist.'
+
 def gen_neural_networks(args, netdata, tsctype, tsc_ids, learner, load, n_hidden):
         neural_nets = {}
         if tsctype == 'dqn' or tsctype == 'ddpg':
             sess = None
             #if using tf, prepare necessary
-            if tsctype == 'ddpg':
+            if tsctype == 'ddpg' and not use_numpy(args, learner):
+                import tensorflow as tf
 
                 #config = tf.ConfigProto(intra_op_parallelism_threads=1, 
                 #                        inter_op_parallelism_threads=1, 
@@ -65,31 +141,34 @@ def gen_neural_networks(args, netdata, tsctype, tsc_ids, learner, load, n_hidden
                 sess = tf.compat.v1.Session()
                 #sess = tf.compat.v1.Session(config=config)
 
-            #get desired neural net for each traffic signal controller
+            #get desired neural net for each traffic signal controller,
+            #tsc sharing parameters all use their group leader's net
+            leaders = []
             for tsc in tsc_ids:
-                input_d, output_d = get_in_out_d(tsctype,
-                                                 len(netdata['inter'][tsc]['incoming_lanes']),
-                                                 len(netdata['inter'][tsc]['green_phases']))
-
-                neural_nets[tsc] = nn_factory(tsctype, 
-                                              input_d, 
-                                              output_d, 
-                                              args, 
-                                              learner, 
-                                              load, 
-                                              tsc,
-                                              n_hidden,
-                                              sess=sess)
+                share = netdata['share'][tsc]
+                leader = share['leader']
+                if leader not in neural_nets:
+                    leaders.append(leader)
+                    neural_nets[leader] = nn_factory(tsctype, 
+                                                     share['input_d'], 
+                                                     share['output_d'], 
+                                                     args, 
+                                                     learner, 
+                                                     load, 
+                                                     leader,
+                                                     n_hidden,
+                                                     sess=sess)
+                neural_nets[tsc] = neural_nets[leader]
  
             #if using tf, init all vars
-            if tsctype == 'ddpg':
+            if sess is not None:
                 sess.run(tf.compat.v1.global_variables_initializer())
 
             #load the saved weights
             if load:                                                
                 print('Trying to load '+str(tsctype)+' parameters ...')
                 path_dirs = [args.save_path, args.tsc]                 
-                for tsc in tsc_ids:                                    
+                for tsc in leaders:                                    
                     if tsctype == 'dqn':                               
                         path = '/'.join(path_dirs+[tsc])               
                         neural_nets[tsc].load_weights(path)            
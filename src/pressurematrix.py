@@ -0,0 +1,56 @@
+import numpy as np
+
+class PressureMatrix:
+    """Phase pressures of every intersection from one sparse matvec.
+
+    Each green phase is a row of a sparse phase x lane incidence
+    matrix, +1 for the phase's incoming lanes and -1 for their
+    outgoing lanes. The rows of all intersections are stacked block
+    diagonally, each intersection's phases a contiguous block. The
+    nonzeros are kept as flat (row, lane, value) arrays indexing the
+    network wide lane count vectors of the VehicleSnapshot, incoming
+    lanes count the vehicles within radius of their stop line and
+    outgoing lanes those within radius of their start, the vehicles
+    each junction's own subscription sees. All pressures are computed
+    with a single bincount the first time they are needed after each
+    snapshot update.
+    """
+    def __init__(self, phase_lanes, lane_idx):
+        ###phase_lanes is {tsc:[(incoming lanes, outgoing lanes) of
+        #each green phase]}, lane_idx maps lanes to snapshot indices,
+        #lanes the snapshot does not track have no vehicles,
+        #outgoing lanes index the second half of the count vector
+        n_lanes = len(lane_idx)
+        rows, cols, data = [], [], []
+        self.blocks = {}
+        n_rows = 0
+        for tsc in sorted(phase_lanes):
+            start = n_rows
+            for inc, out in phase_lanes[tsc]:
+                for lanes, sign, offset in [(inc, 1.0, 0), (out, -1.0, n_lanes)]:
+                    for l in lanes:
+                        if l in lane_idx:
+                            rows.append(n_rows)
+                            cols.append(offset + lane_idx[l])
+                            data.append(sign)
+                n_rows += 1
+            self.blocks[tsc] = (start, n_rows)
+        self.n_rows = n_rows
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.data = np.array(data, dtype=np.float64)
+        self.stop_count = None
+        self.pressure = np.zeros(n_rows)
+
+    def update(self, snapshot):
+        #a new snapshot has new arrays
+        if snapshot.stop_count is not self.stop_count:
+            self.stop_count = snapshot.stop_count
+            lane_count = np.concatenate([snapshot.stop_count, snapshot.entry_count])
+            self.pressure = np.bincount(self.rows, weights=self.data*lane_count[self.cols], minlength=self.n_rows)
+
+    def get(self, tsc, snapshot):
+        ###pressure of each of tsc's green phases
+        self.update(snapshot)
+        start, end = self.blocks[tsc]
+        return self.pressure[start:end]
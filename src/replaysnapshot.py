@@ -0,0 +1,181 @@
+import os, json
+
+import numpy as np
+
+class ReplaySnapshot:
+    ###on disk replay, one flat column file per field and a meta
+    #file with the row counts, written after the columns
+    def __init__(self, path, s_d=None, a_d=None, n_steps=None, discrete=False):
+        self.path = path
+        if os.path.isfile(self.meta_fp()):
+            with open(self.meta_fp(), 'r') as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {'s_d':s_d, 'a_d':a_d, 'n_steps':n_steps, 'discrete':discrete,
+                         'n_exp':0, 'n_traj':0,
+                         'r_n':0, 'r_sum':0.0, 'r_sumsq':0.0, 'r_abs_max':0.0}
+        self.truncate_columns()
+        self.columns = None
+
+    def meta_fp(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def column_fp(self, name):
+        return os.path.join(self.path, name+'.bin')
+
+    def get_layout(self):
+        #column name, dtype, row width (None for 1d) and which count sizes it
+        return [('s', np.float32, self.meta['s_d'], 'n_exp'),
+                ('a', np.float32, self.meta['a_d'], 'n_exp'),
+                ('r', np.float32, None, 'n_exp'),
+                ('next_s', np.float32, self.meta['s_d'], 'n_traj'),
+                ('terminal', np.float32, None, 'n_traj'),
+                ('end', np.int64, None, 'n_traj'),
+                ('n_a', np.int64, None, 'n_traj')]
+
+    def truncate_columns(self):
+        ###drop rows past the meta counts, left by a process that
+        #died after appending to the columns but before the meta,
+        #columns missing from older snapshots (n_a) are zero filled
+        for name, dtype, width, count in self.get_layout():
+            fp = self.column_fp(name)
+            n_bytes = self.meta[count]*(width or 1)*np.dtype(dtype).itemsize
+            size = os.path.getsize(fp) if os.path.isfile(fp) else 0
+            if size != n_bytes:
+                with open(fp, 'r+b' if os.path.isfile(fp) else 'wb') as f:
+                    f.truncate(n_bytes)
+
+    def __len__(self):
+        return self.meta['n_traj']
+
+    def exists(self):
+        return self.meta['n_traj'] > 0
+
+    def append(self, trajectories):
+        ###append a list of trajectories (lists of experience dicts)
+        if len(trajectories) == 0:
+            return
+        a_d = np.size(trajectories[0][0]['a'])
+        s_d = len(trajectories[0][0]['s'])
+        lens = np.array([ len(t) for t in trajectories ], dtype=np.int64)
+        batch = {'s':np.zeros((len(trajectories), np.amax(lens), s_d)),
+                 'a':np.zeros((len(trajectories), np.amax(lens), a_d)),
+                 'r':np.zeros((len(trajectories), np.amax(lens))),
+                 'next_s':np.array([ t[-1]['next_s'] for t in trajectories ]),
+                 'terminal':np.array([ t[-1]['terminal'] for t in trajectories ]),
+                 'len':lens,
+                 'n_a':np.array([ t[-1].get('n_a', 0) for t in trajectories ], dtype=np.int64)}
+        for i, trajectory in enumerate(trajectories):
+            l = lens[i]
+            batch['s'][i, :l] = [ exp['s'] for exp in trajectory ]
+            batch['a'][i, :l] = [ np.reshape(exp['a'], a_d) for exp in trajectory ]
+            batch['r'][i, :l] = [ exp['r'] for exp in trajectory ]
+        self.append_batch(batch)
+
+    def append_batch(self, batch):
+        ###append padded trajectory arrays, as replay get_batch returns them
+        lens = np.asarray(batch['len'], dtype=np.int64)
+        if len(lens) == 0:
+            return
+        if self.meta['s_d'] is None:
+            self.meta['s_d'] = batch['s'].shape[-1]
+            self.meta['a_d'] = batch['a'].shape[-1]
+        self.meta['n_steps'] = max(self.meta['n_steps'] or 0, batch['s'].shape[1])
+        #drop the padding, experiences are stored flat
+        mask = np.arange(batch['s'].shape[1])[np.newaxis,:] < lens[:,np.newaxis]
+        r = np.asarray(batch['r'])[mask]
+        columns = {'s':np.asarray(batch['s'])[mask],
+                   'a':np.asarray(batch['a'])[mask],
+                   'r':r,
+                   'next_s':np.asarray(batch['next_s']),
+                   'terminal':np.asarray(batch['terminal']),
+                   'end':self.meta['n_exp'] + np.cumsum(lens),
+                   'n_a':batch['n_a'] if 'n_a' in batch else np.zeros(len(lens))}
+        os.makedirs(self.path, exist_ok=True)
+        #rows of an append that failed part way are dropped too
+        self.truncate_columns()
+        for name, dtype, _, _ in self.get_layout():
+            with open(self.column_fp(name), 'ab') as f:
+                f.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+        self.meta['n_exp'] += int(np.sum(lens))
+        self.meta['n_traj'] += len(lens)
+        self.meta['r_n'] += len(r)
+        self.meta['r_sum'] += float(np.sum(r))
+        self.meta['r_sumsq'] += float(np.sum(np.square(r)))
+        self.meta['r_abs_max'] = max(self.meta['r_abs_max'], float(np.amax(np.abs(r))))
+        self.write_meta()
+        self.columns = None
+
+    def write_meta(self):
+        #write then rename so readers never see a partial file
+        tmp_fp = self.meta_fp()+'.tmp'
+        with open(tmp_fp, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_fp, self.meta_fp())
+
+    def clear(self):
+        #counts are zeroed before the columns are removed,
+        #the meta never counts rows that are gone
+        for k in ['n_exp', 'n_traj', 'r_n']:
+            self.meta[k] = 0
+        for k in ['r_sum', 'r_sumsq', 'r_abs_max']:
+            self.meta[k] = 0.0
+        os.makedirs(self.path, exist_ok=True)
+        self.write_meta()
+        for name, _, _, _ in self.get_layout():
+            if os.path.isfile(self.column_fp(name)):
+                os.remove(self.column_fp(name))
+        self.columns = None
+
+    def reward_stats(self):
+        ###mean, std and largest absolute reward of all stored experiences
+        n = max(self.meta['r_n'], 1)
+        mean = self.meta['r_sum'] / n
+        std = np.sqrt(max(self.meta['r_sumsq'] / n - mean**2, 0.0))
+        return mean, std, self.meta['r_abs_max']
+
+    def map_columns(self):
+        ###memory map the columns, only the rows sampled are read from disk
+        self.columns = {}
+        for name, dtype, width, count in self.get_layout():
+            shape = (self.meta[count],) if width is None else (self.meta[count], width)
+            if self.meta[count] == 0:
+                self.columns[name] = np.zeros(shape, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(self.column_fp(name), dtype=dtype, mode='r', shape=shape)
+        self.columns['start'] = np.concatenate([[0], self.columns['end'][:-1]])
+
+    def get_batch(self, idx):
+        ###padded arrays of the trajectories at idx, same layout
+        #as the shared replay for bulk loading into one, steps past
+        #a trajectory's length repeat its last experience
+        if self.columns is None:
+            self.map_columns()
+        idx = np.asarray(idx)
+        start = self.columns['start'][idx]
+        end = self.columns['end'][idx]
+        rows = np.minimum(start[:,np.newaxis] + np.arange(self.meta['n_steps'])[np.newaxis,:], end[:,np.newaxis]-1)
+        return {'s':self.columns['s'][rows],
+                'a':self.columns['a'][rows],
+                'r':self.columns['r'][rows],
+                'next_s':self.columns['next_s'][idx],
+                'terminal':self.columns['terminal'][idx] > 0.5,
+                'len':end - start,
+                'n_a':self.columns['n_a'][idx]}
+
+    def __getitem__(self, i):
+        ###rebuild trajectory i as a list of experience dicts
+        batch = self.get_batch([i])
+        n = int(batch['len'][0])
+        states = np.array(batch['s'][0, :n])
+        next_states = list(states[1:]) + [np.array(batch['next_s'][0])]
+        discrete = self.meta['discrete']
+        trajectory = []
+        for j in range(n):
+            a = batch['a'][0, j]
+            trajectory.append({'s':states[j], 'a':int(a[0]) if discrete else np.array(a),
+                               'next_s':next_states[j], 'r':float(batch['r'][0, j]),
+                               'terminal':(j == n-1 and bool(batch['terminal'][0])),
+                               'n_a':int(batch['n_a'][0])})
+        return trajectory
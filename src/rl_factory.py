@@ -1,31 +1,47 @@
 from src.rlagents.dqnagent import DQNAgent
 from src.rlagents.ddpgagent import DDPGAgent
 
-def rl_factory(rl_type, args, neural_network, exp_replay, rl_stats, n_actions, eps):
+def rl_factory(rl_type, args, neural_network, exp_replay, rl_stats, weight_channel, n_actions, eps, n_share=1, learner_event=None):
+    #tsc sharing parameters pool their replay, each update
+    #is a batch from every member of the group
     if rl_type == 'dqn':
         return DQNAgent(neural_network,
                         eps,                                     
                         exp_replay,                                   
                         n_actions,                                    
                         args.nsteps,                                  
-                        args.batch,                                   
-                        args.nreplay,                                 
+                        args.batch*n_share,                                   
+                        args.nreplay*n_share,                                 
                         args.gamma,                                   
                         rl_stats,
+                        weight_channel,
                         args.mode,
-                        args.updates)                                     
+                        args.updates,
+                        args.per,
+                        args.per_alpha,
+                        args.per_beta,
+                        args.per_eps,
+                        n_share,
+                        learner_event)                                     
     elif rl_type == 'ddpg':
         return DDPGAgent(neural_network,
                          eps,     
                          exp_replay,              
                          n_actions,                
                          args.nsteps,              
-                         args.batch,               
-                         args.nreplay,             
+                         args.batch*n_share,               
+                         args.nreplay*n_share,             
                          args.gamma,               
                          rl_stats,                
+                         weight_channel,
                          args.mode,
-                         args.updates)                                     
+                         args.updates,
+                         args.per,
+                         args.per_alpha,
+                         args.per_beta,
+                         args.per_eps,
+                        n_share,
+                        learner_event)                                     
     else:
         #raise not found exceptions
         assert 0, 'Supplied rl argument type '+str(rl_type)+' does not exist.'
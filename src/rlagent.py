@@ -1,10 +1,13 @@
 import numpy as np
 
+from src.sumtree import SumTree
+
 class RLAgent:
-    def __init__(self, networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, mode, updates):
+    def __init__(self, networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, weight_channel, mode, updates, per=False, per_alpha=0.6, per_beta=0.4, per_eps=0.01, n_share=1, learner_event=None):
         ###this is a dict, keys = 'online', 'target'
         self.networks = networks
         self.epsilon = epsilon
+        self.start_epsilon = epsilon
         self.exp_replay = exp_replay
         self.n_actions = n_actions
         self.n_steps = n_steps
@@ -13,19 +16,67 @@ class RLAgent:
         self.gamma = gamma
         self.experience_trajectory = []
         self.rl_stats = rl_stats
+        self.weight_channel = weight_channel
         self.exp_replay = exp_replay
         self.mode = mode
         self.updates = updates
+        ###prioritized experience replay, priorities are
+        #indexed by replay slot and only kept on the learner
+        self.per = per
+        self.per_alpha = per_alpha
+        self.per_beta = per_beta
+        self.per_eps = per_eps
+        self.priorities = None
+        self.replay_count = 0
+        self.batch_idx = None
+        self.batch_weights = None
+        ###parameter sharing, number of tsc sharing the network,
+        #states are padded by the controller, each experience keeps
+        #the number of actions its tsc has (n_a) so padded actions
+        #can be masked
+        self.n_share = n_share
+        #set when new experiences are stored to wake the learner
+        self.learner_event = learner_event
+
+    def reset(self):
+        ###new episode, a partial trajectory of the
+        #last one is dropped like with a new agent
+        self.epsilon = self.start_epsilon
+        self.experience_trajectory = []
 
     def get_action(self, state):
-       pass 
+        output = None
+        if self.prepare_action():
+            #get newest weights before acting
+            if self.mode == 'train':
+                self.retrieve_weights('online')
+            output = self.forward(state[np.newaxis,...])
+        return self.select_action(output)
+
+    def prepare_action(self):
+        ###return True if the next action needs a forward pass,
+        #called before forwarding so batched inference can skip it
+        pass
+
+    def forward(self, states):
+        pass
+
+    def select_action(self, output):
+        ###action from the forward pass output of a single state
+        pass
+
+    @staticmethod
+    def batch_forward(agents, states):
+        ###forward the states of many agents, return an output per agent
+        pass
 
     def store_experience(self, state, action, next_state, reward, terminal):
         ### here we append to a temporary experience sequence/trajectory buffer, 
         #and when terminal or steps length, at to experience replay
         if self.rl_stats['updates'] < self.updates:
             experience = {'s':state, 'a':action,                                     
-                          'next_s':next_state, 'r':reward, 'terminal':terminal}
+                          'next_s':next_state, 'r':reward, 'terminal':terminal,
+                          'n_a':self.n_actions}
                                                                                      
             #append experience to trajectory
             self.experience_trajectory.append(experience)
@@ -34,8 +85,11 @@ class RLAgent:
             if len(self.experience_trajectory) == self.n_steps or terminal == True:
                 self.exp_replay.append(self.experience_trajectory)
                 #rl stats bookkeeping
-                self.rl_stats['n_exp'] += 1
+                with self.rl_stats['lock']:
+                    self.rl_stats['n_exp'] += 1
                 self.experience_trajectory = []
+                if self.learner_event:
+                    self.learner_event.set()
 
             #update maximum reward
             abs_reward = np.abs(reward)
@@ -48,24 +102,90 @@ class RLAgent:
     def process_batch(self, sample_batch):
         pass 
 
-    def process_trajectory(self):
-        pass
-
-    def compute_targets(self, rewards, R):
-        ###compute targets using discounted rewards
-        target_batch = []
-
-        for i in reversed(range(len(rewards))):
-            R = rewards[i] + (self.gamma * R)
-            target_batch.append(R)
-
-        target_batch.reverse()
-        return target_batch
+    def compute_targets(self, rewards, lengths, R):
+        ###vectorized discounted n step returns for a batch of padded
+        #trajectories, rewards is (batch, n_steps), R the bootstrap
+        #value of each trajectory's final next state (0 if terminal)
+        steps = np.arange(self.n_steps)
+        mask = steps[np.newaxis,:] < lengths[:,np.newaxis]
+        #discount[k, j] = gamma^(j-k) for j >= k
+        discount = np.triu(self.gamma ** (steps[np.newaxis,:] - steps[:,np.newaxis]).astype(np.float64))
+        targets = np.dot(np.where(mask, rewards, 0.0), discount.T)
+        targets += (self.gamma ** (lengths[:,np.newaxis] - steps[np.newaxis,:])) * R[:,np.newaxis]
+        return np.where(mask, targets, 0.0), mask
 
     def sample_replay(self):
+        if self.per:
+            return self.sample_prioritized_replay()
         ###randomly sampled trajectories from shared experience replay
         idx = np.random.randint(0, self.n_exp_replay, size = self.n_batch)
-        return [ self.exp_replay[i] for i in idx ]
+        return self.get_batch(idx)
+
+    def sample_prioritized_replay(self):
+        ###sample trajectories proportional to their priority
+        self.sync_priorities()
+        idx, p = self.priorities.sample(self.n_batch)
+        #importance sampling weights correct for the non uniform sampling,
+        #beta is annealed to 1 over the course of training
+        beta = self.per_beta + (1.0 - self.per_beta)*min(1.0, self.rl_stats['updates']/float(self.updates))
+        weights = (len(self.exp_replay) * (p/self.priorities.total())) ** -beta
+        self.batch_idx = idx
+        self.batch_weights = weights / np.amax(weights)
+        return self.get_batch(idx)
+
+    def get_batch(self, idx):
+        ###padded batch arrays of the trajectories at idx
+        if hasattr(self.exp_replay, 'get_batch'):
+            return self.exp_replay.get_batch(idx)
+        return self.trajectories_to_batch([ self.exp_replay[i] for i in idx ])
+
+    def trajectories_to_batch(self, trajectories):
+        ###pack list of dict trajectories into padded arrays
+        n = len(trajectories)
+        s_d = len(trajectories[0][0]['s'])
+        a_d = np.size(trajectories[0][0]['a'])
+        batch = {'s':np.zeros((n, self.n_steps, s_d)),
+                 'a':np.zeros((n, self.n_steps, a_d)),
+                 'r':np.zeros((n, self.n_steps)),
+                 'next_s':np.zeros((n, s_d)),
+                 'terminal':np.zeros(n, dtype=bool),
+                 'len':np.zeros(n, dtype=np.int64),
+                 'n_a':np.zeros(n, dtype=np.int64)}
+        for i, trajectory in enumerate(trajectories):
+            l = len(trajectory)
+            batch['len'][i] = l
+            batch['s'][i, :l] = [ exp['s'] for exp in trajectory ]
+            batch['a'][i, :l] = [ np.reshape(exp['a'], a_d) for exp in trajectory ]
+            batch['r'][i, :l] = [ exp['r'] for exp in trajectory ]
+            batch['next_s'][i] = trajectory[-1]['next_s']
+            batch['terminal'][i] = trajectory[-1]['terminal']
+            #0 (unknown, i.e., replays saved before n_a) is not masked
+            batch['n_a'][i] = trajectory[-1].get('n_a', 0)
+        return batch
+
+    def select_experiences(self, mask, replace):
+        ###flat indices (trajectory, step) of the experiences to train on,
+        #with n step returns a batch is drawn from all trajectory steps
+        if self.n_steps > 1:
+            valid = np.flatnonzero(mask)
+            flat = np.random.choice(valid, size=self.n_batch, replace=replace or len(valid) < self.n_batch)
+            return np.unravel_index(flat, mask.shape)
+        else:
+            return np.arange(mask.shape[0]), np.zeros(mask.shape[0], dtype=np.int64)
+
+    def sync_priorities(self):
+        ###new trajectories appended by actors since the
+        #last sample are given the maximum priority seen
+        if self.priorities is None:
+            self.priorities = SumTree(self.n_exp_replay)
+        slots, self.replay_count = self.exp_replay.slots_since(self.replay_count)
+        self.priorities.update(slots, np.full(len(slots), self.priorities.max_priority))
+
+    def update_priorities(self, td_errors, rows):
+        ###td_errors are the absolute errors of the
+        #trajectories at rows of the last sampled batch
+        p = (np.asarray(td_errors) + self.per_eps) ** self.per_alpha
+        self.priorities.update(self.batch_idx[rows], p)
 
     def clip_exp_replay(self):
         diff = len(self.exp_replay) - self.n_exp_replay
@@ -78,3 +198,9 @@ class RLAgent:
     def retrieve_weights(self):
         pass
 
+    def sync_weights(self, network, nettype):
+        ###only copy in weights when the learner has published new ones
+        weights = self.weight_channel.poll()
+        if weights is not None:
+            network.set_weights(weights, nettype)
+
@@ -3,15 +3,17 @@ import numpy as np
 from src.rlagent import RLAgent
 
 class DDPGAgent(RLAgent):
-    def __init__(self, networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, mode, updates):
-        super().__init__(networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, mode, updates) 
+    def __init__(self, networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, weight_channel, mode, updates, per=False, per_alpha=0.6, per_beta=0.4, per_eps=0.01, n_share=1, learner_event=None):
+        super().__init__(networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, weight_channel, mode, updates, per, per_alpha, per_beta, per_eps, n_share, learner_event) 
         
-    def get_action(self, state):
+    def prepare_action(self):
+        #always forward online actor to get action
+        return True
 
-        if self.mode == 'train':
-            self.retrieve_weights('online')
-        #forward online actor to get action
-        a = self.networks['actor'].forward(state[np.newaxis,...], 'online')
+    def forward(self, states):
+        return self.networks['actor'].forward(states, 'online')
+
+    def select_action(self, a):
         #add exploration noise
         if len(self.exp_replay) < self.n_exp_replay:
             self.epsilon = 1.0
@@ -24,15 +26,25 @@ class DDPGAgent(RLAgent):
         ###return continuous action
         return a[0]
 
+    @staticmethod
+    def batch_forward(agents, states):
+        ###forward every agent's actor together, tf actors
+        #share one graph and session so this is one session run
+        actors = [ agent.networks['actor'] for agent in agents ]
+        outputs = type(actors[0]).fused_forward(actors, states, 'online')
+        return [ a[np.newaxis,...] for a in outputs ]
+
     def train_batch(self, update_freq):
         ###sample replay
         sample_batch = self.sample_replay()
 
-        states, actions, targets = self.process_batch(sample_batch)
+        states, actions, targets, weights = self.process_batch(sample_batch)
         targets = np.expand_dims(targets, -1)
+        if weights is not None:
+            weights = np.expand_dims(weights, -1)
 
         #train critic
-        self.networks['critic'].backward( states, actions, targets )
+        self.networks['critic'].backward( states, actions, targets, weights )
 
         #get grads for actor
         actions = self.networks['actor'].forward(states, 'online')
@@ -40,7 +52,6 @@ class DDPGAgent(RLAgent):
         #train actor
         self.networks['actor'].backward(states, grads[0])
         self.rl_stats['updates'] += 1
-        self.rl_stats['n_exp'] -= 1
         #send new actor weights for actor processes
         self.send_weights('online')
 
@@ -49,55 +60,35 @@ class DDPGAgent(RLAgent):
             self.networks['actor'].transfer_weights()    
             self.networks['critic'].transfer_weights()
 
-    def process_batch(self, sample_batch):
+    def process_batch(self, batch):
+        ###batch is padded arrays of sampled experience trajectories
         #batch compute bootstrap
-        next_states, terminals = [], []
-        for trajectory in sample_batch:
-            ###normalize reward by comparison to maximum reward  
-            ###agent has experienced across all actors              
-            next_states.append(trajectory[-1]['next_s'])                       
-            terminals.append(trajectory[-1]['terminal'])                       
-
-        R = self.next_state_bootstrap(np.stack(next_states), np.stack(terminals))
+        R = self.next_state_bootstrap(batch['next_s'], batch['terminal'])
         #compute targets
-        max_r = self.rl_stats['max_r']
-        targets, states, actions = [], [], []
-
-        for trajectory, r in zip(sample_batch, R):
-            rewards = []
-            for exp in trajectory:
-                states.append(exp['s'])
-                actions.append(exp['a'])
-                ###normalize reward by comparison to maximum reward 
-                ###agent has experienced across all actors
-                rewards.append(exp['r']/max_r)
-            targets.extend( self.process_trajectory( rewards, r ) )
-                                                                                         
-        if self.n_steps > 1:
-            idx = np.random.randint(0, len(targets), size = self.n_batch) 
-            _states, _actions, _targets = [], [], []
-            for i in idx:
-                _states.append(states[i])
-                _targets.append(targets[i])
-                _actions.append(actions[i])
-            return np.stack(_states), np.stack(_actions), np.stack(_targets)
-        else:
-            return np.stack(states), np.stack(actions), np.stack(targets)
+        ###normalize reward by comparison to maximum reward 
+        ###agent has experienced across all actors
+        targets, mask = self.compute_targets(batch['r']/self.rl_stats['max_r'], batch['len'], R)
+        rows, steps = self.select_experiences(mask, True)
+        states = batch['s'][rows, steps]
+        actions = batch['a'][rows, steps]
+        targets = targets[rows, steps]
+        weights = None
+        if self.per:
+            #priority is the critic td error
+            q = self.networks['critic'].forward(states, actions, 'online')[:,0]
+            self.update_priorities(np.abs(targets - q), rows)
+            weights = self.batch_weights[rows]
+        return states, actions, targets, weights
 
     def next_state_bootstrap(self, next_states, terminals):
         #batch next action
         bootstrap_actions = self.networks['actor'].forward(next_states, 'target') 
         #batch next state action bootstrap
         R = self.networks['critic'].forward(next_states, bootstrap_actions, 'target')
-
-        return [ 0.0 if t is True else r[0] for t, r in zip(terminals, R)] 
-
-    def process_trajectory(self, rewards, R):
-        #targets = self.compute_targets(rewards, R)
-        return self.compute_targets(rewards, R)
+        return np.where(terminals, 0.0, R[:,0])
 
     def send_weights(self, nettype):
-        self.rl_stats[nettype] = self.networks['actor'].get_weights(nettype)
+        self.weight_channel.publish(self.networks['actor'].get_weights(nettype))
 
     def retrieve_weights(self, nettype):
-        self.networks['actor'].set_weights(self.rl_stats[nettype], nettype)
+        self.sync_weights(self.networks['actor'], nettype)
@@ -1,102 +1,91 @@
 import numpy as np
-import random
 
 from src.rlagent import RLAgent
 
 class DQNAgent(RLAgent):
-    def __init__(self, networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, mode, updates):
-        super().__init__(networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, mode, updates) 
-        
-    def get_action(self, state):
-        #get newest weights before acting
-        #get q values of current state
-        if np.random.uniform(0.0, 1.0) < self.epsilon:
+    def __init__(self, networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, weight_channel, mode, updates, per=False, per_alpha=0.6, per_beta=0.4, per_eps=0.01, n_share=1, learner_event=None):
+        super().__init__(networks, epsilon, exp_replay, n_actions, n_steps, n_batch, n_exp_replay, gamma, rl_stats, weight_channel, mode, updates, per, per_alpha, per_beta, per_eps, n_share, learner_event) 
+        self.explore = False
+
+    def prepare_action(self):
+        #decide on exploration first, random actions need no forward
+        self.explore = np.random.uniform(0.0, 1.0) < self.epsilon
+        return not self.explore
+
+    def forward(self, states):
+        return self.networks.forward(states, 'online')
+
+    def select_action(self, q_state):
+        if self.explore:
             ###act randomly
             action = np.random.randint(self.n_actions)
         else:
-            if self.mode == 'train':
-                self.retrieve_weights('online')
-            ###act greedily
-            q_state = self.networks.forward(state[np.newaxis,...], 'online')
-            action = np.argmax(q_state)
+            ###act greedily, padded networks (parameter sharing)
+            #output more actions than this tsc has, never pick those
+            action = np.argmax(q_state[0, :self.n_actions])
         ###return action integer
         return action
 
+    @staticmethod
+    def batch_forward(agents, states):
+        ###one forward pass per distinct network
+        networks = {}
+        for i, agent in enumerate(agents):
+            networks.setdefault(id(agent.networks), []).append(i)
+        outputs = [None]*len(agents)
+        for idx in networks.values():
+            q = agents[idx[0]].forward(np.stack([ states[i] for i in idx ]))
+            for j, i in enumerate(idx):
+                outputs[i] = q[j:j+1]
+        return outputs
+
     def train_batch(self, update_freq):
         ###sample from replay
         sample_batch = self.sample_replay()
         ###process nstep, generate n step returns
-        batch_inputs, batch_targets = self.process_batch(sample_batch)
-        self.networks.backward(batch_inputs, batch_targets)
+        batch_inputs, batch_targets, batch_weights = self.process_batch(sample_batch)
+        self.networks.backward(batch_inputs, batch_targets, batch_weights)
         self.rl_stats['updates'] += 1
-        self.rl_stats['n_exp'] -= 1
         #send online weights for actor processes
         self.send_weights('online')
 
         if self.rl_stats['updates'] % update_freq == 0:
             self.networks.transfer_weights()
 
-    def process_batch(self, sample_batch):
-        ###each list in the sample batch is an experience trajectory
+    def process_batch(self, batch):
+        ###batch is padded arrays of sampled experience trajectories
         ###use experiences in trajectory to generate targets
-        max_r = self.rl_stats['max_r']
-
-        processed_exps = []
-
-        states, next_states, terminals = [], [], []
-        for trajectory in sample_batch:
-            next_states.append(trajectory[-1]['next_s'])
-            terminals.append(trajectory[-1]['terminal'])
-            for exp in trajectory:
-                states.append(exp['s'])
-                ###normalize reward by comparison to maximum reward 
-                ###agent has experienced across all actors
-                
-        #batch forward q_s estimate
-        Q_S = self.networks.forward(np.stack(states), 'target')
         #batch forward bootstrap
-        R = self.next_state_bootstrap(np.stack(next_states), terminals)
-
-        i = 0
-        processed_exps = []
-        for trajectory, r in zip(sample_batch, R):
-            states, actions, rewards = [], [], []
-            for exp in trajectory:
-                states.append(exp['s'])
-                actions.append(exp['a'])
-                ###normalize reward by comparison to maximum reward 
-                ###agent has experienced across all actors
-                rewards.append(exp['r']/max_r)
-            #get q values 
-            q_s = Q_S[i:i+len(trajectory)]
-            i += len(trajectory)
-            p_exps = self.process_trajectory( states, actions, 
-                                              rewards, r, q_s )
-            ###add processed experiences from trajectory to batch
-            processed_exps.extend(p_exps)
+        R = self.next_state_bootstrap(batch['next_s'], batch['terminal'], batch.get('n_a'))
+        ###normalize reward by comparison to maximum reward 
+        ###agent has experienced across all actors
+        targets, mask = self.compute_targets(batch['r']/self.rl_stats['max_r'], batch['len'], R)
         ###account for n step returns, randomly select batch for training
-        if self.n_steps > 1:
-            processed_exps = random.sample(processed_exps, self.n_batch)
-        batch_inputs = np.squeeze(np.stack([ e['s'] for e in processed_exps]))
-        batch_targets =  np.stack([ e['target'] for e in processed_exps])
-        return batch_inputs, batch_targets
+        rows, steps = self.select_experiences(mask, False)
+        batch_inputs = batch['s'][rows, steps]
+        actions = batch['a'][rows, steps, 0].astype(np.int64)
+        batch_returns = targets[rows, steps]
+        #batch forward q_s estimate, only the taken action's value is replaced
+        batch_targets = self.networks.forward(batch_inputs, 'target')
+        idx = np.arange(len(rows))
+        batch_weights = None
+        if self.per:
+            #priority is the td error against the online estimate
+            q_online = self.networks.forward(batch_inputs, 'online')
+            self.update_priorities(np.abs(batch_returns - q_online[idx, actions]), rows)
+            batch_weights = self.batch_weights[rows]
+        batch_targets[idx, actions] = batch_returns
+        return batch_inputs, batch_targets, batch_weights
 
-    def next_state_bootstrap(self, next_states, terminals):
-        
+    def next_state_bootstrap(self, next_states, terminals, n_actions=None):
         q_next_s = self.networks.forward(next_states, 'target')
+        if n_actions is not None:
+            #max only over each trajectory's tsc actions, 0 is unknown
+            valid = np.arange(q_next_s.shape[-1])[np.newaxis,:] < n_actions[:,np.newaxis]
+            valid[n_actions <= 0] = True
+            q_next_s = np.where(valid, q_next_s, -np.inf)
         R = np.amax(q_next_s, axis=-1) 
-
-        return [ 0.0 if t is True else r for t, r in zip(terminals, R)]
-                                                                                         
-    def process_trajectory(self, states, actions, rewards, R, q_s):
-                                                                                         
-        targets = self.compute_targets(rewards, R)
-                                                                                         
-        exps = []
-        for i in range(len(actions)):
-            q_s[i, actions[i]] = targets[i]
-            exps.append({'target':q_s[i], 's':states[i]})
-        return exps
+        return np.where(terminals, 0.0, R)
     
     def set_params(self, nettype, weights):
         self.networks.set_weights(weights, nettype)
@@ -105,8 +94,8 @@ class DQNAgent(RLAgent):
         return self.networks.get_weights(nettype)
 
     def send_weights(self, nettype):
-        self.rl_stats[nettype] = self.networks.get_weights(nettype)
+        self.weight_channel.publish(self.networks.get_weights(nettype))
 
     def retrieve_weights(self, nettype):
-        self.networks.set_weights(self.rl_stats[nettype], nettype)
+        self.sync_weights(self.networks, nettype)
 
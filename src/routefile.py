@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+
+from src.routesampler import RouteSampler
+from src.demandprofiles import get_demand_schedule
+from src.helper_funcs import check_and_make_dir
+
+def write_route_file(fp, netdata, schedule, rng):
+    ###all vehicles of a demand schedule as a sumo route file,
+    #distinct routes defined once, vehicles sorted by depart
+    #as sumo reads route files incrementally
+    origins = netdata['origin']
+    veh_edges = [ origins[i] for i in schedule.origins ]
+    routes = RouteSampler(netdata).sample(veh_edges, rng)
+    departs = np.repeat(np.arange(len(schedule)), schedule.counts)
+    route_ids = {}
+    veh_lines = []
+    for n, (e, route, depart) in enumerate(zip(veh_edges, routes, departs)):
+        route = ' '.join(route)
+        if route not in route_ids:
+            route_ids[route] = 'route_'+str(len(route_ids))
+        veh_lines.append('    <vehicle id="'+e+str(n)+'" route="'+route_ids[route]+'" depart="'+str(depart)+'" departLane="best"/>\n')
+    #write then move so concurrent runs never read a partial file
+    tmp_fp = fp+'.tmp'
+    with open(tmp_fp, 'w') as f:
+        f.write('<routes>\n')
+        for route in route_ids:
+            f.write('    <route id="'+route_ids[route]+'" edges="'+route+'"/>\n')
+        f.writelines(veh_lines)
+        f.write('</routes>\n')
+    os.replace(tmp_fp, fp)
+
+class RouteFileCache:
+    """Demand compiled to sumo route files.
+
+    The schedule VehicleGen would generate and the routes of its
+    vehicles are written to a .rou.xml file passed to sumo at start,
+    sumo then inserts the vehicles itself without any traci calls.
+    Files of seeded test sims are kept, keyed by scenario, demand,
+    scale, -seed and sim proc, so every controller run with the same
+    -seed drives the same vehicles and the cache holds at most one
+    file per sim proc and seed. Training episodes each get their own
+    seed and are never repeated, like unseeded sims they get a
+    temporary file per episode that is removed when it ends.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def reusable(self, args):
+        return args.seed is not None and args.mode == 'test'
+
+    def key(self, args, idx):
+        scenario = os.path.splitext(os.path.basename(args.cfg_fp))[0]
+        demand = args.demand+'_'+args.profile+('_'+os.path.basename(args.profile_fp) if args.profile_fp else '')
+        return '_'.join([scenario, demand, str(args.scale), args.mode, str(args.sim_len), str(args.seed), str(idx)])
+
+    def get(self, netdata, args, seed, idx, tmp_fp):
+        ###path to the route file of sim proc idx, compiled from
+        #its episode seed if needed, files that are not reused
+        #are written to tmp_fp
+        if not self.reusable(args):
+            fp = tmp_fp
+        else:
+            fp = os.path.join(self.path, self.key(args, idx)+'.rou.xml')
+            if os.path.isfile(fp):
+                return fp
+            check_and_make_dir(self.path)
+        schedule = get_demand_schedule(args.profile, args.profile_fp, args.sim_len, len(netdata['origin']),
+                                       args.scale, args.mode, seed, args.schedule_fp)
+        #routes from their own generator, the schedule uses the seed
+        rng = np.random.default_rng(None if seed is None else [seed, 1])
+        write_route_file(fp, netdata, schedule, rng)
+        return fp
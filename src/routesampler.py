@@ -0,0 +1,36 @@
+import numpy as np
+
+class RouteSampler:
+    """Random walk routes from origin to destination edges.
+
+    The edge adjacency is stored as CSR arrays (offsets into a flat
+    array of outgoing edge indices) built once from netdata, routes for
+    all vehicles of a batch are walked together, one vectorized hop at
+    a time. Each step uniformly picks one of the current edge's
+    outgoing edges until an edge without outgoing edges is reached,
+    as the per vehicle walk did.
+    """
+    def __init__(self, netdata):
+        self.edges = list(netdata['edge'].keys())
+        self.edge_idx = { e:i for i, e in enumerate(self.edges) }
+        outgoing = [ [ self.edge_idx[o] for o in netdata['edge'][e]['outgoing'] ] for e in self.edges ]
+        self.degree = np.array([ len(o) for o in outgoing ], dtype=np.int64)
+        self.indptr = np.concatenate([[0], np.cumsum(self.degree)])
+        self.indices = np.array([ i for o in outgoing for i in o ], dtype=np.int64)
+
+    def sample(self, origins, rng=np.random):
+        ###routes (lists of edge ids) starting at each origin edge,
+        #rng is the global random state unless given a generator
+        current = np.array([ self.edge_idx[o] for o in origins ], dtype=np.int64)
+        hops = [current]
+        active = np.flatnonzero(self.degree[current] > 0)
+        while len(active) > 0:
+            c = hops[-1].copy()
+            choice = np.floor(rng.random(len(active))*self.degree[c[active]]).astype(np.int64)
+            c[active] = self.indices[self.indptr[c[active]] + choice]
+            hops.append(c)
+            active = active[self.degree[c[active]] > 0]
+        #walks finish at different hops, mask each at its end
+        hops = np.stack(hops, axis=1)
+        lens = np.argmax(self.degree[hops] == 0, axis=1) + 1
+        return [ [ self.edges[e] for e in hops[i, :lens[i]] ] for i in range(len(origins)) ]
@@ -0,0 +1,146 @@
+from multiprocessing import Lock
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+class SharedExpReplay:
+    ###fixed capacity trajectory ring buffer in shared memory, with
+    #the list ops (append, len, indexing, del slice) the agents use
+    def __init__(self, capacity, n_steps, s_d, a_d, discrete):
+        self.capacity = capacity
+        self.n_steps = n_steps
+        self.s_d = s_d
+        self.a_d = a_d
+        #discrete actions (dqn) are returned as ints,
+        #continuous actions (ddpg) as arrays
+        self.discrete = discrete
+        self.lock = Lock()
+        self.shm = SharedMemory(create=True, size=self.get_nbytes())
+        self.arrays = self.map_arrays(self.shm)
+
+    def get_layout(self):
+        #field name, shape and dtype of every array in the shared block
+        #next_s is only stored for the final experience, within a trajectory
+        #the next state of an experience is the state of the one after it
+        return [('count', (1,), np.int64),
+                ('len', (self.capacity,), np.int64),
+                ('s', (self.capacity, self.n_steps, self.s_d), np.float32),
+                ('a', (self.capacity, self.n_steps, self.a_d), np.float32),
+                ('r', (self.capacity, self.n_steps), np.float32),
+                ('next_s', (self.capacity, self.s_d), np.float32),
+                ('terminal', (self.capacity,), np.float32),
+                ('n_a', (self.capacity,), np.int64)]
+
+    def get_nbytes(self):
+        return sum([ int(np.prod(shape))*np.dtype(dtype).itemsize for _, shape, dtype in self.get_layout()])
+
+    def map_arrays(self, shm):
+        arrays = {}
+        offset = 0
+        for name, shape, dtype in self.get_layout():
+            arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            offset += int(np.prod(shape))*np.dtype(dtype).itemsize
+        return arrays
+
+    def __getstate__(self):
+        #only needed when procs are spawned instead of forked,
+        #reattach to the shared block by name in the new proc
+        state = self.__dict__.copy()
+        del state['shm']
+        del state['arrays']
+        state['shm_name'] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        shm_name = state.pop('shm_name')
+        self.__dict__.update(state)
+        self.shm = SharedMemory(name=shm_name)
+        self.arrays = self.map_arrays(self.shm)
+
+    def append(self, trajectory):
+        n = len(trajectory)
+        with self.lock:
+            #when full, overwrite the oldest trajectory
+            slot = int(self.arrays['count'][0]) % self.capacity
+            self.arrays['len'][slot] = n
+            for i in range(n):
+                self.arrays['s'][slot, i] = trajectory[i]['s']
+                self.arrays['a'][slot, i] = np.reshape(trajectory[i]['a'], self.a_d)
+                self.arrays['r'][slot, i] = trajectory[i]['r']
+            self.arrays['next_s'][slot] = trajectory[-1]['next_s']
+            self.arrays['terminal'][slot] = trajectory[-1]['terminal']
+            self.arrays['n_a'][slot] = trajectory[-1].get('n_a', 0)
+            self.arrays['count'][0] += 1
+
+    def append_batch(self, batch):
+        ###append padded trajectory arrays (i.e., from a replay snapshot)
+        n = len(batch['len'])
+        with self.lock:
+            count = int(self.arrays['count'][0])
+            #only the newest capacity trajectories survive
+            keep = np.arange(max(n - self.capacity, 0), n)
+            slots = (count + keep) % self.capacity
+            steps = min(np.shape(batch['s'])[1], self.n_steps)
+            self.arrays['len'][slots] = batch['len'][keep]
+            self.arrays['s'][slots, :steps] = batch['s'][keep, :steps]
+            self.arrays['a'][slots, :steps] = batch['a'][keep, :steps]
+            self.arrays['r'][slots, :steps] = batch['r'][keep, :steps]
+            self.arrays['next_s'][slots] = batch['next_s'][keep]
+            self.arrays['terminal'][slots] = batch['terminal'][keep]
+            self.arrays['n_a'][slots] = batch['n_a'][keep] if 'n_a' in batch else 0
+            self.arrays['count'][0] += n
+
+    def n_appended(self):
+        return int(self.arrays['count'][0])
+
+    def slots_since(self, count):
+        ###slots written since the replay had count appends,
+        #and the current count to pass next time
+        new_count = self.n_appended()
+        n_new = min(new_count - count, self.capacity)
+        slots = np.arange(new_count - n_new, new_count) % self.capacity
+        return slots, new_count
+
+    def __len__(self):
+        return min(int(self.arrays['count'][0]), self.capacity)
+
+    def __getitem__(self, i):
+        ###rebuild the trajectory as a list of experience dicts
+        n = int(self.arrays['len'][i])
+        states = np.array(self.arrays['s'][i, :n])
+        actions = self.arrays['a'][i, :n]
+        rewards = self.arrays['r'][i, :n]
+        next_states = list(states[1:]) + [np.array(self.arrays['next_s'][i])]
+        trajectory = []
+        for j in range(n):
+            a = int(actions[j, 0]) if self.discrete else np.array(actions[j])
+            trajectory.append({'s':states[j], 'a':a,
+                               'next_s':next_states[j], 'r':float(rewards[j]),
+                               'terminal':(j == n-1 and bool(self.arrays['terminal'][i])),
+                               'n_a':int(self.arrays['n_a'][i])})
+        return trajectory
+
+    def get_batch(self, idx):
+        ###padded arrays of the trajectories at slots idx,
+        #steps past a trajectory's length hold stale data
+        batch = {k:self.arrays[k][idx] for k in ['s', 'a', 'r', 'next_s', 'len', 'n_a']}
+        batch['terminal'] = self.arrays['terminal'][idx] > 0.5
+        return batch
+
+    def __delitem__(self, key):
+        #appending to a full ring buffer already overwrites the oldest
+        #trajectories, nothing to delete when the replay is clipped
+        pass
+
+    def __iter__(self):
+        #iterate from oldest to newest trajectory
+        count = int(self.arrays['count'][0])
+        start = count - len(self)
+        for i in range(start, count):
+            yield self[i % self.capacity]
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
@@ -0,0 +1,172 @@
+import os, sys, subprocess, inspect
+
+def sumo_tools():
+    ###put the sumo python tools on the path, only the
+    #backends that run sumo need them
+    if 'SUMO_HOME' in os.environ:
+        tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+        if tools not in sys.path:
+            sys.path.append(tools)
+    else:
+        sys.exit("please declare environment variable 'SUMO_HOME'")
+
+class SimBackend:
+    """Abstract base class for the simulator behind SumoSim.
+
+    A backend starts a simulation and returns a connection object with
+    the traci domain api (conn.vehicle, conn.junction, conn.simulationStep,
+    ...) that the sim, traffic signal controllers, vehicle generation and
+    metrics use.
+    """
+    def start(self, sim_args, port):
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def load(self, sim_args):
+        ###restart the simulation with new arguments in
+        #the running simulator, returns the connection
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def get_tl_logic(self, tl):
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def close(self):
+        raise NotImplementedError("Subclasses should implement this!")
+
+    def alive(self):
+        return True
+
+    def kill(self):
+        ###stop a failed or crashed simulator, never raises
+        try:
+            self.close()
+        except Exception:
+            pass
+
+class TraciBackend(SimBackend):
+    """sumo runs in its own process, every command
+    and result is sent over a traci socket"""
+    def __init__(self, sumo_cmd):
+        sumo_tools()
+        self.sumo_cmd = sumo_cmd
+        self.sumo_process = None
+        self.conn = None
+
+    def start(self, sim_args, port):
+        import traci
+        from sumolib import checkBinary
+        sumoBinary = checkBinary(self.sumo_cmd)
+        self.sumo_process = subprocess.Popen([sumoBinary]+sim_args+["--remote-port", str(port)],
+                                             stdout=None, stderr=None)
+        #fails fast if sumo exits, e.g. the port is taken, older
+        #traci (sumo 1.2) waits 1 s between retries and has no argument
+        retry_args = {}
+        if 'waitBetweenRetries' in inspect.signature(traci.connect).parameters:
+            retry_args['waitBetweenRetries'] = 0.1
+        self.conn = traci.connect(port, numRetries=100, proc=self.sumo_process, **retry_args)
+        return self.conn
+
+    def load(self, sim_args):
+        self.conn.load(sim_args)
+        return self.conn
+
+    def get_tl_logic(self, tl):
+        #for some reason getCompleteRedYellowGreenDefinition
+        #throws errors for me in SUMO 1.2, use subscription
+        import traci
+        self.conn.trafficlight.subscribe(tl, [traci.constants.TL_COMPLETE_DEFINITION_RYG])
+        tldata = self.conn.trafficlight.getAllSubscriptionResults()
+        return tldata[tl][traci.constants.TL_COMPLETE_DEFINITION_RYG][0]
+
+    def close(self):
+        self.conn.close()
+        #let sumo finish writing its outputs
+        try:
+            self.sumo_process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.sumo_process.terminate()
+
+    def alive(self):
+        return self.sumo_process is not None and self.sumo_process.poll() is None
+
+    def kill(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+        if self.alive():
+            self.sumo_process.kill()
+            self.sumo_process.wait()
+
+class LibsumoBackend(SimBackend):
+    """sumo is loaded into this process with libsumo, commands are
+    function calls without a socket or serialization, one
+    simulation per process and no gui"""
+    def __init__(self):
+        sumo_tools()
+
+    def start(self, sim_args, port):
+        import libsumo
+        from sumolib import checkBinary
+        libsumo.start([checkBinary('sumo')]+sim_args)
+        #the libsumo module has the same domain api as a traci connection
+        self.conn = libsumo
+        return self.conn
+
+    def load(self, sim_args):
+        self.conn.load(sim_args)
+        return self.conn
+
+    def get_tl_logic(self, tl):
+        return self.conn.trafficlight.getCompleteRedYellowGreenDefinition(tl)[0]
+
+    def close(self):
+        self.conn.close()
+
+class SyntheticBackend(SimBackend):
+    """numpy queueing model of the network in this process,
+    no sumo required, for profiling and fast tests of the
+    controllers, metrics and agents"""
+    def __init__(self, netdata, net_fp):
+        self.netdata = netdata
+        self.net_fp = net_fp
+
+    def start(self, sim_args, port):
+        from src.syntheticsim import SyntheticSim
+        tripinfo_fp = None
+        if '--tripinfo-output' in sim_args:
+            tripinfo_fp = sim_args[sim_args.index('--tripinfo-output')+1]
+        route_fp = None
+        if '--route-files' in sim_args:
+            route_fp = sim_args[sim_args.index('--route-files')+1]
+        additional_fps = ()
+        if '--additional-files' in sim_args:
+            additional_fps = sim_args[sim_args.index('--additional-files')+1].split(',')
+        self.conn = SyntheticSim(self.netdata, self.net_fp, tripinfo_fp=tripinfo_fp, route_fp=route_fp,
+                                 additional_fps=additional_fps)
+        return self.conn
+
+    def load(self, sim_args):
+        self.conn.close()
+        return self.start(sim_args, None)
+
+    def get_tl_logic(self, tl):
+        return self.conn.trafficlight.getCompleteRedYellowGreenDefinition(tl)[0]
+
+    def close(self):
+        self.conn.close()
+
+def sim_backend_factory(backend, sumo_cmd, netdata=None, net_fp=None):
+    if backend == 'traci':
+        return TraciBackend(sumo_cmd)
+    elif backend == 'libsumo':
+        if sumo_cmd != 'sumo':
+            #raise not found exceptions
+            assert 0, 'libsumo backend cannot run sumo-gui, use -nogui'
+        return LibsumoBackend()
+    elif backend == 'synthetic':
+        return SyntheticBackend(netdata, net_fp)
+    else:
+        #raise not found exceptions
+        assert 0, 'Supplied simulator backend argument '+str(backend)+' does not exist.'
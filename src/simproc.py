@@ -1,14 +1,7 @@
 import sys, os, time
 from multiprocessing import *
-import tensorflow as tf
 
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-
-import traci
+import src.traciconstants as tc
 
 from src.sumosim import SumoSim
 from src.nn_factory import gen_neural_networks
@@ -16,7 +9,7 @@ from src.picklefuncs import save_data
 from src.helper_funcs import check_and_make_dir, get_time_now, write_to_log
 
 class SimProc(Process):
-    def __init__(self, idx, args, barrier, netdata, rl_stats, exp_replays, eps, offset):
+    def __init__(self, idx, args, barrier, netdata, rl_stats, exp_replays, weight_channels, learner_events, eps, offset):
         Process.__init__(self)
         self.idx = idx
         self.args = args
@@ -25,6 +18,8 @@ class SimProc(Process):
         self.sim = SumoSim(args.cfg_fp, args.sim_len, args.tsc, args.nogui, netdata, args, idx)
         self.rl_stats = rl_stats
         self.exp_replays = exp_replays
+        self.weight_channels = weight_channels
+        self.learner_events = learner_events
         self.eps = eps
         self.offset = offset
         self.initial = True 
@@ -55,44 +50,72 @@ class SimProc(Process):
         #barrier
 
         if self.args.mode == 'train':
-            while not self.finished_updates():
-                self.run_sim(neural_networks)
+            self.finished = self.finished_updates()
+            while not self.finished:
+                #end first, event driven sims read travel
+                #times from sumo output at episode end
+                self.run_episode(neural_networks, self.end_train_episode)
                 if (self.eps == 1.0 or self.eps < 0.02):
                     self.write_to_csv(self.sim.sim_stats())
                 #self.write_travel_times()
-                self.sim.close()
 
         elif self.args.mode == 'test':
             print(str(self.idx)+' test  waiting at offset ------------- '+str(self.offset))
             print(str(self.idx)+' test broken offset =================== '+str(self.offset))
             self.initial = False
             #just run one sim for stats
-            self.run_sim(neural_networks)
+            self.run_episode(neural_networks, self.sim.close)
             if (self.eps == 1.0 or self.eps < 0.02) and self.args.mode == 'test':
                 self.write_to_csv(self.sim.sim_stats())
                 with open( str(self.eps)+'.csv','a+') as f:
                     f.write('-----------------\n')
             self.write_sim_tsc_metrics()
             #self.write_travel_times()
-            self.sim.close()
         print('------------------\nFinished on sim process '+str(self.idx)+' Closing\n---------------')
 
+    def run_episode(self, neural_networks, end_episode):
+        ###run an episode, if the simulator crashes
+        #discard it and restart the episode
+        while True:
+            try:
+                self.run_sim(neural_networks)
+                end_episode()
+                return
+            except Exception as e:
+                #a simulator that exited can also surface as a socket
+                #or other error, restart instead of the proc dying
+                #and its peers waiting at the barrier
+                if not isinstance(e, tc.FatalTraCIError) and self.sim.alive():
+                    raise
+                print('simulator crashed on proc '+str(self.idx)+', restarting episode')
+                write_to_log(' ACTOR #'+str(self.idx)+' SIMULATOR CRASHED, RESTARTING EPISODE: '+str(e))
+                self.sim.kill()
+
+    def end_train_episode(self):
+        #persistent sims load no episode after the last
+        self.finished = self.finished_updates()
+        self.sim.end_episode(self.finished)
+
     def run_sim(self, neural_networks):
         start_t = time.time()
         self.sim.gen_sim()
+        gen_t = time.time() - start_t
 
         if self.initial is True:
-            #if the initial sim, run until the offset time reached
-            self.initial = False
+            #if the initial sim, run until the offset time reached,
+            #a crash before the barrier reruns the offset
             self.sim.run_offset(self.offset)
             print(str(self.idx)+' train  waiting at offset ------------- '+str(self.offset)+' at '+str(get_time_now()))
             write_to_log(' ACTOR #'+str(self.idx)+' FINISHED RUNNING OFFSET '+str(self.offset)+' to time '+str(self.sim.t)+' , WAITING FOR OTHER OFFSETS...')
             self.barrier.wait()
+            self.initial = False
             print(str(self.idx)+' train  broken offset =================== '+str(self.offset)+' at '+str(get_time_now()))
             write_to_log(' ACTOR #'+str(self.idx)+'  BROKEN OFFSET BARRIER...')
 
-        self.sim.create_tsc(self.rl_stats, self.exp_replays, self.eps, neural_networks)
-        write_to_log('ACTOR #'+str(self.idx)+'  START RUN SIM...')
+        tsc_start_t = time.time()
+        self.sim.create_tsc(self.rl_stats, self.exp_replays, self.weight_channels, self.learner_events, self.eps, neural_networks)
+        startup_t = gen_t + time.time() - tsc_start_t
+        write_to_log('ACTOR #'+str(self.idx)+'  START RUN SIM, EPISODE STARTUP '+'{:.3f}'.format(startup_t)+'s...')
         self.sim.run()
         print('sim finished in '+str(time.time()-start_t)+' on proc '+str(self.idx))
         write_to_log('ACTOR #'+str(self.idx)+'  FINISHED SIM...')
@@ -154,7 +177,10 @@ class SimProc(Process):
 
     def sync_nn_weights(self, neural_networks):
         for nn in neural_networks:
-            weights = self.rl_stats[nn]['online']
+            if self.netdata['share'][nn]['leader'] != nn:
+                #shares its leader's network
+                continue
+            weights = self.weight_channels[nn].read()
             if self.args.tsc == 'ddpg':
                 #sync actor weights
                 neural_networks[nn]['actor'].set_weights(weights, 'online')
@@ -195,7 +221,7 @@ class SimProc(Process):
 
         #setup subscription for stats
         for tl in tl_junc:
-            self.conn.junction.subscribeContext( tl, traci.constants.CMD_GET_VEHICLE_VARIABLE, 150, [traci.constants.VAR_LANEPOSITION, traci.constants.VAR_SPEED, traci.constants.VAR_LANE_ID])
+            self.conn.junction.subscribeContext( tl, tc.CMD_GET_VEHICLE_VARIABLE, 150, [tc.VAR_LANEPOSITION, tc.VAR_SPEED, tc.VAR_LANE_ID])
 
         start_t = time.time()
         #execute simulation for desired length
@@ -218,7 +244,7 @@ class SimProc(Process):
             tl_data[tl] = self.conn.junction.getContextSubscriptionResults(tl)
             if tl_data[tl] is not None:
                 for v in tl_data[tl]:
-                    lane_vehicles[ tl_data[tl][v][traci.constants.VAR_LANE_ID] ][v] = tl_data[tl][v]
+                    lane_vehicles[ tl_data[tl][v][tc.VAR_LANE_ID] ][v] = tl_data[tl][v]
         return lane_vehicles
 
     def get_tl_green_phases(self, tl):
@@ -0,0 +1,56 @@
+import time, socket
+
+import src.traciconstants as tc
+
+from src.simbackend import SimBackend
+from src.helper_funcs import write_to_log
+
+def get_free_port():
+    ###ask the os for a port nothing is listening on
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+class SimSupervisor(SimBackend):
+    """Starts and watches the simulator of a SimBackend.
+
+    Port 0 allocates a free port for every start so concurrent runs
+    on one host do not collide. Failed starts (port taken between
+    allocation and sumo binding it, sumo exiting, no connection) are
+    killed and retried with exponential backoff. A simulator that
+    dies while running surfaces as a FatalTraCIError, which callers
+    handle by killing it and restarting their episode.
+    """
+    def __init__(self, backend, port, max_retries=5, backoff=0.5):
+        self.backend = backend
+        self.port = port
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def start(self, sim_args, port=None):
+        for attempt in range(self.max_retries):
+            port = get_free_port() if self.port == 0 else self.port
+            try:
+                self.conn = self.backend.start(sim_args, port)
+                return self.conn
+            except (tc.TraCIException, tc.FatalTraCIError, OSError, ConnectionError, TypeError) as e:
+                write_to_log(' SIMULATOR START ATTEMPT '+str(attempt+1)+' ON PORT '+str(port)+' FAILED: '+str(e))
+                self.backend.kill()
+                time.sleep(self.backoff*(2**attempt))
+        raise tc.FatalTraCIError('Failed to start simulator in '+str(self.max_retries)+' attempts.')
+
+    def load(self, sim_args):
+        self.conn = self.backend.load(sim_args)
+        return self.conn
+
+    def get_tl_logic(self, tl):
+        return self.backend.get_tl_logic(tl)
+
+    def alive(self):
+        return self.backend.alive()
+
+    def kill(self):
+        self.backend.kill()
+
+    def close(self):
+        self.backend.close()
@@ -0,0 +1,71 @@
+import os
+
+import src.traciconstants as tc
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+def loop_id(lane):
+    return 'stopline_'+lane
+
+def signalized_lanes(netdata):
+    ###lanes with a traffic light controlled link
+    return sorted([ l for l in netdata['lane']
+                    if any([ o['index'] >= 0 for o in netdata['lane'][l]['outgoing'].values() ]) ])
+
+def write_detector_file(fp, netdata, period=1000000):
+    ###induction loops 1 m before the stop line of every signalized
+    #lane, their aggregated output is discarded
+    lines = ['<additional>\n']
+    for l in signalized_lanes(netdata):
+        pos = max(float(netdata['lane'][l]['length']) - 1.0, 0.0)
+        lines.append('    <inductionLoop id="'+loop_id(l)+'" lane="'+l+'" pos="'+str(pos)
+                     +'" period="'+str(period)+'" file="NUL"/>\n')
+    lines.append('</additional>\n')
+    tmp_fp = fp+'.tmp'
+    with open(tmp_fp, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp_fp, fp)
+
+def get_additional_files(cfg_fp):
+    ###additional files of a sumo config, as paths usable from
+    #here, command line additional files replace them
+    fps = []
+    for elem in ET.parse(cfg_fp).getroot().iter('additional-files'):
+        for fp in elem.get('value').split(','):
+            fps.append(os.path.join(os.path.dirname(cfg_fp), fp.strip()))
+    return fps
+
+class StopLineCounts:
+    """Vehicles that crossed the stop line of each signalized lane.
+
+    Every lane's induction loop is subscribed to the ids of the
+    vehicles on it in the last step, all arrive with each step's
+    results. Vehicles not on the loop the step before are added to
+    the lane's count since the sim started, a vehicle on the loop for
+    several steps counts once. Counts must be updated every step,
+    controllers difference the counts of their lanes between steps.
+    The loop interval vehicle number would count once per vehicle
+    too, but sumo 1.2 traci cannot read it.
+    """
+    def __init__(self, netdata):
+        self.lanes = signalized_lanes(netdata)
+        self.lane_idx = { l:i for i, l in enumerate(self.lanes) }
+        self.loops = [ loop_id(l) for l in self.lanes ]
+        self.counts = np.zeros(len(self.lanes), dtype=np.int64)
+        self.prev_ids = [ () for l in self.lanes ]
+
+    def subscribe(self, conn):
+        #a new or reloaded sim, no vehicles on the loops yet
+        self.prev_ids = [ () for l in self.lanes ]
+        for loop in self.loops:
+            conn.inductionloop.subscribe(loop, [tc.LAST_STEP_VEHICLE_ID_LIST])
+
+    def update(self, results):
+        for i, loop in enumerate(self.loops):
+            ids = results[loop][tc.LAST_STEP_VEHICLE_ID_LIST] if loop in results else ()
+            self.counts[i] += sum([ 1 for v in ids if v not in self.prev_ids[i] ])
+            self.prev_ids[i] = ids
+
+    def lane_indices(self, lanes):
+        return np.array([ self.lane_idx[l] for l in lanes ], dtype=np.int64)
@@ -1,18 +1,21 @@
-import os, sys, subprocess
+import os, sys, subprocess, tempfile
+import xml.etree.ElementTree as ET
 
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-    from sumolib import checkBinary
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-
-import traci
+import src.traciconstants as tc
 import numpy as np
 
 from src.trafficsignalcontroller import TrafficSignalController
 from src.tsc_factory import tsc_factory
 from src.vehiclegen import VehicleGen
+from src.inferencebatcher import InferenceBatcher
+from src.simbackend import sim_backend_factory
+from src.simsupervisor import SimSupervisor
+from src.vehiclesnapshot import VehicleSnapshot
+from src.warmupcache import WarmupCache
+from src.routefile import RouteFileCache
+from src.instrumentedconnection import InstrumentedConnection
+from src.pressurematrix import PressureMatrix
+from src.stoplinedetectors import StopLineCounts, write_detector_file, get_additional_files
 from src.helper_funcs import write_to_log
 
 class SumoSim:
@@ -24,53 +27,129 @@ class SumoSim:
         self.netdata = netdata
         self.args = args
         self.idx = idx
+        self.episode = 0
+        #set when a persistent sim has already loaded the next episode
+        self.loaded = False
+        #set when the controllers of the last episode can be reset
+        #for the next one in the reloaded sim instead of rebuilt
+        self.reuse_tsc = False
+        #static network structure, queried once
+        self.tls = None
+        self.instrumented = None
+        self.warmup_cache = None
+        if args.warmup:
+            if args.seed is None:
+                #raise not found exceptions
+                assert 0, 'Warm up state cache requires a -seed for reproducible warm up traffic.'
+            self.warmup_cache = WarmupCache(args.warmup_fp)
+        self.route_cache = None
+        self.route_fp = None
+        if args.route_files:
+            if args.sim not in ['single', 'double'] or args.demand != 'dynamic':
+                #raise not found exceptions
+                assert 0, 'Route files are compiled from dynamic demand of the single and double scenarios.'
+            self.route_cache = RouteFileCache(args.route_fp)
+        #stop line induction loops count vehicles for websters
+        self.stopline = None
+        self.detector_fp = None
+        if args.tsc == 'websters' and args.count == 'loops':
+            self.stopline = StopLineCounts(netdata)
 
     def gen_sim(self):
         #create sim stuff and intersections
-        #serverless_connect()
-        #self.conn, self.sumo_process = self.server_connect()
-
-        port = self.args.port+self.idx
-        sumoBinary = checkBinary(self.sumo_cmd)
-        port = self.args.port+self.idx
-        self.sumo_process = subprocess.Popen([sumoBinary, "-c",
-                                         self.cfg_fp, "--remote-port",
-                                         str(port), "--no-warnings",
-                                         "--no-step-log", "--random"],
-                                         stdout=None, stderr=None)
-
-        self.conn = traci.connect(port)
+        if not self.loaded:
+            #port 0 lets the supervisor pick free ports
+            port = self.args.port+self.idx if self.args.port > 0 else 0
+            self.seed = self.get_seed()
+            self.backend = SimSupervisor(sim_backend_factory(self.args.backend, self.sumo_cmd, self.netdata, self.args.net_fp), port)
+            self.conn = self.instrument(self.backend.start(self.get_sim_args()))
+            self.subscribe_sim()
+        self.loaded = False
 
         self.t = 0
         self.v_start_times = {}
         self.v_travel_times = {}
         self.vehiclegen = None
-        if self.args.sim == 'double' or self.args.sim == 'single':
+        #sumo inserts the vehicles of route files itself
+        if (self.args.sim == 'double' or self.args.sim == 'single') and not self.route_cache:
             self.vehiclegen = VehicleGen(self.netdata, 
                                          self.args.sim_len, 
                                          self.args.demand, 
                                          self.args.scale,
-                                         self.args.mode, self.conn) 
-
-    def serverless_connect(self):
-        traci.start([self.sumo_cmd, 
-                     "-c", self.cfg_fp, 
-                     "--no-step-log", 
-                     "--no-warnings",
-                     "--random"])
-
-    def server_connect(self):
-        sumoBinary = checkBinary(self.sumo_cmd)
-        port = self.args.port+self.idx
-        sumo_process = subprocess.Popen([sumoBinary, "-c",
-                                         self.cfg_fp, "--remote-port",      
-                                         str(port), "--no-warnings",
-                                         "--no-step-log", "--random"],
-                                         stdout=None, stderr=None)
-
-        return traci.connect(port), sumo_process
+                                         self.args.mode, self.conn,
+                                         seed=self.seed,
+                                         profile=self.args.profile,
+                                         profile_fp=self.args.profile_fp,
+                                         schedule_fp=self.args.schedule_fp) 
+        self.episode += 1
+
+    def get_sim_args(self):
+        sim_args = ["-c", self.cfg_fp, "--no-warnings", "--no-step-log"]
+        sim_args += ["--random"] if self.seed is None else ["--seed", str(self.seed)]
+        self.tripinfo_fp = None
+        if self.args.jump:
+            #departed/arrived lists cannot time vehicles
+            #inside a jump, sumo records their trips
+            self.tripinfo_fp = self.get_tmp_fp('tripinfo', '.xml')
+            sim_args += ["--tripinfo-output", self.tripinfo_fp]
+        if self.route_cache:
+            self.route_fp = self.route_cache.get(self.netdata, self.args, self.seed, self.idx, self.get_tmp_fp('routes', '.rou.xml'))
+            sim_args += ["--route-files", self.route_fp]
+        if self.stopline:
+            if self.detector_fp is None or not os.path.isfile(self.detector_fp):
+                self.detector_fp = os.path.join(tempfile.gettempdir(), 'detectors_'+str(os.getpid())+'_'+str(self.idx)+'.add.xml')
+                write_detector_file(self.detector_fp, self.netdata)
+            #keep the config's additional files
+            sim_args += ["--additional-files", ','.join(get_additional_files(self.cfg_fp)+[self.detector_fp])]
+        return sim_args
+
+    def get_tmp_fp(self, name, ext):
+        #unique to this process, sim and episode
+        return os.path.join(tempfile.gettempdir(), name+'_'+str(os.getpid())+'_'+str(self.idx)+'_'+str(self.episode)+ext)
+
+    def remove_tmp_routes(self, route_fp):
+        #only seeded test route files are kept
+        if route_fp and not self.route_cache.reusable(self.args) and os.path.isfile(route_fp):
+            os.remove(route_fp)
+
+    def remove_detectors(self):
+        #written again when the next sim starts
+        if self.detector_fp and os.path.isfile(self.detector_fp):
+            os.remove(self.detector_fp)
+
+    def instrument(self, conn):
+        ###count the commands sent to the simulator,
+        #one instrumented connection per connection
+        if not self.args.traci_stats:
+            return conn
+        if self.instrumented is None or self.instrumented.conn is not conn:
+            self.instrumented = InstrumentedConnection(conn)
+        self.instrumented.reset()
+        return self.instrumented
+
+    def subscribe_sim(self):
+        #departures and arrivals arrive with every
+        #step's results instead of a round trip each
+        self.conn.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS,
+                                        tc.VAR_ARRIVED_VEHICLES_IDS])
+        if self.stopline:
+            self.stopline.subscribe(self.conn)
+
+    def log_traci_stats(self):
+        if self.instrumented:
+            write_to_log(' SIM '+str(self.idx)+' EPISODE '+str(self.episode)+' TRACI COMMANDS\n'+self.instrumented.summary(self.t))
+
+    def get_seed(self):
+        #reproducible but different for every sim and episode,
+        #31 bits, sumo seeds are signed 32 bit ints
+        if self.args.seed is None:
+            return None
+        return int(np.random.SeedSequence([self.args.seed, self.idx+1, self.episode]).generate_state(1)[0] >> 1)
 
     def get_traffic_lights(self):
+        #the network does not change between episodes
+        if self.tls is not None:
+            return set(self.tls)
         #find all the junctions with traffic lights
         trafficlights = self.conn.trafficlight.getIDList()
         junctions = self.conn.junction.getIDList()
@@ -80,16 +159,7 @@ class SumoSim:
      
         #only keep traffic lights with more than 1 green phase
         for tl in tl_juncs:
-            #subscription to get traffic light phases
-            self.conn.trafficlight.subscribe(tl, [traci.constants.TL_COMPLETE_DEFINITION_RYG])
-            tldata = self.conn.trafficlight.getAllSubscriptionResults()
-            logic = tldata[tl][traci.constants.TL_COMPLETE_DEFINITION_RYG][0]
-
-            #for some reason this throws errors for me in SUMO 1.2
-            #have to do subscription based above
-            '''
-            logic = self.conn.trafficlight.getCompleteRedYellowGreenDefinition(tl)[0] 
-            '''
+            logic = self.backend.get_tl_logic(tl)
             #get only the green phases
             green_phases = [ p.state for p in logic.getPhases()
                              if 'y' not in p.state
@@ -105,16 +175,41 @@ class SumoSim:
             for r in lust_remove:
                 if r in tls:
                     tls.remove(r)
+        self.tls = set(tls)
         return set(tls) 
 
 
-    def create_tsc(self, rl_stats, exp_replays, eps, neural_networks = None):
+    def create_tsc(self, rl_stats, exp_replays, weight_channels, learner_events, eps, neural_networks = None):
+        if self.reuse_tsc:
+            #same controllers, agents and vehicle snapshot
+            for tl in self.tsc:
+                self.tsc[tl].reset(self.conn)
+            self.reuse_tsc = False
+            return
         self.tl_junc = self.get_traffic_lights() 
         if not neural_networks:
             neural_networks = {tl:None for tl in self.tl_junc}
         #create traffic signal controllers for the junctions with lights
-        self.tsc = { tl:tsc_factory(self.args.tsc, tl, self.args, self.netdata, rl_stats[tl], exp_replays[tl], neural_networks[tl], eps, self.conn)  
+        #one vehicle snapshot per step shared by all controllers
+        lanes = sorted(self.netdata['lane'].keys())
+        self.snapshot = VehicleSnapshot(lanes, [ self.netdata['lane'][l]['length'] for l in lanes ])
+        self.tsc = { tl:tsc_factory(self.args.tsc, tl, self.args, self.netdata, rl_stats[tl], exp_replays[tl], weight_channels[tl], learner_events[tl], neural_networks[tl], eps, self.conn)  
                      for tl in self.tl_junc }
+        #batch the forward passes of rl controllers
+        #deciding in the same step
+        self.batcher = None
+        if self.args.batch_infer and self.args.tsc in ['dqn', 'ddpg']:
+            self.batcher = InferenceBatcher()
+            for tl in self.tsc:
+                self.tsc[tl].batcher = self.batcher
+        #max pressure of all intersections from one matvec
+        if self.args.tsc == 'maxpressure':
+            pressure = PressureMatrix({ tl:self.tsc[tl].get_pressure_lanes() for tl in self.tsc }, self.snapshot.lane_idx)
+            for tl in self.tsc:
+                self.tsc[tl].pressure = pressure
+        if self.stopline:
+            for tl in self.tsc:
+                self.tsc[tl].stopline = self.stopline
 
     def update_netdata(self):
         tl_junc = self.get_traffic_lights()
@@ -132,11 +227,52 @@ class SumoSim:
 
         return self.netdata
 
-    def sim_step(self):
-        self.conn.simulationStep()
-        self.t += 1
+    def sim_step(self, n=1):
+        if n == 1:
+            self.conn.simulationStep()
+        else:
+            #run n steps in one command
+            self.conn.simulationStep(float(self.t+n))
+        self.t += n
 
     def run_offset(self, offset):
+        offset = int(np.ceil(offset))
+        if self.warmup_cache and offset > self.t:
+            key = self.warmup_cache.key(self.args, self.seed, offset)
+            if self.warmup_cache.exists(key):
+                self.set_state(self.warmup_cache.load(self.conn, key))
+                return
+            self.warm_up(offset)
+            #the last step's departures and arrivals are lost when
+            #the saved state is loaded, jump sims read trips from
+            #sumo output and keep no warm up travel times
+            if not self.args.jump:
+                self.update_travel_times()
+            self.warmup_cache.save(self.conn, key, self.get_state())
+        else:
+            self.warm_up(offset)
+
+    def get_state(self):
+        return {'t':self.t,
+                'v_start_times':self.v_start_times,
+                'v_travel_times':self.v_travel_times,
+                'vehiclegen':self.vehiclegen.get_state() if self.vehiclegen else None}
+
+    def set_state(self, state):
+        self.t = state['t']
+        self.v_start_times = state['v_start_times']
+        self.v_travel_times = state['v_travel_times']
+        if self.vehiclegen:
+            self.vehiclegen.set_state(state['vehiclegen'])
+
+    def warm_up(self, offset):
+        if self.args.jump:
+            #no controllers yet, jump straight to the offset
+            n = offset - self.t
+            if n > 0:
+                self.gen_vehicles(n)
+                self.sim_step(n)
+            return
         while self.t < offset:
             #create vehicles if vehiclegen class exists
             if self.vehiclegen:
@@ -144,7 +280,15 @@ class SumoSim:
             self.update_travel_times()
             self.sim_step()
 
+    def gen_vehicles(self, n):
+        #add the vehicles of the next n steps
+        if self.vehiclegen:
+            self.vehiclegen.run_steps(n)
+
     def run(self):
+        if self.args.jump:
+            self.run_events()
+            return
         #execute simulation for desired length
         while self.t < self.sim_len:
             #create vehicles if vehiclegen class exists
@@ -152,27 +296,63 @@ class SumoSim:
                 self.vehiclegen.run()
             self.update_travel_times()
             #run all traffic signal controllers in network
-            for t in self.tsc:
-                self.tsc[t].run()
+            self.update_snapshot()
+            if self.batcher:
+                self.run_batched_tsc(self.tsc)
+            else:
+                for t in self.tsc:
+                    self.tsc[t].run(self.snapshot)
             self.sim_step()
 
+    def run_events(self):
+        ###event driven, controllers are only run on steps
+        #they need and the sim jumps over steps none need
+        while self.t < self.sim_len:
+            due = [ t for t in self.tsc if self.tsc[t].next_event() == 1 ]
+            if len(due) > 0:
+                self.update_snapshot()
+                if self.batcher:
+                    self.run_batched_tsc(due)
+                else:
+                    for t in due:
+                        self.tsc[t].run(self.snapshot)
+            for t in set(self.tsc) - set(due):
+                self.tsc[t].skip(1)
+            #jump to the next step a controller needs
+            n = min([ self.tsc[t].next_event() for t in self.tsc ]+[self.sim_len - self.t])
+            for t in self.tsc:
+                self.tsc[t].skip(n-1)
+            self.gen_vehicles(n)
+            self.sim_step(n)
+
+    def run_batched_tsc(self, tsc_ids):
+        #observe all intersections first so the
+        #states of deciding controllers can be
+        #passed through their networks together
+        self.batcher.new_step()
+        for t in tsc_ids:
+            self.tsc[t].observe(self.snapshot)
+            state = self.tsc[t].decision_state()
+            if state is not None:
+                self.batcher.submit(t, self.tsc[t].rlagent, state)
+        self.batcher.run()
+        for t in tsc_ids:
+            self.tsc[t].increment_controller()
+
     def update_travel_times(self):
-        for v in self.conn.simulation.getDepartedIDList():
+        results = self.conn.simulation.getSubscriptionResults()
+        for v in results.get(tc.VAR_DEPARTED_VEHICLES_IDS, ()):
             self.v_start_times[v] = self.t
 
-        for v in self.conn.simulation.getArrivedIDList():
-            self.v_travel_times[v] = self.t - self.v_start_times[v]
-            del self.v_start_times[v]
+        for v in results.get(tc.VAR_ARRIVED_VEHICLES_IDS, ()):
+            if v in self.v_start_times:
+                self.v_travel_times[v] = self.t - self.v_start_times.pop(v)
 
-    def get_intersection_subscription(self):
-        tl_data = {}
-        lane_vehicles = { l:{} for l in self.lanes}
-        for tl in self.tl_junc:
-            tl_data[tl] = self.conn.junction.getContextSubscriptionResults(tl)
-            if tl_data[tl] is not None:
-                for v in tl_data[tl]:
-                    lane_vehicles[ tl_data[tl][v][traci.constants.VAR_LANE_ID] ][v] = tl_data[tl][v]
-        return lane_vehicles
+    def update_snapshot(self):
+        #all junction context subscriptions in one call
+        self.snapshot.update(self.conn.junction.getAllContextSubscriptionResults())
+        if self.stopline:
+            self.stopline.update(self.conn.inductionloop.getAllSubscriptionResults())
 
     def sim_stats(self):
         tt = self.get_travel_times()
@@ -191,7 +371,56 @@ class SumoSim:
             tsc_metrics[tsc] = self.tsc[tsc].get_traffic_metrics_history()
         return tsc_metrics
 
+    def read_tripinfo(self, tripinfo_fp):
+        ###travel times of finished trips, only available after
+        #the sim closes and sumo has written all of its output
+        for _, elem in ET.iterparse(tripinfo_fp):
+            if elem.tag == 'tripinfo':
+                self.v_travel_times[elem.get('id')] = int(round(float(elem.get('duration'))))
+            elem.clear()
+        os.remove(tripinfo_fp)
+
+    def end_episode(self, last=False):
+        ###persistent sims reload the scenario for the next
+        #episode in the running simulator, others and the
+        #last episode close
+        if not self.args.persist or last:
+            self.close()
+            return
+        tripinfo_fp = self.tripinfo_fp
+        route_fp = self.route_fp
+        self.log_traci_stats()
+        self.seed = self.get_seed()
+        #loading clears subscriptions
+        self.conn = self.instrument(self.backend.load(self.get_sim_args()))
+        self.subscribe_sim()
+        self.loaded = True
+        self.reuse_tsc = True
+        #loading finishes the episode's outputs
+        if tripinfo_fp:
+            self.read_tripinfo(tripinfo_fp)
+        self.remove_tmp_routes(route_fp)
+
+    def alive(self):
+        #polls the simulator process, sims never started are alive
+        return self.backend.alive() if hasattr(self, 'backend') else True
+
+    def kill(self):
+        ###discard a crashed sim, its outputs are incomplete
+        self.backend.kill()
+        self.loaded = False
+        self.reuse_tsc = False
+        if self.tripinfo_fp and os.path.isfile(self.tripinfo_fp):
+            os.remove(self.tripinfo_fp)
+        self.remove_tmp_routes(self.route_fp)
+        self.remove_detectors()
+
     def close(self):
-        #self.conn.close()
-        self.conn.close()
-        self.sumo_process.terminate()
+        self.log_traci_stats()
+        self.backend.close()
+        self.loaded = False
+        self.reuse_tsc = False
+        if self.tripinfo_fp:
+            self.read_tripinfo(self.tripinfo_fp)
+        self.remove_tmp_routes(self.route_fp)
+        self.remove_detectors()
@@ -0,0 +1,47 @@
+import numpy as np
+
+class SumTree:
+    ###flat binary tree of priority sums, node i has children 2i+1
+    #and 2i+2, the leaves are the last capacity entries
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.tree = np.zeros(2*capacity - 1)
+        self.max_priority = 1.0
+
+    def total(self):
+        return self.tree[0]
+
+    def get_priorities(self, idx):
+        return self.tree[np.asarray(idx) + self.capacity - 1]
+
+    def update(self, idx, priorities):
+        ###set leaf priorities and propagate the sums up to the root
+        nodes = np.asarray(idx, dtype=np.int64) + self.capacity - 1
+        self.tree[nodes] = priorities
+        if len(nodes) > 0:
+            self.max_priority = max(self.max_priority, np.amax(priorities))
+        #leaves can sit at different depths when capacity is not a power
+        #of two, parents are recomputed after all of their children
+        nodes = np.unique((nodes[nodes > 0] - 1) // 2)
+        while len(nodes) > 0:
+            self.tree[nodes] = self.tree[2*nodes + 1] + self.tree[2*nodes + 2]
+            nodes = np.unique((nodes[nodes > 0] - 1) // 2)
+
+    def sample(self, n):
+        ###stratified sampling, one value from each of n equal priority segments
+        segment = self.total() / n
+        values = (np.arange(n) + np.random.uniform(0.0, 1.0, size=n)) * segment
+        nodes = np.zeros(n, dtype=np.int64)
+        #descend from the root until every value has reached a leaf
+        while True:
+            left = 2*nodes + 1
+            descend = left < len(self.tree)
+            if not np.any(descend):
+                break
+            left = left[descend]
+            v = values[descend]
+            go_right = v > self.tree[left]
+            values[descend] = np.where(go_right, v - self.tree[left], v)
+            nodes[descend] = np.where(go_right, left + 1, left)
+        idx = nodes - (self.capacity - 1)
+        return idx, self.tree[nodes]
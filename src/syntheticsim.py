@@ -0,0 +1,466 @@
+import pickle
+import xml.etree.ElementTree as ET
+
+import src.traciconstants as tc
+
+import numpy as np
+
+class SyntheticPhase:
+    def __init__(self, state, duration):
+        self.state = state
+        self.duration = duration
+
+class SyntheticLogic:
+    def __init__(self, phases):
+        self.phases = [SyntheticPhase(state, duration) for state, duration in phases]
+
+    def getPhases(self):
+        return self.phases
+
+class SyntheticSim:
+    """NumPy queueing model stand in for a sumo simulation.
+
+    Vehicles drive their route lane by lane at the lane speed, keep
+    a minimum gap to the vehicle ahead, stop at the stop line unless
+    their link is green and leave a lane at most once per saturation
+    headway. Like sumo, vehicles stuck at the front of a lane for
+    teleport_t steps jump to their next lane regardless. Finished
+    trips are written to tripinfo_fp like sumo's tripinfo output,
+    vehicles of route_fp are inserted at their depart time and
+    induction loops of additional_fps count the vehicles leaving
+    their lane. Exposes
+    the subset of the traci api the project uses as domain objects
+    (sim.vehicle.addFull, sim.junction.subscribeContext, ...) so it
+    can be used in place of a traci connection.
+    """
+    def __init__(self, netdata, net_fp, min_gap=7.5, headway=2.0, teleport_t=300, tripinfo_fp=None, route_fp=None, additional_fps=()):
+        self.netdata = netdata
+        self.min_gap = min_gap
+        self.headway = headway
+        self.teleport_t = teleport_t
+        self.t = 0
+
+        ###lanes
+        self.lane_ids = sorted(netdata['lane'].keys())
+        self.lane_idx = { l:i for i, l in enumerate(self.lane_ids) }
+        self.lane_len = np.array([ netdata['lane'][l]['length'] for l in self.lane_ids ])
+        self.lane_speed = np.array([ netdata['lane'][l]['speed'] for l in self.lane_ids ])
+        self.lane_edge = [ netdata['lane'][l]['edge'] for l in self.lane_ids ]
+        self.edge_lanes = { e:[ self.lane_idx[l] for l in netdata['edge'][e]['lanes'] ] for e in netdata['edge'] }
+
+        ###traffic lights, first program of each
+        self.tl_logic = {}
+        for tl in ET.parse(net_fp).getroot().iter('tlLogic'):
+            if tl.get('id') not in self.tl_logic:
+                self.tl_logic[tl.get('id')] = SyntheticLogic([ (p.get('state'), float(p.get('duration'))) for p in tl.iter('phase') ])
+        self.tl_state = { tl:self.tl_logic[tl].getPhases()[0].state for tl in self.tl_logic }
+        #like sumo, lights run their static program until
+        #their state is set, (phase index, time left)
+        self.tl_program = { tl:(0, self.tl_logic[tl].getPhases()[0].duration) for tl in self.tl_logic }
+
+        ###links, the signal (tl, index) controlling each lane's
+        #movement to the next edge and the lanes of an edge
+        #that connect to the next edge
+        self.links = {}
+        self.edge_next_lanes = {}
+        for l in self.lane_ids:
+            edge = self.lane_edge[self.lane_idx[l]]
+            tl = netdata['edge'][edge]['incnode']
+            for out_lane in netdata['lane'][l]['outgoing']:
+                next_edge = netdata['lane'][out_lane]['edge']
+                index = netdata['lane'][l]['outgoing'][out_lane]['index']
+                link = (tl, index) if tl in self.tl_logic and index >= 0 else None
+                self.links.setdefault((self.lane_idx[l], next_edge), link)
+                lanes = self.edge_next_lanes.setdefault((edge, next_edge), [])
+                if self.lane_idx[l] not in lanes:
+                    lanes.append(self.lane_idx[l])
+        #junctions a lane is incoming to and outgoing
+        #from, for context subscriptions
+        self.junction_ids = sorted(netdata['node'].keys())
+        self.lane_junction = np.array([ self.junction_ids.index(netdata['edge'][e]['incnode']) for e in self.lane_edge ])
+        self.lane_out_junction = np.array([ self.junction_ids.index(netdata['edge'][e]['outnode']) for e in self.lane_edge ])
+
+        ###vehicles, slots in preallocated arrays
+        self.v_lane = np.zeros(0, dtype=np.int64)
+        self.v_pos = np.zeros(0)
+        self.v_speed = np.zeros(0)
+        self.v_alive = np.zeros(0, dtype=bool)
+        self.v_route_i = np.zeros(0, dtype=np.int64)
+        self.v_wait = np.zeros(0, dtype=np.int64)
+        self.v_depart = np.zeros(0, dtype=np.int64)
+        self.v_ids = []
+        self.v_routes = []
+        self.v_slot = {}
+        self.free_slots = []
+        self.grow(64)
+        self.lane_tail = np.full(len(self.lane_ids), np.inf)
+        self.lane_last_exit = np.full(len(self.lane_ids), -np.inf)
+        #vehicles waiting to be inserted, (depart time, id, route)
+        self.pending = {}
+        self.route_defs = {}
+        self.departed = []
+        self.arrived = []
+        self.context = {}
+        self.context_results = None
+        self.tripinfo = None
+        if tripinfo_fp:
+            self.tripinfo = open(tripinfo_fp, 'w')
+            self.tripinfo.write('<tripinfos>\n')
+        #route file vehicles sorted by depart, the
+        #next one to move to the pending vehicles
+        self.route_file = []
+        self.route_file_i = 0
+        if route_fp:
+            self.read_route_file(route_fp)
+        #vehicles that left each lane in the last simulationStep,
+        #read by induction loops, sumo loops see them the same way
+        self.lane_passed = {}
+        self.loops = {}
+        for fp in additional_fps:
+            for loop in ET.parse(fp).getroot().iter('inductionLoop'):
+                self.loops[loop.get('id')] = self.lane_idx[loop.get('lane')]
+
+        ###traci domains
+        self.simulation = SimulationDomain(self)
+        self.vehicle = VehicleDomain(self)
+        self.route = RouteDomain(self)
+        self.junction = JunctionDomain(self)
+        self.trafficlight = TrafficLightDomain(self)
+        self.lane = LaneDomain(self)
+        self.inductionloop = InductionLoopDomain(self)
+
+    def grow(self, n):
+        old = len(self.v_alive)
+        self.v_lane = np.concatenate([self.v_lane, np.zeros(n, dtype=np.int64)])
+        self.v_pos = np.concatenate([self.v_pos, np.zeros(n)])
+        self.v_speed = np.concatenate([self.v_speed, np.zeros(n)])
+        self.v_alive = np.concatenate([self.v_alive, np.zeros(n, dtype=bool)])
+        self.v_route_i = np.concatenate([self.v_route_i, np.zeros(n, dtype=np.int64)])
+        self.v_wait = np.concatenate([self.v_wait, np.zeros(n, dtype=np.int64)])
+        self.v_depart = np.concatenate([self.v_depart, np.zeros(n, dtype=np.int64)])
+        self.v_ids.extend([None]*n)
+        self.v_routes.extend([None]*n)
+        self.free_slots.extend(range(old+n-1, old-1, -1))
+
+    def simulationStep(self, step=0.0):
+        ###one step, or until time step, departed and
+        #arrived lists cover all steps run
+        self.departed = []
+        self.arrived = []
+        self.lane_passed = {}
+        while True:
+            self.run_programs()
+            self.move_vehicles()
+            self.insert_vehicles()
+            self.t += 1
+            if self.t >= step:
+                break
+        self.context_results = None
+
+    def run_programs(self):
+        for tl in self.tl_program:
+            i, left = self.tl_program[tl]
+            if left <= 0:
+                phases = self.tl_logic[tl].getPhases()
+                i = (i + 1) % len(phases)
+                left = phases[i].duration
+                self.tl_state[tl] = phases[i].state
+            self.tl_program[tl] = (i, left - 1)
+
+    def best_lane(self, edge, next_edge):
+        ###lane of edge connecting to next edge with the most free space
+        lanes = self.edge_next_lanes.get((edge, next_edge), self.edge_lanes[edge])
+        return lanes[int(np.argmax(self.lane_tail[lanes]))]
+
+    def move_vehicles(self):
+        idx = np.flatnonzero(self.v_alive)
+        self.lane_tail[:] = np.inf
+        if len(idx) == 0:
+            return
+        lane = self.v_lane[idx]
+        pos = self.v_pos[idx]
+        #sort by lane, then front to back
+        order = np.lexsort((-pos, lane))
+        idx, lane, pos = idx[order], lane[order], pos[order]
+        front = np.ones(len(idx), dtype=bool)
+        front[1:] = lane[1:] != lane[:-1]
+        length = self.lane_len[lane]
+        target = pos + self.lane_speed[lane]
+        #followers stop short of their leader, leaders at the stop line
+        leader_pos = np.empty_like(pos)
+        leader_pos[0] = np.inf
+        leader_pos[1:] = pos[:-1]
+        limit = np.where(front, length, leader_pos - self.min_gap)
+        new_pos = np.maximum(pos, np.minimum(target, limit))
+        self.v_pos[idx] = new_pos
+        self.v_speed[idx] = new_pos - pos
+        self.v_wait[idx] = np.where(new_pos - pos < 0.1, self.v_wait[idx]+1, 0)
+        #the back of each lane's queue, for insertion and crossing space
+        last = np.ones(len(idx), dtype=bool)
+        last[:-1] = lane[1:] != lane[:-1]
+        self.lane_tail[lane[last]] = new_pos[last]
+
+        ###leaders reaching the end of their lane try to cross
+        for i in np.flatnonzero(front & (target >= length)):
+            self.cross(idx[i], lane[i], target[i] - length[i])
+
+    def cross(self, slot, lane, overshoot):
+        route = self.v_routes[slot]
+        route_i = self.v_route_i[slot]
+        if route_i == len(route) - 1:
+            self.lane_passed.setdefault(lane, []).append(self.v_ids[slot])
+            self.remove_vehicle(slot)
+            return
+        next_edge = route[route_i+1]
+        following = route[route_i+2] if route_i+2 < len(route) else None
+        next_lane = self.best_lane(next_edge, following)
+        if self.v_wait[slot] < self.teleport_t:
+            if self.t - self.lane_last_exit[lane] < self.headway:
+                return
+            link = self.links.get((lane, next_edge))
+            if link is not None and self.tl_state[link[0]][link[1]] not in 'Gg':
+                return
+            if self.lane_tail[next_lane] < self.min_gap:
+                #no space on the next lane
+                return
+        new_pos = max(min(overshoot, self.lane_tail[next_lane] - self.min_gap), 0.0)
+        self.lane_last_exit[lane] = self.t
+        self.lane_passed.setdefault(lane, []).append(self.v_ids[slot])
+        self.v_lane[slot] = next_lane
+        self.v_pos[slot] = new_pos
+        self.v_speed[slot] = self.lane_speed[lane]
+        self.v_route_i[slot] = route_i + 1
+        self.v_wait[slot] = 0
+        self.lane_tail[next_lane] = new_pos
+
+    def read_route_file(self, route_fp):
+        for _, elem in ET.iterparse(route_fp):
+            if elem.tag == 'route':
+                self.route_defs[elem.get('id')] = elem.get('edges').split()
+            elif elem.tag == 'vehicle':
+                self.route_file.append((float(elem.get('depart')), elem.get('id'), elem.get('route')))
+            elem.clear()
+        self.route_file.sort(key=lambda v: v[0])
+
+    def insert_vehicles(self):
+        while self.route_file_i < len(self.route_file) and self.route_file[self.route_file_i][0] <= self.t:
+            depart, vid, route_id = self.route_file[self.route_file_i]
+            self.pending[vid] = (depart, list(self.route_defs[route_id]))
+            self.route_file_i += 1
+        for vid in list(self.pending):
+            depart, route = self.pending[vid]
+            if depart > self.t:
+                continue
+            following = route[1] if len(route) > 1 else None
+            lane = self.best_lane(route[0], following)
+            if self.lane_tail[lane] < self.min_gap:
+                #no space, keep waiting like sumo's insertion backlog
+                continue
+            del self.pending[vid]
+            if len(self.free_slots) == 0:
+                self.grow(len(self.v_alive))
+            slot = self.free_slots.pop()
+            self.v_slot[vid] = slot
+            self.v_ids[slot] = vid
+            self.v_routes[slot] = route
+            self.v_route_i[slot] = 0
+            self.v_lane[slot] = lane
+            self.v_pos[slot] = 0.0
+            self.v_speed[slot] = 0.0
+            self.v_wait[slot] = 0
+            self.v_depart[slot] = self.t
+            self.v_alive[slot] = True
+            self.lane_tail[lane] = 0.0
+            self.departed.append(vid)
+
+    def remove_vehicle(self, slot):
+        vid = self.v_ids[slot]
+        self.v_alive[slot] = False
+        self.v_ids[slot] = None
+        self.v_routes[slot] = None
+        del self.v_slot[vid]
+        self.free_slots.append(slot)
+        self.arrived.append(vid)
+        if self.tripinfo:
+            self.tripinfo.write('    <tripinfo id="'+str(vid)+'" depart="'+str(self.v_depart[slot])+'" arrival="'+str(self.t)
+                                +'" duration="'+str(self.t - self.v_depart[slot])+'"/>\n')
+
+    def get_context_results(self, junction):
+        ###vehicles on lanes incoming to subscribed junctions within their
+        #subscription distance of the stop line, or on outgoing lanes
+        #within the distance of the lane start
+        if self.context_results is None:
+            self.context_results = { j:{} for j in self.context }
+            idx = np.flatnonzero(self.v_alive)
+            lane = self.v_lane[idx]
+            junction_idx = self.lane_junction[lane]
+            out_junction_idx = self.lane_out_junction[lane]
+            dist = self.lane_len[lane] - self.v_pos[idx]
+            for j in self.context:
+                j_idx, j_dist = self.context[j]
+                near = np.flatnonzero(((junction_idx == j_idx) & (dist <= j_dist))
+                                      | ((out_junction_idx == j_idx) & (self.v_pos[idx] <= j_dist)))
+                self.context_results[j] = { self.v_ids[idx[i]]:{tc.VAR_LANEPOSITION:self.v_pos[idx[i]],
+                                                                tc.VAR_SPEED:self.v_speed[idx[i]],
+                                                                tc.VAR_LANE_ID:self.lane_ids[lane[i]]}
+                                            for i in near }
+        if junction is None:
+            return self.context_results
+        return self.context_results.get(junction)
+
+    def get_state_attrs(self):
+        #everything that changes as the sim runs
+        return ['t', 'v_lane', 'v_pos', 'v_speed', 'v_alive', 'v_route_i', 'v_wait', 'v_depart',
+                'v_ids', 'v_routes', 'v_slot', 'free_slots', 'lane_tail', 'lane_last_exit',
+                'pending', 'route_defs', 'route_file_i', 'lane_passed', 'tl_state', 'tl_program']
+
+    def save_state(self, fp):
+        with open(fp, 'wb') as f:
+            pickle.dump({ a:getattr(self, a) for a in self.get_state_attrs() }, f)
+
+    def load_state(self, fp):
+        with open(fp, 'rb') as f:
+            self.__dict__.update(pickle.load(f))
+        self.departed = []
+        self.arrived = []
+        self.context_results = None
+
+    def close(self):
+        if self.tripinfo:
+            self.tripinfo.write('</tripinfos>\n')
+            self.tripinfo.close()
+            self.tripinfo = None
+
+class SimulationDomain:
+    def __init__(self, sim):
+        self.sim = sim
+        self.subscription = []
+
+    def getDepartedIDList(self):
+        return tuple(self.sim.departed)
+
+    def getArrivedIDList(self):
+        return tuple(self.sim.arrived)
+
+    def getTime(self):
+        return float(self.sim.t)
+
+    def getMinExpectedNumber(self):
+        return len(self.sim.v_slot) + len(self.sim.pending) + len(self.sim.route_file) - self.sim.route_file_i
+
+    def subscribe(self, varIDs=(tc.VAR_DEPARTED_VEHICLES_IDS,), begin=0, end=2**31-1):
+        self.subscription = list(varIDs)
+
+    def getSubscriptionResults(self):
+        getters = {tc.VAR_DEPARTED_VEHICLES_IDS:self.getDepartedIDList,
+                   tc.VAR_ARRIVED_VEHICLES_IDS:self.getArrivedIDList,
+                   tc.VAR_MIN_EXPECTED_VEHICLES:self.getMinExpectedNumber}
+        return { v:getters[v]() for v in self.subscription }
+
+    def saveState(self, fileName):
+        self.sim.save_state(fileName)
+
+    def loadState(self, fileName):
+        self.sim.load_state(fileName)
+
+class VehicleDomain:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def add(self, vehID, routeID, typeID="DEFAULT_VEHTYPE", depart=None, **kwargs):
+        depart = self.sim.t if depart in [None, 'now'] else float(depart)
+        self.sim.pending[vehID] = (depart, list(self.sim.route_defs[routeID]))
+
+    def addFull(self, vehID, routeID, typeID="DEFAULT_VEHTYPE", depart=None, **kwargs):
+        self.add(vehID, routeID, typeID, depart)
+
+    def getRoute(self, vehID):
+        if vehID in self.sim.pending:
+            return tuple(self.sim.pending[vehID][1])
+        return tuple(self.sim.v_routes[self.sim.v_slot[vehID]])
+
+    def setRoute(self, vehID, edgeList):
+        ###new route must start on the vehicle's current edge
+        if vehID in self.sim.pending:
+            depart, _ = self.sim.pending[vehID]
+            self.sim.pending[vehID] = (depart, list(edgeList))
+        else:
+            slot = self.sim.v_slot[vehID]
+            self.sim.v_routes[slot] = list(edgeList)
+            self.sim.v_route_i[slot] = 0
+
+    def getIDCount(self):
+        return len(self.sim.v_slot)
+
+    def getIDList(self):
+        return tuple(self.sim.v_slot.keys())
+
+class RouteDomain:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def add(self, routeID, edges):
+        self.sim.route_defs[routeID] = list(edges)
+
+    def getIDList(self):
+        return tuple(self.sim.route_defs.keys())
+
+class JunctionDomain:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def getIDList(self):
+        return tuple(self.sim.junction_ids)
+
+    def subscribeContext(self, objectID, domain, dist, varIDs=None, **kwargs):
+        #vehicle variables only, always lane id, speed and lane position
+        self.sim.context[objectID] = (self.sim.junction_ids.index(objectID), dist)
+        self.sim.context_results = None
+
+    def getContextSubscriptionResults(self, objectID):
+        return self.sim.get_context_results(objectID)
+
+    def getAllContextSubscriptionResults(self):
+        return self.sim.get_context_results(None)
+
+class TrafficLightDomain:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def getIDList(self):
+        return tuple(self.sim.tl_logic.keys())
+
+    def getCompleteRedYellowGreenDefinition(self, tlsID):
+        return [self.sim.tl_logic[tlsID]]
+
+    def setRedYellowGreenState(self, tlsID, state):
+        self.sim.tl_state[tlsID] = state
+        self.sim.tl_program.pop(tlsID, None)
+
+    def getRedYellowGreenState(self, tlsID):
+        return self.sim.tl_state[tlsID]
+
+class LaneDomain:
+    def __init__(self, sim):
+        self.sim = sim
+
+    def getIDList(self):
+        return tuple(self.sim.lane_ids)
+
+class InductionLoopDomain:
+    def __init__(self, sim):
+        self.sim = sim
+        self.subscriptions = {}
+
+    def getIDList(self):
+        return tuple(self.sim.loops.keys())
+
+    def getLastStepVehicleIDs(self, loopID):
+        return tuple(self.sim.lane_passed.get(self.sim.loops[loopID], ()))
+
+    def subscribe(self, objectID, varIDs=None, begin=None, end=None, parameters=None):
+        self.subscriptions[objectID] = list(varIDs)
+
+    def getAllSubscriptionResults(self):
+        getters = {tc.LAST_STEP_VEHICLE_ID_LIST:self.getLastStepVehicleIDs}
+        return { l:{ v:getters[v](l) for v in self.subscriptions[l] } for l in self.subscriptions }
@@ -0,0 +1,32 @@
+import os, sys
+
+###traci constants and exceptions used outside the sumo backends,
+#literal values when traci is not installed so the synthetic
+#backend runs without sumo, the fallback exception classes are
+#only raised by the synthetic backend, the sumo backends need
+#traci and always raise its own
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    if tools not in sys.path:
+        sys.path.append(tools)
+
+try:
+    from traci.constants import (CMD_GET_VEHICLE_VARIABLE, VAR_LANE_ID, VAR_SPEED, VAR_LANEPOSITION,
+                                 VAR_DEPARTED_VEHICLES_IDS, VAR_ARRIVED_VEHICLES_IDS,
+                                 VAR_MIN_EXPECTED_VEHICLES, LAST_STEP_VEHICLE_ID_LIST)
+    from traci.exceptions import TraCIException, FatalTraCIError
+except ImportError:
+    CMD_GET_VEHICLE_VARIABLE = 0xa4
+    VAR_LANE_ID = 0x51
+    VAR_SPEED = 0x40
+    VAR_LANEPOSITION = 0x56
+    VAR_DEPARTED_VEHICLES_IDS = 0x74
+    VAR_ARRIVED_VEHICLES_IDS = 0x7a
+    VAR_MIN_EXPECTED_VEHICLES = 0x7d
+    LAST_STEP_VEHICLE_ID_LIST = 0x12
+
+    class TraCIException(Exception):
+        pass
+
+    class FatalTraCIError(Exception):
+        pass
@@ -1,13 +1,5 @@
 import os, sys
 
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-    from sumolib import checkBinary
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-
-import traci
 
 class TrafficMetrics:
     def __init__(self, _id, incoming_lanes, netdata, metric_args, mode):
@@ -21,6 +13,7 @@ class TrafficMetrics:
             self.metrics['queue'] = QueueMetric(_id, incoming_lanes, mode)
 
     def update(self, v_data):
+        #v_data is the controller's LaneOccupancy
         for m in self.metrics:
             self.metrics[m].update(v_data)
 
@@ -73,12 +66,13 @@ class DelayMetric(TrafficMetric):
 
         #record start time and lane of new_vehicles
         for lane in self.incoming_lanes:
-            for v in v_data[lane]:
+            lane_v = v_data.get_ids(lane).tolist()
+            for v in lane_v:
                 if v not in self.old_v:
                     self.v_info[v] = {}
                     self.v_info[v]['t'] = self.t
                     self.v_info[v]['lane'] = lane
-            new_v.update( set(v_data[lane].keys()) )
+            new_v.update(lane_v)
 
         if self.mode == 'test':
             self.history.append(self.get_metric())
@@ -95,20 +89,13 @@ class DelayMetric(TrafficMetric):
 class QueueMetric(TrafficMetric):
     def __init__(self, _id, incoming_lanes, mode):
         super().__init__( _id, incoming_lanes, mode)
-        self.stop_speed = 0.3
-        self.lane_queues = {lane:0 for lane in self.incoming_lanes}
+        self.queue = 0
 
     def get_metric(self):
-        return sum([self.lane_queues[lane] for lane in self.lane_queues])
+        return self.queue
 
     def update(self, v_data):
-        lane_queues = {}
-        for lane in self.incoming_lanes:
-            lane_queues[lane] = 0
-            for v in v_data[lane]:
-                if v_data[lane][v][traci.constants.VAR_SPEED] < self.stop_speed:
-                    lane_queues[lane] += 1
-
-        self.lane_queues = lane_queues
+        #halted vehicles are slower than the snapshot's stop speed
+        self.queue = int(v_data.halted.sum())
         if self.mode == 'test':
             self.history.append(self.get_metric())
@@ -4,16 +4,11 @@ import numpy as np
 
 from collections import deque
 
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-    from sumolib import checkBinary
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-
-import traci
+import src.traciconstants as tc
 
 from src.trafficmetrics import TrafficMetrics
+from src.laneoccupancy import LaneOccupancy
+from src.dtse import DTSE
 
 class TrafficSignalController:
     """Abstract base class for all traffic signal controller.
@@ -23,6 +18,7 @@ class TrafficSignalController:
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t):
         self.conn = conn
         self.id = tsc_id
+        self.mode = mode
         self.netdata = netdata
         self.red_t = red_t
         self.yellow_t = yellow_t
@@ -30,13 +26,11 @@ class TrafficSignalController:
         self.phase_time = 0
         self.all_red = len((self.green_phases[0]))*'r'
         self.phase = self.all_red
+        #last state sent to the sim, None until the
+        #controller takes over from the static program
+        self.sim_phase = None
         self.phase_lanes = self.phase_lanes(self.green_phases)
-        #create subscription for this traffic signal junction to gather
-        #vehicle information efficiently
-        self.conn.junction.subscribeContext(tsc_id, traci.constants.CMD_GET_VEHICLE_VARIABLE, 150, 
-                                        [traci.constants.VAR_LANEPOSITION, 
-                                        traci.constants.VAR_SPEED, 
-                                        traci.constants.VAR_LANE_ID])
+        self.subscribe()
         #get all incoming lanes to intersection
         self.incoming_lanes = set()
         for p in self.phase_lanes:
@@ -46,6 +40,12 @@ class TrafficSignalController:
         self.incoming_lanes = sorted(list(self.incoming_lanes))
         #lane capacity is the lane length divided by the average vehicle length+stopped headway
         self.lane_capacity = np.array([float(self.netdata['lane'][lane]['length'])/7.5 for lane in self.incoming_lanes])
+        #incoming lane vehicles of the current step, filled once from the
+        #snapshot and used by the controller and its metrics
+        self.occupancy = LaneOccupancy(self.incoming_lanes)
+        #rl states are written here, sized on first use
+        self.state_buf = np.zeros(0)
+        self.dtse = None
         #for collecting various traffic metrics at the intersection
         #can be extended in trafficmetric.py class to collect new metrics
         if mode == 'train':
@@ -55,13 +55,66 @@ class TrafficSignalController:
         self.trafficmetrics = TrafficMetrics(tsc_id, self.incoming_lanes, netdata, self.metric_args, mode)
 
         self.ep_rewards = []
+        #controllers that only use vehicle data when their phase
+        #ends set this, event driven sims can then skip them
+        self.event_driven = False
         
-    def run(self):
-        data = self.get_subscription_data()
-        self.trafficmetrics.update(data)
-        self.update(data)
+    def subscribe(self):
+        #create subscription for this traffic signal junction to gather
+        #vehicle information efficiently, the sim merges the results
+        #of all junctions into one vehicle snapshot each step
+        self.conn.junction.subscribeContext(self.id, tc.CMD_GET_VEHICLE_VARIABLE, 150, 
+                                        [tc.VAR_LANEPOSITION, 
+                                        tc.VAR_SPEED, 
+                                        tc.VAR_LANE_ID])
+
+    def reset(self, conn):
+        ###start a new episode in a reloaded sim, static structures
+        #are kept, loading the sim cleared the junction subscription
+        self.conn = conn
+        self.subscribe()
+        self.phase_time = 0
+        self.phase = self.all_red
+        self.sim_phase = None
+        self.trafficmetrics = TrafficMetrics(self.id, self.incoming_lanes, self.netdata, self.metric_args, self.mode)
+        self.ep_rewards = []
+        self.reset_episode()
+
+    def reset_episode(self):
+        """Implement this function to reset any traffic
+           signal class specific state for a new episode
+        """
+        pass
+
+    def run(self, data):
+        self.observe(data)
         self.increment_controller()
 
+    def observe(self, data):
+        #data is the sim's VehicleSnapshot for this step
+        self.occupancy.update(data)
+        self.trafficmetrics.update(self.occupancy)
+        self.update(data)
+
+    def next_event(self):
+        ###steps until this controller next needs to run, every
+        #step unless event driven, test mode metric histories
+        #need every step
+        if self.event_driven and self.mode == 'train':
+            return self.phase_time + 1
+        return 1
+
+    def skip(self, n):
+        #advance the current phase n steps without observing
+        self.phase_time -= n
+
+    def decision_state(self):
+        """Implement this function to return the state an rl
+           controller will act on this step (None if not acting)
+           so its forward pass can be batched with other controllers
+        """
+        return None
+
     def get_metrics(self):
         for m in self.metric_args:
             metric = self.trafficmetrics.get_metric(m)
@@ -73,7 +126,10 @@ class TrafficSignalController:
         if self.phase_time == 0:
             ###get new phase and duration
             next_phase = self.next_phase()
-            self.conn.trafficlight.setRedYellowGreenState( self.id, next_phase )
+            #extending the current phase needs no command
+            if next_phase != self.sim_phase:
+                self.conn.trafficlight.setRedYellowGreenState( self.id, next_phase )
+                self.sim_phase = next_phase
             self.phase = next_phase
             self.phase_time = self.next_phase_duration()
         self.phase_time -= 1
@@ -97,21 +153,10 @@ class TrafficSignalController:
         """
         raise NotImplementedError("Subclasses should implement this!")
 
-    def get_subscription_data(self):
-        #use SUMO subscription to retrieve vehicle info in batches
-        #around the traffic signal controller
-        tl_data = self.conn.junction.getContextSubscriptionResults(self.id)                          
-        #create empty incoming lanes for use else where
-        lane_vehicles = {l:{} for l in self.incoming_lanes}
-        if tl_data is not None:
-            for v in tl_data:
-                lane = tl_data[v][traci.constants.VAR_LANE_ID]
-                if lane not in lane_vehicles:
-                    lane_vehicles[lane] = {}
-                lane_vehicles[lane][v] = tl_data[v] 
-        return lane_vehicles
-
     def get_tl_green_phases(self):
+        #known after the first sim, the network does not change
+        if 'green_phases' in self.netdata['inter'][self.id]:
+            return list(self.netdata['inter'][self.id]['green_phases'])
         logic = self.conn.trafficlight.getCompleteRedYellowGreenDefinition(self.id)[0]
         #get only the green phases
         green_phases = [ p.state for p in logic.getPhases() 
@@ -149,29 +194,56 @@ class TrafficSignalController:
     def int_to_input(self, phases):
         return { p:phases[p] for p in range(len(phases)) }
 
-    def get_state(self):
-        #the state is the normalized density of all incoming lanes 
-        return np.concatenate([self.get_normalized_density(), self.get_normalized_queue()])
+    def set_state_type(self, state, cell, blocks=None):
+        ###rl state, density (normalized density and queue of
+        #incoming lanes) or dtse (lanes x cells grids), blocks are
+        #the (lane, phase) sizes of a parameter sharing group's states
+        self.state_blocks = blocks
+        if state == 'dtse':
+            self.dtse = DTSE([ self.netdata['lane'][l]['length'] for l in self.incoming_lanes ],
+                             [ self.netdata['lane'][l]['speed'] for l in self.incoming_lanes ],
+                             cell)
+        elif state != 'density':
+            #raise not found exceptions
+            assert 0, 'Supplied rl state argument '+str(state)+' does not exist.'
+
+    def get_state(self, one_hot=None):
+        #the state is the normalized density and queue of all incoming
+        #lanes or their dtse, followed by one_hot if given, built in
+        #the state buffer
+        n = len(self.incoming_lanes)
+        lanes_d = self.dtse.size if self.dtse else 2*n
+        #with parameter sharing the lane block and the phase one hot
+        #are zero padded separately to the group's largest, the all
+        #red bit last, so the inputs of all members line up
+        if self.state_blocks:
+            lane_block, phase_block = self.state_blocks
+        else:
+            lane_block, phase_block = lanes_d, (0 if one_hot is None else len(one_hot))
+        size = lane_block + (0 if one_hot is None else phase_block)
+        if len(self.state_buf) != size:
+            self.state_buf = np.zeros(size)
+        if self.dtse:
+            self.dtse.encode(self.occupancy, self.state_buf[:lanes_d])
+        else:
+            np.divide(self.occupancy.counts, self.lane_capacity, out=self.state_buf[:n])
+            np.divide(self.occupancy.halted, self.lane_capacity, out=self.state_buf[n:2*n])
+        if one_hot is not None:
+            self.state_buf[lane_block:lane_block+len(one_hot)-1] = one_hot[:-1]
+            self.state_buf[-1] = one_hot[-1]
+        #states are kept in experience trajectories, return a copy
+        return self.state_buf.copy()
 
     def get_normalized_density(self):
         #number of vehicles in each incoming lane divided by the lane's capacity
-        return np.array([len(self.data[lane]) for lane in self.incoming_lanes])/self.lane_capacity
+        return self.occupancy.counts/self.lane_capacity
 
     def get_normalized_queue(self):
-        lane_queues = []
-        for lane in self.incoming_lanes:
-            q = 0
-            for v in self.data[lane]:
-                if self.data[lane][v][traci.constants.VAR_SPEED] < 0.3:
-                    q += 1
-            lane_queues.append(q)
-        return np.array(lane_queues)/self.lane_capacity
+        #vehicles slower than 0.3 m/s are queued
+        return self.occupancy.halted/self.lane_capacity
 
     def empty_intersection(self):
-        for lane in self.incoming_lanes:
-            if len(self.data[lane]) > 0:
-                return False
-        return True
+        return self.occupancy.empty()
 
     def get_reward(self):
         #return negative delay as reward
@@ -184,62 +256,7 @@ class TrafficSignalController:
         self.ep_rewards.append(r)
         return r
 
-    def empty_dtse(n_lanes, dist, cell_size):
-        return np.zeros((n_lanes, int(dist/cell_size)+3 ))
-    
-    def phase_dtse(phase_lanes, lane_to_int, dtse):
-        phase_dtse = {}
-        for phase in phase_lanes:
-            copy_dtse = np.copy(dtse)
-            for lane in phase_lanes[phase]:
-                copy_dtse[lane_to_int[lane],:] = 1.0
-            phase_dtse[phase] = copy_dtse
-        return phase_dtse
-
-
-    def get_dtse():
-        dtse = np.copy(self._dtse)
-        for lane,i in zip(incoming_lanes, range(len(incoming_lanes))):
-            for v in self.data[lane]:
-                pos = self.data[lane][v][traci.constants.VAR_LANEPOSITION]
-                dtse[i, pos:pos+1] = 1.0
-
-        return dtse
-
-'''
-right_on_red_phases = []
-for phase in green_phases:
-    new_phase = []
-    for idx in range(len(phase)):
-        if self.netdata['inter'][self.id]['tlsindexdir'][idx] == 'r' and phase[idx] == 'r':
-            new_phase.append('s')
-        else:
-            new_phase.append(phase[idx])
-    right_on_red_phases.append(''.join(new_phase))
-'''
-
-'''
-n_g = len(green_phases)
-                                                                                            
-right_on_red_phases = []
-for phase in green_phases:
-    new_phase = []
-    for idx in range(len(phase)):
-        if self.netdata['inter'][self.id]['tlsindexdir'][idx] == 'r' and phase[idx] == 'r':
-            new_phase.append('s')
-        else:
-            new_phase.append(phase[idx])
-    right_on_red_phases.append(''.join(new_phase))
-                                                                                            
-green_phases = [ p for p in right_on_red_phases 
-                 if 'y' not in p
-                 and ('G' in p or 'g' in p) ]
-'''
-'''
-n_ror = len(ror_phases)
-if n_ror != n_g:
-    print('==========')
-    print(self.id)
-    print(green_phases)
-    print(ror_phases)
-'''
+    def get_dtse(self):
+        #lanes x cells vehicle count and normalized speed grids
+        self.dtse.encode(self.occupancy)
+        return self.dtse.buf.reshape(2, self.dtse.n_lanes, self.dtse.n_cells)
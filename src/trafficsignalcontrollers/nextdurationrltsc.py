@@ -1,13 +1,13 @@
 import numpy as np
-from itertools import cycle
 from collections import deque
 
 from src.trafficsignalcontroller import TrafficSignalController
 
 class NextDurationRLTSC(TrafficSignalController):
-    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, gmin, gmax, rlagent):
+    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, gmin, gmax, rlagent, state='density', cell=5.0, state_blocks=None):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
-        self.cycle = cycle(self.green_phases)
+        self.set_state_type(state, cell, state_blocks)
+        self.cycle_idx = 0
         self.phase_deque = deque()
         self.data = None
         self.rlagent = rlagent
@@ -20,6 +20,17 @@ class NextDurationRLTSC(TrafficSignalController):
         self.acting = False
         self.s = None
         self.a = None
+        #shared with other controllers in the sim to batch forward passes
+        self.batcher = None
+
+    def reset_episode(self):
+        self.cycle_idx = 0
+        self.phase_deque = deque()
+        self.data = None
+        self.acting = False
+        self.s = None
+        self.a = None
+        self.rlagent.reset()
 
     def next_phase(self):
         if len(self.phase_deque) == 0:
@@ -28,31 +39,49 @@ class NextDurationRLTSC(TrafficSignalController):
             self.phase_deque.extend(phases+[next_phase])
         return self.phase_deque.popleft()
 
-    def get_next_phase(self):
-        #find the next green phase
+    def find_next_phase(self):
+        #find the next green phase in the cycle
         #with vehicles in approaching lanes
-        i = 0
-        while i <= len(self.green_phases):
-            phase = next(self.cycle)
+        #and how many phases it advances the cycle
+        for i in range(len(self.green_phases)+1):
+            phase = self.green_phases[(self.cycle_idx+i)%len(self.green_phases)]
             if not self.phase_lanes_empty(phase):
-                if self.acting:
-                    state = np.concatenate( [self.get_state(), self.phase_to_one_hot[phase]] )
-                    terminal = False
-                    self.store_experience(state, terminal)
-                if not self.acting:
-                    state = np.concatenate( [self.get_state(), self.phase_to_one_hot[phase]] ) 
-                self.s = state                                                                         
-                action = self.rlagent.get_action(state)                                                       
-                self.a = action                                                                        
-                self.acting = True
-                return phase
-            i += 1
+                return phase, i+1
+        return None, len(self.green_phases)+1
+
+    def decision_state(self):
+        if self.phase_time == 0 and len(self.phase_deque) == 0:
+            phase, _ = self.find_next_phase()
+            if phase is not None:
+                return self.get_state(self.phase_to_one_hot[phase])
+        return None
+
+    def get_action(self, state):
+        if self.batcher:
+            return self.batcher.get_action(self.id, self.rlagent, state)
+        return self.rlagent.get_action(state)
+
+    def get_next_phase(self):
+        phase, n = self.find_next_phase()
+        self.cycle_idx += n
+        if phase is not None:
+            if self.acting:
+                state = self.get_state(self.phase_to_one_hot[phase])
+                terminal = False
+                self.store_experience(state, terminal)
+            if not self.acting:
+                state = self.get_state(self.phase_to_one_hot[phase]) 
+            self.s = state                                                                         
+            action = self.get_action(state)                                                       
+            self.a = action                                                                        
+            self.acting = True
+            return phase
         ##if no vehicles approaching intersection
         #default to all red
         phase = self.all_red
         if self.acting:
             #print('-------TERMINAL---------')
-            state = np.concatenate( [self.get_state(), self.phase_to_one_hot[phase]] )
+            state = self.get_state(self.phase_to_one_hot[phase])
             terminal = True
             self.store_experience(state, terminal)
             self.acting = False
@@ -83,6 +112,6 @@ class NextDurationRLTSC(TrafficSignalController):
 
     def phase_lanes_empty(self, phase):
         for l in self.phase_lanes[phase]:
-            if len(self.data[l]) > 0:
+            if self.occupancy.get_count(l) > 0:
                 return False
         return True
@@ -6,8 +6,9 @@ from collections import deque
 from src.trafficsignalcontroller import TrafficSignalController
 
 class NextPhaseRLTSC(TrafficSignalController):
-    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, green_t, rlagent):
+    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, green_t, rlagent, state='density', cell=5.0, state_blocks=None):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
+        self.set_state_type(state, cell, state_blocks)
         self.green_t = green_t
         self.t = 0
         #for keeping track of vehicle counts for websters calc
@@ -24,6 +25,18 @@ class NextPhaseRLTSC(TrafficSignalController):
         #for breaking ties in max pressure
         self.s = None
         self.a = None
+        #shared with other controllers in the sim to batch forward passes
+        self.batcher = None
+
+    def reset_episode(self):
+        self.t = 0
+        self.phase_deque = deque()
+        self.data = None
+        self.delay_green = False
+        self.acting = False
+        self.s = None
+        self.a = None
+        self.rlagent.reset()
 
     def next_phase(self):
         ###need to do deque here
@@ -50,7 +63,7 @@ class NextPhaseRLTSC(TrafficSignalController):
             #go to all red phase
             if self.acting:
                 #state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )[np.newaxis,...]
-                state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )
+                state = self.get_state(self.phase_to_one_hot[self.phase])
                 terminal = True
                 self.store_experience(state, terminal)
             self.acting = False
@@ -68,11 +81,12 @@ class NextPhaseRLTSC(TrafficSignalController):
             #state is a concatenation of the normalized density
             #and one hot hot vector encoding the previous phase
             #state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )[np.newaxis,...]
-            state = np.concatenate( [self.get_state(), self.phase_to_one_hot[self.phase]] )
+            state = self.get_state(self.phase_to_one_hot[self.phase])
             if self.acting:
                 terminal = False
                 self.store_experience(state, terminal)
-            action_idx = self.rlagent.get_action(state)
+            #agents only select this intersection's phases
+            action_idx = self.get_action(state)
             next_phase = self.int_to_phase[action_idx]
             self.s = state
             self.a = action_idx
@@ -80,6 +94,20 @@ class NextPhaseRLTSC(TrafficSignalController):
             return next_phase
             #return random.choice(self.green_phases)
 
+    def decision_state(self):
+        #mirrors get_next_phase, a decision is made when
+        #there are vehicles and green is not being delayed
+        if self.phase_time == 0 and len(self.phase_deque) == 0:
+            if not self.empty_intersection():
+                if not (self.phase == self.all_red and not self.delay_green):
+                    return self.get_state(self.phase_to_one_hot[self.phase])
+        return None
+
+    def get_action(self, state):
+        if self.batcher:
+            return self.batcher.get_action(self.id, self.rlagent, state)
+        return self.rlagent.get_action(state)
+
     def store_experience(self, next_state, terminal):
         self.rlagent.store_experience(self.s, self.a, next_state, self.get_reward(), terminal)
         
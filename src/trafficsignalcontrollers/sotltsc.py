@@ -2,15 +2,10 @@ import random, os, sys
 from itertools import cycle
 from collections import deque
 
-from src.trafficsignalcontroller import TrafficSignalController
+import numpy as np
 
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
+from src.trafficsignalcontroller import TrafficSignalController
 
-import traci
 
 class SOTLTSC(TrafficSignalController):
     def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, g_min, theta, omega, mu):
@@ -24,6 +19,14 @@ class SOTLTSC(TrafficSignalController):
         self.phase_idx = 0
         self.time_in_phase = 0
         self.phase_red_lanes = self.get_phase_red_lanes()
+        self.phase_red_idx = { g:self.occupancy.indices(self.phase_red_lanes[g]) for g in self.phase_red_lanes }
+        self.phase_deque = deque([self.green_phases[self.phase_idx]])
+
+    def reset_episode(self):
+        self.kappa = 0
+        self.data = None
+        self.phase_idx = 0
+        self.time_in_phase = 0
         self.phase_deque = deque([self.green_phases[self.phase_idx]])
 
     def next_phase(self):
@@ -78,7 +81,7 @@ class SOTLTSC(TrafficSignalController):
         g = self.green_phases[self.phase_idx%len(self.green_phases)]
         #vehicle time integral, used to control
         #incrementing phase
-        self.kappa += sum([ len(data[l])  for l in self.phase_red_lanes[g]])
+        self.kappa += int(self.occupancy.counts[self.phase_red_idx[g]].sum())
 
     def get_phase_red_lanes(self):
         all_incoming_lanes = []
@@ -98,12 +101,8 @@ class SOTLTSC(TrafficSignalController):
         #approaching (within omega distance)
         #the intersection in green lanes
         for l in self.phase_lanes[self.phase]:
-            approaching_v = 0
-            for v in self.data[l]:
-                if self.netdata['lane'][l]['length'] - self.data[l][v][traci.constants.VAR_LANEPOSITION] < self.omega:
-                    approaching_v += 1
-                if approaching_v > self.mu:
-                    break
+            dist = self.netdata['lane'][l]['length'] - self.occupancy.get_positions(l)
+            approaching_v = min(int(np.sum(dist < self.omega)), self.mu+1)
         return approaching_v
 
         
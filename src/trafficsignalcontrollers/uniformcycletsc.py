@@ -8,6 +8,10 @@ class UniformCycleTSC(TrafficSignalController):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
         self.uniform_t = uniform_t
         self.cycle = self.get_phase_cycle()
+        self.event_driven = True
+
+    def reset_episode(self):
+        self.cycle = self.get_phase_cycle()
 
     def get_phase_cycle(self):
         phase_cycle = []
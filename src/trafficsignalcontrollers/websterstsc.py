@@ -1,10 +1,12 @@
 from itertools import cycle
 from collections import deque
 
+import numpy as np
+
 from src.trafficsignalcontroller import TrafficSignalController
 
 class WebstersTSC(TrafficSignalController):
-    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, g_min, c_min, c_max, sat_flow=0.38, update_freq=None):
+    def __init__(self, conn, tsc_id, mode, netdata, red_t, yellow_t, g_min, c_min, c_max, sat_flow=0.38, update_freq=None, count='sets'):
         super().__init__(conn, tsc_id, mode, netdata, red_t, yellow_t)
         self.cycle = self.get_phase_cycle()
         self.g_min = g_min
@@ -14,9 +16,30 @@ class WebstersTSC(TrafficSignalController):
         self.t = 0
         self.sat_flow = sat_flow
         self.green_phase_duration = { g:g_min for g in self.green_phases}
-        #for keeping track of vehicle counts for websters calc
+        #for keeping track of vehicle counts for websters calc,
+        #green phases x incoming lanes, the mask marks each
+        #phase's lanes
+        self.green_idx = { g:i for i, g in enumerate(self.green_phases) }
+        self.phase_lane_mask = np.array([ [ l in self.phase_lanes[g] for l in self.incoming_lanes ]
+                                          for g in self.green_phases ])
+        self.phase_lane_counts = self.get_empty_phase_lane_counts()
+        if count not in ['sets', 'loops']:
+            #raise not found exceptions
+            assert 0, 'Supplied websters counting argument '+str(count)+' does not exist.'
+        self.count = count
+        self.prev_data = None
+        #the sim's stop line loop counts when counting with loops
+        self.stopline = None
+        self.stopline_idx = None
+        self.prev_counts = None
+
+    def reset_episode(self):
+        self.cycle = self.get_phase_cycle()
+        self.t = 0
+        self.green_phase_duration = { g:self.g_min for g in self.green_phases}
         self.phase_lane_counts = self.get_empty_phase_lane_counts()
         self.prev_data = None
+        self.prev_counts = None
 
     def get_phase_cycle(self):
         phase_cycle = []
@@ -41,13 +64,17 @@ class WebstersTSC(TrafficSignalController):
 
     def update(self, data):
         #update vehicle counts
-        if self.phase in self.green_phases:
-            self.update_phase_lane_counts(data)
+        if self.count == 'loops':
+            self.update_loop_counts()
+        else:
+            if self.phase in self.green_phases:
+                self.update_phase_lane_counts(data)
+            #keep this step's vehicle ids, the snapshot is replaced next step
+            self.prev_data = { l:data.get_ids(l) for l in self.incoming_lanes }
         ###need to keep track of lane counts using data
         if self.t % self.update_freq == 0:
             self.websters()
             self.phase_lane_counts = self.get_empty_phase_lane_counts()
-        self.prev_data = data
         self.t += 1
 
     def update_phase_lane_counts(self, data):
@@ -57,23 +84,30 @@ class WebstersTSC(TrafficSignalController):
         this natively FFS
         """
         if self.prev_data:
-            incoming_vehicles = set([]) 
-            for l in self.phase_lanes[self.phase]:
-                for v in data[l]:
-                    incoming_vehicles.add(v)
+            incoming_vehicles = np.concatenate([ data.get_ids(l) for l in self.phase_lanes[self.phase] ])
+            row = self.phase_lane_counts[self.green_idx[self.phase]]
+            for i, l in enumerate(self.incoming_lanes):
+                if self.phase_lane_mask[self.green_idx[self.phase], i]:
+                    row[i] += int(np.sum(~np.isin(self.prev_data[l], incoming_vehicles)))
 
-            for l in self.phase_lanes[self.phase]:
-                for v in self.prev_data[l]:
-                    if v not in incoming_vehicles:
-                        self.phase_lane_counts[self.phase][l] += 1
+    def update_loop_counts(self):
+        ###vehicles that crossed each lane's stop line loop
+        #since the last step, counted for the green phase
+        if self.stopline is None:
+            #raise not found exceptions
+            assert 0, 'Websters loop counting needs the sim stop line counts.'
+        if self.stopline_idx is None:
+            self.stopline_idx = self.stopline.lane_indices(self.incoming_lanes)
+        counts = self.stopline.counts[self.stopline_idx]
+        if self.prev_counts is not None and self.phase in self.green_phases:
+            #counts only grow, clamped in case they are ever reset
+            discharged = np.maximum(counts - self.prev_counts, 0)
+            g = self.green_idx[self.phase]
+            self.phase_lane_counts[g] += discharged*self.phase_lane_mask[g]
+        self.prev_counts = counts
 
     def get_empty_phase_lane_counts(self):
-        phase_lane_counts = {}
-        for p in self.phase_lanes:
-            phase_lane_counts[p] = {}
-            for l in self.phase_lanes[p]:
-                phase_lane_counts[p][l] = 0
-        return phase_lane_counts
+        return np.zeros(self.phase_lane_mask.shape, dtype=np.int64)
 
     def websters(self):
         """update green phase times using lane
@@ -82,13 +116,11 @@ class WebstersTSC(TrafficSignalController):
         """
         ##compute flow ratios for all lanes in all green phases
         ##find critical 
-        y_crit = []
-        for g in self.green_phases:
-            sat_flows = [(self.phase_lane_counts[g][l]/self.update_freq)/(self.sat_flow) for l in self.phase_lanes[g]]
-            y_crit.append(max(sat_flows))
+        sat_flows = (self.phase_lane_counts/self.update_freq)/(self.sat_flow)
+        y_crit = np.where(self.phase_lane_mask, sat_flows, -np.inf).max(axis=1)
 
         #compute intersection critical lane flow rattios
-        Y = sum(y_crit)
+        Y = float(np.sum(y_crit))
         if Y > 0.85:
             Y = 0.85
         elif Y == 0.0:
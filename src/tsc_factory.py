@@ -6,12 +6,12 @@ from src.trafficsignalcontrollers.nextphaserltsc import NextPhaseRLTSC
 from src.trafficsignalcontrollers.nextdurationrltsc import NextDurationRLTSC
 from src.rl_factory import rl_factory
 
-def tsc_factory(tsc_type, tl, args, netdata, rl_stats, exp_replay, neural_network, eps, conn):
+def tsc_factory(tsc_type, tl, args, netdata, rl_stats, exp_replay, weight_channel, learner_event, neural_network, eps, conn):
     if tsc_type == 'websters':
         return WebstersTSC(conn, tl, args.mode, netdata, args.r, args.y,
                            args.g_min, args.c_min,
                            args.c_max, args.sat_flow,
-                           args.update_freq)
+                           args.update_freq, args.count)
     elif tsc_type == 'sotl':
         return SOTLTSC(conn, tl, args.mode, netdata, args.r, args.y,
                        args.g_min, args.theta, args.omega,
@@ -22,15 +22,21 @@ def tsc_factory(tsc_type, tl, args, netdata, rl_stats, exp_replay, neural_networ
         return MaxPressureTSC(conn, tl, args.mode, netdata, args.r, args.y,
                               args.g_min )
     elif tsc_type == 'dqn':
+        share = netdata['share'][tl]
         dqnagent = rl_factory(tsc_type, args,
-                              neural_network, exp_replay, rl_stats, len(netdata['inter'][tl]['green_phases']), eps)
+                              neural_network, exp_replay, rl_stats, weight_channel, len(netdata['inter'][tl]['green_phases']), eps,
+                              share['n'], learner_event)
         return NextPhaseRLTSC(conn, tl, args.mode, netdata, args.r, args.y,
-                              args.g_min, dqnagent)
+                              args.g_min, dqnagent, args.state, args.cell,
+                              (share['lane_d'], share['phase_d']))
     elif tsc_type == 'ddpg':
+        share = netdata['share'][tl]
         ddpgagent = rl_factory(tsc_type, args,
-                                neural_network, exp_replay, rl_stats, 1, eps)
+                                neural_network, exp_replay, rl_stats, weight_channel, 1, eps,
+                                share['n'], learner_event)
         return NextDurationRLTSC(conn, tl, args.mode, netdata, args.r, args.y,
-                                 args.g_min, args.g_max, ddpgagent)
+                                 args.g_min, args.g_max, ddpgagent, args.state, args.cell,
+                                 (share['lane_d'], share['phase_d']))
     else:
         #raise not found exceptions
         assert 0, 'Supplied traffic signal control argument type '+str(tsc)+' does not exist.'
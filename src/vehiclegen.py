@@ -1,19 +1,13 @@
 import os, sys
 
-if 'SUMO_HOME' in os.environ:
-    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
-    sys.path.append(tools)
-    from sumolib import checkBinary
-else:
-    sys.exit("please declare environment variable 'SUMO_HOME'")
-
-import traci
-
 import numpy as np
 
+from src.routesampler import RouteSampler
+from src.demandprofiles import get_demand_schedule
+
 class VehicleGen:
-    def __init__(self, netdata, sim_len, demand, scale, mode, conn):
-        np.random.seed()
+    def __init__(self, netdata, sim_len, demand, scale, mode, conn, seed=None, profile='sine', profile_fp=None, schedule_fp=None):
+        np.random.seed(seed)
         self.conn = conn
         self.v_data = None
         self.vehicles_created = 0
@@ -21,86 +15,94 @@ class VehicleGen:
         ###for generating vehicles
         self.origins = self.netdata['origin']
         self.destinations = self.netdata['destination'] 
-        self.add_origin_routes()
+        self.route_sampler = RouteSampler(netdata)
+        #sampled routes added to the sim, edges to route id
+        self.route_ids = {}
+        self.n_routes = 0
         self.scale = scale
         self.sim_len = sim_len
         self.t = 0
 
         ###determine what function we run every step to 
         ###generate vehicles into sim
+        self.v_schedule = None
         if demand == 'single':
             self.gen_vehicles = self.gen_single
         elif demand == 'dynamic':
-            self.v_schedule = self.gen_dynamic_demand(mode)
+            self.v_schedule = self.gen_dynamic_demand(mode, seed, profile, profile_fp, schedule_fp)
             self.gen_vehicles = self.gen_dynamic
 
     def run(self):
         self.gen_vehicles()
         self.t += 1
 
+    def run_steps(self, n):
+        ###vehicles of the next n steps added at once, the single
+        #vehicle population is not updated until the sim steps,
+        #it is checked once (at most one spawn per jump)
+        if self.v_schedule is None:
+            self.gen_vehicles()
+            self.t += n
+        else:
+            for _ in range(n):
+                self.run()
+
     def gen_dynamic(self):
         ###get next set of edges from v schedule, use them to add new vehicles
         ###this is batch vehicle generation
-        try:
-            new_veh_edges = next(self.v_schedule)
+        if self.t < len(self.v_schedule):
+            new_veh_edges = [ self.origins[i] for i in self.v_schedule.get(self.t) ]
             self.gen_veh( new_veh_edges  )
-        except StopIteration:
+        else:
             print('no vehicles left')
 
-    def gen_dynamic_demand(self, mode):
-        ###use sine wave as rate parameter for dynamic traffic demand
-        t = np.linspace(1*np.pi, 2*np.pi, self.sim_len)                                          
-        sine = np.sin(t)+1.55
-        ###create schedule for number of vehicles to be generated each second in sim
-        v_schedule = []
-        second = 1.0
-        for t in range(int(self.sim_len)):
-            n_veh = 0.0
-            while second > 0.0:
-                headway = np.random.exponential( sine[t], size=1)
-                second -= headway
-                if second > 0.0:
-                    n_veh += 1
-            second += 1.0
-            v_schedule.append(int(n_veh))
-                                                                                            
-        ###randomly shift traffic pattern as a form of data augmentation
-        v_schedule = np.array(v_schedule)
-        if mode == 'test':
-            random_shift = 0
-        else:
-            random_shift = np.random.randint(0, self.sim_len)
-        v_schedule = np.concatenate((v_schedule[random_shift:], v_schedule[:random_shift]))
-        ###zero out the last minute for better comparisons because of random shift
-        v_schedule[-60:] = 0
-        ###randomly select from origins, these are where vehicles are generated
-        v_schedule = [ np.random.choice(self.origins, size=int(self.scale*n_veh), replace = True) 
-                       if n_veh > 0 else [] for n_veh in v_schedule  ]
-        ###fancy iterator, just so we can call next for sequential access
-        return v_schedule.__iter__() 
+    def gen_dynamic_demand(self, mode, seed, profile, profile_fp, schedule_fp):
+        ###vehicles to generate each second drawn from the demand profile
+        return get_demand_schedule(profile, profile_fp, self.sim_len, len(self.origins),
+                                   self.scale, mode, seed, schedule_fp)
+
+    def get_state(self):
+        return {'t':self.t, 'vehicles_created':self.vehicles_created, 'rng':np.random.get_state(),
+                'route_ids':self.route_ids, 'n_routes':self.n_routes}
 
-    def add_origin_routes(self):
-        for origin in self.origins:
-            self.conn.route.add(origin, [origin] )
+    def set_state(self, state):
+        ###resume generating from a saved state, the schedule
+        #is regenerated from the same seed
+        self.t = state['t']
+        self.vehicles_created = state['vehicles_created']
+        np.random.set_state(state['rng'])
+        self.n_routes = state['n_routes']
+        #only routes the loaded sim knows about
+        routes = set(self.conn.route.getIDList())
+        self.route_ids = { r:state['route_ids'][r] for r in state['route_ids'] if state['route_ids'][r] in routes }
 
     def gen_single(self):
-        if self.conn.vehicle.getIDCount() == 0:
+        #vehicles running or waiting to be inserted, asked directly,
+        #subscription results are one step stale and would spawn
+        #a second vehicle the step after the first
+        if self.conn.simulation.getMinExpectedNumber() == 0:
             ###if no vehicles in sim, spawn 1 on random link
             veh_spawn_edge = np.random.choice(self.origins)
             self.gen_veh( [veh_spawn_edge] )
 
     def gen_veh( self, veh_edges ):
-        for e in veh_edges:
+        if len(veh_edges) == 0:
+            return
+        #all routes of this step sampled together
+        routes = self.route_sampler.sample(veh_edges)
+        for e, route in zip(veh_edges, routes):
             vid = e+str(self.vehicles_created)
-            self.conn.vehicle.addFull( vid, e, departLane="best" )
-            self.set_veh_route(vid)
+            #depart at this generator step, sims that jump
+            #several steps add the vehicles of each step ahead
+            self.conn.vehicle.addFull( vid, self.get_route_id(route), depart=str(self.t), departLane="best" )
             self.vehicles_created += 1
 
-    def set_veh_route(self, veh):
-        current_edge = self.conn.vehicle.getRoute(veh)[0]
-        route = [current_edge]
-        while current_edge not in self.destinations:
-            next_edge = np.random.choice(self.netdata['edge'][current_edge]['outgoing'])
-            route.append(next_edge)
-            current_edge = next_edge
-        self.conn.vehicle.setRoute( veh, route )    
+    def get_route_id(self, route):
+        ###add each distinct route to the sim once
+        route = tuple(route)
+        if route not in self.route_ids:
+            route_id = 'route_'+str(self.n_routes)
+            self.conn.route.add(route_id, list(route))
+            self.n_routes += 1
+            self.route_ids[route] = route_id
+        return self.route_ids[route]    
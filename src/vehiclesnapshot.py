@@ -0,0 +1,106 @@
+import src.traciconstants as tc
+
+import numpy as np
+
+class VehicleSnapshot:
+    """Network wide vehicle data for one simulation step.
+
+    The junction context subscription results of all controlled
+    intersections are merged once per step, vehicles near several
+    junctions appear once. Vehicle ids are interned to ints and the
+    lane, speed and position of every vehicle are stored in numpy
+    arrays sorted by lane and position, so the vehicles of a lane are
+    a contiguous slice. Controllers and metrics read array views of
+    their lanes instead of building per intersection dicts.
+
+    Merged results hold every vehicle within radius of any junction,
+    a controller sees only those within radius of its own, as its own
+    subscription returned them. The vehicles within radius of a lane's
+    end (stop line) are the back of its slice, for the junction the
+    lane enters, those within radius of its start are the front, for
+    the junction it leaves. Distances are along the lane, the
+    subscription measures them from the junction center.
+    """
+    def __init__(self, lanes, lane_lengths, radius=150.0, stop_speed=0.3):
+        self.lanes = list(lanes)
+        self.lane_idx = { l:i for i, l in enumerate(self.lanes) }
+        self.lane_len = np.array(lane_lengths, dtype=np.float64)
+        self.radius = radius
+        self.stop_speed = stop_speed
+        self.v_ints = {}
+        self.v_names = []
+        self.lane_idx_cache = {}
+        self.update({})
+
+    def intern(self, v):
+        i = self.v_ints.get(v)
+        if i is None:
+            i = len(self.v_names)
+            self.v_ints[v] = i
+            self.v_names.append(v)
+        return i
+
+    def update(self, results):
+        ###results are junction context subscription
+        #results, {junction:{vehicle:{var:value}}}
+        vehicles = {}
+        for j in results:
+            if results[j]:
+                vehicles.update(results[j])
+        #only vehicles on network lanes, not internal junction lanes
+        vehicles = { v:vehicles[v] for v in vehicles if vehicles[v][tc.VAR_LANE_ID] in self.lane_idx }
+        n = len(vehicles)
+        lane = np.fromiter((self.lane_idx[d[tc.VAR_LANE_ID]] for d in vehicles.values()), dtype=np.int64, count=n)
+        speed = np.fromiter((d[tc.VAR_SPEED] for d in vehicles.values()), dtype=np.float64, count=n)
+        pos = np.fromiter((d[tc.VAR_LANEPOSITION] for d in vehicles.values()), dtype=np.float64, count=n)
+        ids = np.fromiter((self.intern(v) for v in vehicles), dtype=np.int64, count=n)
+
+        #new arrays every step, views handed out
+        #in previous steps remain valid
+        order = np.lexsort((pos, lane))
+        self.lane = lane[order]
+        self.speed = speed[order]
+        self.pos = pos[order]
+        self.ids = ids[order]
+        n_lanes = len(self.lanes)
+        self.lane_count = np.bincount(self.lane, minlength=n_lanes)
+        self.lane_queue = np.bincount(self.lane, weights=self.speed < self.stop_speed, minlength=n_lanes).astype(np.int64)
+        self.lane_end = np.cumsum(self.lane_count)
+        self.lane_start = self.lane_end - self.lane_count
+        #vehicles within radius of the lane end and of the lane start
+        near_stop = self.lane_len[self.lane] - self.pos <= self.radius
+        self.stop_count = np.bincount(self.lane, weights=near_stop, minlength=n_lanes).astype(np.int64)
+        self.stop_queue = np.bincount(self.lane, weights=near_stop & (self.speed < self.stop_speed), minlength=n_lanes).astype(np.int64)
+        self.stop_start = self.lane_end - self.stop_count
+        self.entry_count = np.bincount(self.lane, weights=self.pos <= self.radius, minlength=n_lanes).astype(np.int64)
+
+    def lane_indices(self, lanes):
+        ###index array of lanes, for indexing lane_count and lane_queue
+        key = tuple(lanes)
+        if key not in self.lane_idx_cache:
+            self.lane_idx_cache[key] = np.array([ self.lane_idx[l] for l in lanes ], dtype=np.int64)
+        return self.lane_idx_cache[key]
+
+    def lane_slice(self, lane):
+        i = self.lane_idx[lane]
+        return slice(self.lane_start[i], self.lane_end[i])
+
+    def get_count(self, lane):
+        if lane not in self.lane_idx:
+            return 0
+        return int(self.lane_count[self.lane_idx[lane]])
+
+    def get_queue(self, lane):
+        return int(self.lane_queue[self.lane_idx[lane]])
+
+    def get_ids(self, lane):
+        return self.ids[self.lane_slice(lane)]
+
+    def get_speeds(self, lane):
+        return self.speed[self.lane_slice(lane)]
+
+    def get_positions(self, lane):
+        return self.pos[self.lane_slice(lane)]
+
+    def get_name(self, v):
+        return self.v_names[v]
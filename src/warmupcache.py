@@ -0,0 +1,50 @@
+import os
+
+from src.picklefuncs import save_data, load_data
+from src.helper_funcs import check_and_make_dir
+
+class WarmupCache:
+    """Library of warmed up simulation states.
+
+    A state is the simulator's own saved state (saveState/loadState)
+    plus the python side state needed to resume (vehicle generation
+    position and random state, vehicle start and travel times), keyed
+    by scenario, backend, demand, seed and sim time. Only seeded sims
+    are cached, otherwise the warm up traffic is not reproducible.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def key(self, args, seed, t):
+        scenario = os.path.splitext(os.path.basename(args.cfg_fp))[0]
+        #jump sims keep no vehicle start times, their states differ
+        stepping = 'jump' if args.jump else 'step'
+        demand = args.demand
+        if args.demand == 'dynamic':
+            demand += '_'+args.profile+('_'+os.path.basename(args.profile_fp) if args.profile_fp else '')
+        #sumo inserted route file vehicles have other ids and routes
+        if args.route_files:
+            demand += '_rou'
+        return '_'.join([scenario, args.backend, stepping, demand, str(args.scale),
+                         args.mode, str(args.sim_len), str(seed), str(t)])
+
+    def state_fp(self, key):
+        return os.path.join(self.path, key+'.state')
+
+    def data_fp(self, key):
+        return os.path.join(self.path, key+'.p')
+
+    def exists(self, key):
+        #data is written last, if it exists the state is complete
+        return os.path.isfile(self.data_fp(key))
+
+    def save(self, conn, key, data):
+        check_and_make_dir(self.path)
+        conn.simulation.saveState(self.state_fp(key))
+        tmp_fp = self.data_fp(key)+'.tmp'
+        save_data(tmp_fp, data)
+        os.replace(tmp_fp, self.data_fp(key))
+
+    def load(self, conn, key):
+        conn.simulation.loadState(self.state_fp(key))
+        return load_data(self.data_fp(key))
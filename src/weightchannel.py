@@ -0,0 +1,127 @@
+import time
+
+import numpy as np
+
+class WeightChannel:
+    ###learner weights in shared memory behind a seqlock version,
+    #odd while being written, actors copy only new versions
+    def __init__(self, shapes, sync_decisions=1, sync_t=0.0):
+        self.shapes = [tuple(shape) for shape in shapes]
+        self.sizes = [int(np.prod(shape)) for shape in self.shapes]
+        self.n = sum(self.sizes)
+        #actors check for new weights at most every
+        #sync_decisions decisions and sync_t seconds
+        self.sync_decisions = sync_decisions
+        self.sync_t = sync_t
+        #python 3.8+, only imported when shared memory is used
+        from multiprocessing.shared_memory import SharedMemory
+        self.shm = SharedMemory(create=True, size=8+(4*self.n))
+        self.map_arrays()
+
+    def map_arrays(self):
+        self.version = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((self.n,), dtype=np.float32, buffer=self.shm.buf, offset=8)
+        #process local reader state
+        self.local_version = 0
+        self.decisions = 0
+        self.last_sync_t = 0.0
+        self.buf = np.empty(self.n, dtype=np.float32)
+
+    def __getstate__(self):
+        #only needed when procs are spawned instead of forked
+        state = {k:self.__dict__[k] for k in ['shapes', 'sizes', 'n', 'sync_decisions', 'sync_t']}
+        state['shm_name'] = self.shm.name
+        return state
+
+    def __setstate__(self, state):
+        from multiprocessing.shared_memory import SharedMemory
+        shm_name = state.pop('shm_name')
+        self.__dict__.update(state)
+        self.shm = SharedMemory(name=shm_name)
+        self.map_arrays()
+
+    def publish(self, weights):
+        ###single writer, the learner responsible for this tsc
+        v = int(self.version[0])
+        self.version[0] = v + 1
+        i = 0
+        for w, size in zip(weights, self.sizes):
+            self.data[i:i+size] = np.ravel(w)
+            i += size
+        self.version[0] = v + 2
+
+    def read(self):
+        ###copy out a consistent set of weights and their version
+        while True:
+            v = int(self.version[0])
+            if v % 2 == 0:
+                np.copyto(self.buf, self.data)
+                if int(self.version[0]) == v:
+                    break
+        self.local_version = v
+        weights = []
+        i = 0
+        for shape, size in zip(self.shapes, self.sizes):
+            weights.append(self.buf[i:i+size].reshape(shape))
+            i += size
+        return weights
+
+    def poll(self):
+        ###return new weights if it is time to sync and
+        #they have changed since last read, otherwise None
+        self.decisions += 1
+        if self.decisions < self.sync_decisions:
+            return None
+        if self.sync_t > 0.0:
+            t = time.time()
+            if t - self.last_sync_t < self.sync_t:
+                return None
+            self.last_sync_t = t
+        self.decisions = 0
+        if self.get_version() == self.local_version:
+            return None
+        return self.read()
+
+    def get_version(self):
+        return int(self.version[0])
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+class ManagerWeightChannel(WeightChannel):
+    ###fallback without shared memory (python < 3.8), weights are
+    #pickled through a manager dict with their version
+    def __init__(self, manager, sync_decisions=1, sync_t=0.0):
+        self.sync_decisions = sync_decisions
+        self.sync_t = sync_t
+        self.weights = manager.dict({'version':0, 'weights':None})
+        self.local_version = 0
+        self.decisions = 0
+        self.last_sync_t = 0.0
+
+    def __getstate__(self):
+        return self.__dict__.copy()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def publish(self, weights):
+        #one update, readers never see a version with other weights
+        self.weights.update({'version':self.weights['version']+1, 'weights':weights})
+
+    def read(self):
+        weights = self.weights.copy()
+        self.local_version = weights['version']
+        return weights['weights']
+
+    def get_version(self):
+        return self.weights['version']
+
+    def close(self):
+        pass
+
+    def unlink(self):
+        pass